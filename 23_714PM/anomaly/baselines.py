@@ -0,0 +1,189 @@
+# anomaly/baselines.py
+# Adaptive per-metric baselines with O(1) state, as an alternative to static thresholds.
+#
+# A rule opts in with a 'baseline' block, e.g.
+#     "baseline": {"method": "ewma", "alpha": 0.2, "threshold": 4.0, "warmup": 5}
+# The baseline learns the rule's metric on each new batch (the rows appended since the
+# previous incremental run) and flags batches that deviate from it. Full passes measure
+# the whole table and are left out, so full and incremental runs can share one state;
+# a full run (trigger.py without --incremental) neither learns nor scores baselines.
+# Only a handful of numbers are kept per (table, check, metric), so each run costs the
+# same no matter how much history there is: nothing is re-read or re-fitted.
+
+import logging
+import math
+import sqlite3
+
+CREATE_BASELINES_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS detector_baselines (
+    source_table TEXT NOT NULL,
+    check_name TEXT NOT NULL,
+    metric_name TEXT NOT NULL,
+    method TEXT NOT NULL,             -- 'ewma' or 'robust'
+    observations INTEGER NOT NULL,    -- Batches learned so far
+    center REAL,                      -- EWMA mean, or streaming median
+    spread REAL,                      -- EWMA variance, or streaming MAD
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source_table, check_name, metric_name)
+) WITHOUT ROWID;
+"""
+
+DEFAULT_BASELINE = {
+    "method": "ewma",        # 'ewma' (mean / variance) or 'robust' (median / MAD)
+    "alpha": 0.2,            # Smoothing factor: weight of the newest batch
+    "threshold": 4.0,        # Flag when |score| exceeds this many deviations
+    "warmup": 5,             # Batches to learn before flagging anything
+    "direction": "both"      # 'up', 'down' or 'both'
+}
+
+# Scales a MAD to a standard deviation for normally distributed data
+MAD_TO_STD = 1.4826
+
+
+def ensure_baselines_table(conn):
+    """Creates the detector_baselines table on first use."""
+    conn.execute(CREATE_BASELINES_TABLE_SQL)
+    conn.commit()
+
+
+def baseline_config(rule):
+    """Returns the rule's baseline settings merged over the defaults (None if not enabled)."""
+    if "baseline" not in rule:
+        return None
+    return {**DEFAULT_BASELINE, **(rule["baseline"] or {})}
+
+
+def load_baselines(conn, table_name: str) -> dict:
+    """Returns {(check_name, metric_name): state} for one table."""
+    try:
+        cursor = conn.execute(
+            """
+            SELECT check_name, metric_name, method, observations, center, spread
+            FROM detector_baselines WHERE source_table = ?
+            """,
+            (table_name,)
+        )
+        rows = cursor.fetchall()
+    except sqlite3.Error:
+        # Table not created yet: every baseline starts empty
+        return {}
+
+    return {
+        (row[0], row[1]): {"method": row[2], "observations": row[3], "center": row[4], "spread": row[5]}
+        for row in rows
+    }
+
+
+def save_baselines(conn, table_name: str, baselines: dict):
+    """Upserts the updated baseline states of one table (caller commits)."""
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO detector_baselines
+        (source_table, check_name, metric_name, method, observations, center, spread, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """,
+        [
+            (table_name, check_name, metric_name, state["method"], state["observations"], state["center"], state["spread"])
+            for (check_name, metric_name), state in baselines.items()
+        ]
+    )
+
+
+def _deviation(state):
+    """Standard-deviation-like spread of a baseline state."""
+    if state["method"] == "robust":
+        return MAD_TO_STD * state["spread"]
+    return math.sqrt(max(state["spread"], 0.0))
+
+
+def _learn(state, value, alpha):
+    """Folds one observation into the state in O(1)."""
+    if state["observations"] == 0:
+        state["center"], state["spread"] = value, 0.0
+    elif state["method"] == "robust":
+        # Stochastic-approximation median / MAD: step towards the observation by a
+        # fraction of the current spread, so single outliers barely move the estimate.
+        step = alpha * max(state["spread"], abs(state["center"]) * 0.01, 1e-9)
+        state["center"] += step if value > state["center"] else -step if value < state["center"] else 0.0
+        deviation = abs(value - state["center"])
+        if state["observations"] == 1:
+            state["spread"] = deviation
+        else:
+            state["spread"] += alpha * (deviation - state["spread"])
+    else:
+        # Exponentially weighted mean and variance
+        delta = value - state["center"]
+        state["center"] += alpha * delta
+        state["spread"] = (1 - alpha) * (state["spread"] + alpha * delta * delta)
+    state["observations"] += 1
+
+
+def observe(state, value, config):
+    """
+    Scores a new observation against the baseline, then learns it.
+
+    Args:
+        state: Baseline state from load_baselines() (None for a new metric).
+        value: The metric measured on the new batch.
+        config: Settings from baseline_config().
+
+    Returns:
+        (state, result): the updated state, and a dict with 'score', 'lower', 'upper'
+        and 'fired' (None while the baseline is still warming up).
+    """
+    if state is None or state["method"] != config["method"]:
+        state = {"method": config["method"], "observations": 0, "center": None, "spread": None}
+
+    result = None
+    if state["observations"] >= config["warmup"]:
+        deviation = _deviation(state)
+        # A perfectly flat history has no spread; use a small floor instead of dividing by 0
+        deviation = max(deviation, abs(state["center"]) * 0.01, 1e-9)
+        score = (value - state["center"]) / deviation
+        lower = state["center"] - config["threshold"] * deviation
+        upper = state["center"] + config["threshold"] * deviation
+
+        direction = config["direction"]
+        fired = (
+            (direction in ("up", "both") and score > config["threshold"]) or
+            (direction in ("down", "both") and score < -config["threshold"])
+        )
+        result = {"score": score, "lower": lower, "upper": upper, "fired": fired}
+
+        # Learn a clipped value, so one bad batch doesn't drag the baseline with it
+        value = min(max(value, lower), upper)
+
+    _learn(state, value, config["alpha"])
+    return state, result
+
+
+def evaluate_baseline(rule, metric_value, state):
+    """
+    Adaptive counterpart of a check's evaluate(): returns (state, finding_or_None, metrics).
+
+    'metric_value' is the rule's primary metric measured on the new batch only.
+    """
+    config = baseline_config(rule)
+    state, result = observe(state, metric_value, config)
+
+    metrics = {"baseline_center": state["center"], "baseline_deviation": _deviation(state)}
+    if result is None:
+        logging.debug(f"Baseline warming up ({state['observations']}/{config['warmup']} batches).")
+        return state, None, metrics
+
+    metrics["baseline_score"] = result["score"]
+    if not result["fired"]:
+        return state, None, metrics
+
+    threshold = result["upper"] if result["score"] > 0 else result["lower"]
+    finding = {
+        "metric_value": metric_value,
+        "threshold_value": threshold,
+        "meta_data": {
+            "baseline_method": config["method"],
+            "baseline_score": round(result["score"], 2),
+            "expected_range": [round(result["lower"], 4), round(result["upper"], 4)],
+            "note": f"Batch value deviates {abs(result['score']):.1f} deviations from its adaptive baseline."
+        }
+    }
+    return state, finding, metrics
@@ -0,0 +1,462 @@
+# anomaly/checks.py
+# Registry of check types. Every rule in anomaly/rules.py names one of these types.
+#
+# A check type declares:
+#   - the aggregates it needs, as (key, expressions, merge) tuples. The engine fuses all
+#     aggregates for a table into one query and merges batch values into running values.
+#   - an evaluate function that turns those aggregates into a finding (or None).
+#   - optionally, a sample query that fetches a few of the offending rows once it fired.
+#
+# Adding a new kind of check means adding one entry to CHECK_TYPES; adding a new
+# table/column rule only needs a new entry in ANOMALY_RULES.
+
+from datetime import datetime, timedelta
+
+# --- AGGREGATE DECLARATIONS ---
+# Keys are persisted in detector_state, so they include every column and threshold
+# the value depends on. A 'sum' aggregate may list several expressions; their batch
+# values are added together.
+
+ROW_COUNT = ("row_count", ["COUNT(*)"], "sum")
+
+
+def null_count(column):
+    return (f"null_count:{column}", [f"SUM(CASE WHEN {column} IS NULL THEN 1 ELSE 0 END)"], "sum")
+
+
+def duplicate_count(column):
+    # Duplicates = COUNT(key) - COUNT(DISTINCT key). A new batch adds its own duplicates
+    # plus the distinct keys that already exist in earlier rows (an index lookup per key
+    # once the column is indexed). The history probe is skipped on a full pass.
+    return (f"duplicate_count:{column}", [
+        f"COUNT({column}) - COUNT(DISTINCT {column})",
+        f"""CASE WHEN :start > 0 THEN (
+                SELECT COUNT(DISTINCT b.{column}) FROM {{table}} b
+                WHERE b.rowid > :start AND b.rowid <= :end
+                  AND EXISTS (SELECT 1 FROM {{table}} o WHERE o.{column} = b.{column} AND o.rowid <= :start)
+            ) ELSE 0 END"""
+    ], "sum")
+
+
+def non_null_count(column):
+    return (f"non_null_count:{column}", [f"COUNT({column})"], "sum")
+
+
+def count_above(column, max_value):
+    return (f"count_gt:{column}:{max_value}", [f"SUM(CASE WHEN {column} > {max_value} THEN 1 ELSE 0 END)"], "sum")
+
+
+def count_below(column, min_value):
+    return (f"count_lt:{column}:{min_value}", [f"SUM(CASE WHEN {column} < {min_value} THEN 1 ELSE 0 END)"], "sum")
+
+# --- SKETCH DECLARATIONS ---
+# Values that can't be merged from SQL aggregates come from persisted sketches that the
+# engine updates with the window's rows only, as (key, expression, precision).
+# An 'hll:<column>' sketch yields 'distinct_estimate:<column>' and
+# 'distinct_error:<column>' for the whole table. A 'latency:<column>' quantile sketch
+# yields 'latency_<label>:<column>' for the batch, 'latency_overall_<label>:<column>'
+# for every batch since the sketch was created, and 'latency_count:<column>'.
+
+# Label -> quantile reported by latency sketches
+LATENCY_QUANTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99, "max": 1.0}
+
+
+def distinct_sketch(rule):
+    return (f"hll:{rule['column']}", rule["column"], rule.get("sketch_precision", 14))
+
+
+def latency_sketch(rule):
+    # Lateness in minutes, parsed by SQLite: only the window's rows are ever converted
+    column = rule["column"]
+    return (f"latency:{column}", f"(julianday('now', 'localtime') - julianday({column})) * 1440", rule.get("sketch_precision", 6))
+
+# --- MODEL DECLARATIONS ---
+# Checks that score single rows against learned statistics declare (key, rule) models.
+# The engine passes them to anomaly/outliers.py, which scores the window's rows and
+# learns from them in the same pass. A 'category:<column>:<category_column>' model
+# yields per-batch 'category_outliers:<column>', 'categories_scored:<column>',
+# 'category_outlier_groups:<column>' and 'category_outlier_rowids:<column>'.
+
+def category_model(rule):
+    return (f"category:{rule['column']}:{rule['category_column']}", rule)
+
+# --- INDEX HINTS ---
+# 'indexes' lists the columns a check type wants indexed, and 'probes' the query
+# patterns that should be served by those indexes: the incremental history lookup and
+# the targeted lookups used to inspect a table outside the fused scan. db/indexes.py
+# creates the indexes and verifies each probe, and the fused query itself, with
+# EXPLAIN QUERY PLAN. An index on another table is given as a (table, column) tuple.
+
+def indexed_column(rule):
+    return [rule["column"]]
+
+
+def probe_null_ratio(table, rule):
+    return [("null lookup", f"SELECT COUNT(*) FROM {table} WHERE {rule['column']} IS NULL", ())]
+
+
+def probe_duplicate_count(table, rule):
+    # COUNT(DISTINCT) runs inside the fused query's rowid window, which db/indexes.py
+    # checks on its own; only the per-key history lookup needs the index
+    column = rule["column"]
+    return [("history lookup", f"SELECT 1 FROM {table} WHERE {column} = ? AND rowid <= ?", ("", 0))]
+
+
+def probe_value_range(table, rule):
+    column = rule["column"]
+    probes = []
+    if "max_value" in rule:
+        probes.append(("values above max", f"SELECT COUNT(*) FROM {table} WHERE {column} > ?", (rule["max_value"],)))
+    if "min_value" in rule:
+        probes.append(("values below min", f"SELECT COUNT(*) FROM {table} WHERE {column} < ?", (rule["min_value"],)))
+    return probes
+
+
+def probe_timestamp_lag(table, rule):
+    column = rule["column"]
+    return [("late rows", f"SELECT rowid FROM {table} WHERE {column} < ? ORDER BY {column} LIMIT 5", ("",))]
+
+
+def probe_category_outlier(table, rule):
+    return [(
+        "category lookup",
+        f"SELECT {rule['category_column']} FROM {rule['category_table']} WHERE {rule['category_key']} = ?",
+        ("",)
+    )]
+
+
+def probe_row_count(table, rule):
+    return [("batch window", f"SELECT COUNT(*) FROM {table} WHERE rowid > ? AND rowid <= ?", (0, 0))]
+
+# --- OFFENDING-ROW SAMPLES ---
+# sample(table, rule, aggregates) returns (sql, params) for a query that fetches up to
+# :limit offending rows, or None when the check has no row-level cause (volume checks).
+# It only runs after the rule fired. The engine fills in {window}: a rowid range for
+# the new batch, or a filter that leaves the column index to the planner when it
+# searches the whole table, so the query stops after :limit matches either way.
+
+SAMPLE_ROWS = 5
+
+
+def sample_null_ratio(table, rule, aggregates):
+    return (f"""
+        SELECT rowid, * FROM {table}
+        WHERE {{window}} AND {rule['column']} IS NULL
+        LIMIT :limit""", {})
+
+
+def sample_duplicate_count(table, rule, aggregates):
+    # Keys of the window that also occur in another row, with their number of copies
+    column = rule["column"]
+    return (f"""
+        SELECT k.{column}, (SELECT COUNT(*) FROM {table} o WHERE o.{column} = k.{column}) AS copies
+        FROM (
+            SELECT DISTINCT b.{column} FROM {table} b
+            WHERE {{window}} AND b.{column} IS NOT NULL
+              AND EXISTS (SELECT 1 FROM {table} o WHERE o.{column} = b.{column} AND o.rowid <> b.rowid)
+            LIMIT :limit
+        ) k""", {})
+
+
+def sample_value_range(table, rule, aggregates):
+    column = rule["column"]
+    if "max_value" in rule and aggregates[count_above(column, rule["max_value"])[0]]:
+        predicate, bound = f"{column} > :bound", rule["max_value"]
+    elif "min_value" in rule and aggregates[count_below(column, rule["min_value"])[0]]:
+        predicate, bound = f"{column} < :bound", rule["min_value"]
+    else:
+        return None
+    return (f"""
+        SELECT rowid, * FROM {table}
+        WHERE {{window}} AND {predicate}
+        LIMIT :limit""", {"bound": bound})
+
+
+def sample_timestamp_lag(table, rule, aggregates):
+    # Oldest rows first, up to the SLA cutoff (timestamps are ISO text, so they sort as such)
+    column = rule["column"]
+    cutoff = datetime.now() - timedelta(minutes=rule["max_latency_minutes"])
+    return (f"""
+        SELECT rowid, * FROM {table}
+        WHERE {{window}} AND {column} < :cutoff
+        ORDER BY {column}
+        LIMIT :limit""", {"cutoff": cutoff.strftime('%Y-%m-%d %H:%M:%S')})
+
+def sample_category_outlier(table, rule, aggregates):
+    # The model already found the offending rows: fetch them by rowid, with their category
+    rowids = aggregates[f"category_outlier_rowids:{rule['column']}"]
+    if not rowids:
+        return None
+    key = rule["category_key"]
+    return (f"""
+        SELECT t.rowid, t.*,
+               (SELECT c.{rule['category_column']} FROM {rule['category_table']} c
+                WHERE c.{key} = t.{key} LIMIT 1) AS {rule['category_column']}
+        FROM {table} t
+        WHERE {{window}} AND t.rowid IN ({", ".join(str(int(rowid)) for rowid in rowids)})
+        LIMIT :limit""", {})
+
+# --- CHECK TYPES ---
+# evaluate(rule, aggregates) returns None when the rule passes, otherwise a dict with
+# 'metric_value', 'threshold_value' and optional 'meta_data'.
+# measure(rule, aggregates) returns every numeric metric the check looked at, whether
+# or not it fired; these are stored in detector_metrics on every run.
+# 'metric' names the primary measured metric, which adaptive baselines learn.
+# 'sample' (optional) builds the offending-row query described above.
+# 'sketches' and 'models' (optional) list the sketches and models the check reads.
+# 'evaluated' (optional) returns False when the aggregates hold nothing to judge, such
+# as an empty batch for a per-batch check; the rule is then 'skipped', not 'passed'.
+
+def evaluate_row_count(rule, aggregates):
+    """Fires when the row count is above 'max_rows' or below 'min_rows'."""
+    row_count = aggregates["row_count"]
+    if "max_rows" in rule and row_count > rule["max_rows"]:
+        return {"metric_value": row_count, "threshold_value": rule["max_rows"]}
+    if "min_rows" in rule and row_count < rule["min_rows"]:
+        return {"metric_value": row_count, "threshold_value": rule["min_rows"]}
+    return None
+
+
+def evaluate_null_ratio(rule, aggregates):
+    """Fires when the share of NULLs in 'column' exceeds 'max_null_percentage' (0-1)."""
+    column = rule["column"]
+    total_rows = aggregates["row_count"]
+    if not total_rows:
+        return None
+
+    null_ratio = aggregates[f"null_count:{column}"] / total_rows
+    if null_ratio > rule["max_null_percentage"]:
+        return {
+            "metric_value": null_ratio,
+            "threshold_value": rule["max_null_percentage"],
+            "meta_data": {"column": column, "total_rows": total_rows}
+        }
+    return None
+
+
+def evaluate_duplicate_count(rule, aggregates):
+    """
+    Fires when the number of repeated keys in 'column' exceeds 'max_duplicate_count'.
+
+    With 'approximate' set, the count is COUNT(column) minus a HyperLogLog distinct
+    estimate, and the rule only fires once the estimate clears the threshold by
+    'confidence_sigmas' standard errors (default 3).
+    """
+    if not rule.get("approximate"):
+        duplicates = aggregates[f"duplicate_count:{rule['column']}"]
+        if duplicates > rule["max_duplicate_count"]:
+            return {"metric_value": duplicates, "threshold_value": rule["max_duplicate_count"]}
+        return None
+
+    measured = measure_duplicate_count(rule, aggregates)
+    duplicates, error = measured["duplicate_count"], measured["duplicate_error"]
+    if duplicates - rule.get("confidence_sigmas", 3) * error > rule["max_duplicate_count"]:
+        return {
+            "metric_value": duplicates,
+            "threshold_value": rule["max_duplicate_count"],
+            "meta_data": {"approximate": True, "error_bound": round(error, 1)}
+        }
+    return None
+
+
+def evaluate_value_range(rule, aggregates):
+    """Fires when any value in 'column' is above 'max_value' or below 'min_value'."""
+    column = rule["column"]
+    if "max_value" in rule:
+        outliers = aggregates[count_above(column, rule["max_value"])[0]]
+        if outliers > 0:
+            return {
+                "metric_value": outliers,
+                "threshold_value": rule["max_value"],
+                "meta_data": {"column": column, "note": f"Found {outliers} records above ${rule['max_value']}."}
+            }
+    if "min_value" in rule:
+        outliers = aggregates[count_below(column, rule["min_value"])[0]]
+        if outliers > 0:
+            return {
+                "metric_value": outliers,
+                "threshold_value": rule["min_value"],
+                "meta_data": {"column": column, "note": f"Found {outliers} records below ${rule['min_value']}."}
+            }
+    return None
+
+
+def evaluate_timestamp_lag(rule, aggregates):
+    """
+    Fires when a lateness percentile of the batch is above 'max_latency_minutes'.
+
+    Lateness is the minutes between each new row's 'column' timestamp and the detector
+    run. 'percentile' picks the value compared: 'p50', 'p95', 'p99' (default) or 'max'.
+    Only the batch's rows are measured: in incremental runs one late batch fires once,
+    not on every run after it, and a run without new rows is skipped. A full run's
+    batch is the whole table, so it keeps firing while late rows are in the table (with
+    incidents on, that stays one open incident).
+    """
+    column = rule["column"]
+    lag = aggregates[f"latency_{rule.get('percentile', 'p99')}:{column}"]
+    if lag is None:
+        return None
+
+    max_latency_minutes = rule["max_latency_minutes"]
+    if lag > max_latency_minutes:
+        oldest = datetime.now() - timedelta(minutes=aggregates[f"latency_max:{column}"])
+        meta_data = {label: round(aggregates[f"latency_{label}:{column}"], 1) for label in LATENCY_QUANTILES}
+        meta_data.update({
+            "percentile": rule.get("percentile", "p99"),
+            "batch_rows": aggregates[f"latency_count:{column}"],
+            "oldest_data_timestamp": oldest.strftime('%Y-%m-%d %H:%M:%S')
+        })
+        return {"metric_value": lag, "threshold_value": max_latency_minutes, "meta_data": meta_data}
+    return None
+
+def evaluate_category_outlier(rule, aggregates):
+    """
+    Fires when more than 'max_outliers' (default 0) rows of the batch fall outside the
+    Tukey fences of their category: 'iqr_multiplier' (default 3) interquartile ranges
+    (at least 'min_iqr', default 0.3) beyond the quartiles of log10('column'), learned
+    from earlier batches. The category
+    of each row is looked up in 'category_table' by 'category_key'; categories with
+    fewer than 'min_category_rows' (default 20) learned rows are not scored.
+    """
+    column = rule["column"]
+    outliers = aggregates[f"category_outliers:{column}"]
+    max_outliers = rule.get("max_outliers", 0)
+    if outliers > max_outliers:
+        return {
+            "metric_value": outliers,
+            "threshold_value": max_outliers,
+            "meta_data": {
+                "column": column,
+                # [category, outliers, lower fence, upper fence], worst first
+                "categories": aggregates[f"category_outlier_groups:{column}"]
+            }
+        }
+    return None
+
+# --- MEASUREMENTS ---
+
+def measure_duplicate_count(rule, aggregates):
+    column = rule["column"]
+    if not rule.get("approximate"):
+        return {"duplicate_count": aggregates[f"duplicate_count:{column}"]}
+
+    # Rounded: a fractional duplicate count would only suggest false precision
+    estimate = aggregates[f"distinct_estimate:{column}"]
+    return {
+        "duplicate_count": max(round(aggregates[f"non_null_count:{column}"] - estimate), 0),
+        "duplicate_error": aggregates[f"distinct_error:{column}"]
+    }
+
+def measure_null_ratio(rule, aggregates):
+    total_rows = aggregates["row_count"]
+    null_rows = aggregates[f"null_count:{rule['column']}"]
+    return {
+        "row_count": total_rows,
+        "null_count": null_rows,
+        "null_ratio": null_rows / total_rows if total_rows else None
+    }
+
+
+def measure_timestamp_lag(rule, aggregates):
+    column = rule["column"]
+    metrics = {"latency_minutes": aggregates[f"latency_{rule.get('percentile', 'p99')}:{column}"]}
+    for label in LATENCY_QUANTILES:
+        metrics[f"latency_{label}"] = aggregates[f"latency_{label}:{column}"]
+    for label in ("p95", "p99"):
+        metrics[f"latency_overall_{label}"] = aggregates[f"latency_overall_{label}:{column}"]
+    return metrics
+
+
+def measure_value_range(rule, aggregates):
+    metrics = {}
+    if "max_value" in rule:
+        metrics["count_above"] = aggregates[count_above(rule["column"], rule["max_value"])[0]]
+    if "min_value" in rule:
+        metrics["count_below"] = aggregates[count_below(rule["column"], rule["min_value"])[0]]
+    return metrics
+
+
+def measure_category_outlier(rule, aggregates):
+    column = rule["column"]
+    return {
+        "category_outliers": aggregates[f"category_outliers:{column}"],
+        "categories_scored": aggregates[f"categories_scored:{column}"]
+    }
+
+
+CHECK_TYPES = {
+    "row_count": {
+        "category": "Volume",
+        "metric": "row_count",
+        "required": [],
+        "aggregates": lambda rule: [ROW_COUNT],
+        "evaluate": evaluate_row_count,
+        "measure": lambda rule, aggregates: {"row_count": aggregates["row_count"]},
+        "indexes": lambda rule: [],
+        "probes": probe_row_count
+    },
+    "null_ratio": {
+        "category": "Data_Quality",
+        "metric": "null_ratio",
+        "required": ["column", "max_null_percentage"],
+        "aggregates": lambda rule: [ROW_COUNT, null_count(rule["column"])],
+        "evaluate": evaluate_null_ratio,
+        "measure": measure_null_ratio,
+        "indexes": indexed_column,
+        "probes": probe_null_ratio,
+        "sample": sample_null_ratio
+    },
+    "duplicate_count": {
+        "category": "Data_Quality",
+        "metric": "duplicate_count",
+        "required": ["column", "max_duplicate_count"],
+        "aggregates": lambda rule: (
+            [non_null_count(rule["column"])] if rule.get("approximate") else [duplicate_count(rule["column"])]
+        ),
+        "sketches": lambda rule: [distinct_sketch(rule)] if rule.get("approximate") else [],
+        "evaluate": evaluate_duplicate_count,
+        "measure": measure_duplicate_count,
+        "indexes": indexed_column,
+        "probes": probe_duplicate_count,
+        "sample": sample_duplicate_count
+    },
+    "value_range": {
+        "category": "Data_Quality",
+        "metric": "count_above",
+        "required": ["column"],
+        "aggregates": lambda rule: (
+            ([count_above(rule["column"], rule["max_value"])] if "max_value" in rule else []) +
+            ([count_below(rule["column"], rule["min_value"])] if "min_value" in rule else [])
+        ),
+        "evaluate": evaluate_value_range,
+        "measure": measure_value_range,
+        "indexes": indexed_column,
+        "probes": probe_value_range,
+        "sample": sample_value_range
+    },
+    "timestamp_lag": {
+        "category": "SLA",
+        "metric": "latency_minutes",
+        "required": ["column", "max_latency_minutes"],
+        "aggregates": lambda rule: [],
+        "sketches": lambda rule: [latency_sketch(rule)],
+        "evaluated": lambda rule, aggregates: bool(aggregates[f"latency_count:{rule['column']}"]),
+        "evaluate": evaluate_timestamp_lag,
+        "measure": measure_timestamp_lag,
+        "indexes": indexed_column,
+        "probes": probe_timestamp_lag,
+        "sample": sample_timestamp_lag
+    },
+    "category_outlier": {
+        "category": "Data_Quality",
+        "metric": "category_outliers",
+        "required": ["column", "category_table", "category_key", "category_column"],
+        "aggregates": lambda rule: [],
+        "models": lambda rule: [category_model(rule)],
+        "evaluate": evaluate_category_outlier,
+        "measure": measure_category_outlier,
+        "indexes": lambda rule: [(rule["category_table"], rule["category_key"])],
+        "probes": probe_category_outlier,
+        "sample": sample_category_outlier
+    }
+}
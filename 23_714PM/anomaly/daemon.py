@@ -0,0 +1,369 @@
+# anomaly/daemon.py
+# Long-running detector: keeps the connection pool and the compiled plan warm and runs
+# detection on an interval or cron-like schedule, instead of paying for interpreter
+# start-up, imports, .env parsing and new connections on every one-shot run.
+#
+# In watch mode it is event-driven instead: it polls PRAGMA data_version (which only
+# changes when another connection commits) and, on a change, evaluates only the tables
+# recorded in bronze_change_log (db/changes.py) since the previous tick.
+
+import argparse
+import logging
+import math
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    import fcntl      # POSIX file locks
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt     # Windows file locks
+except ImportError:
+    msvcrt = None
+
+# Fix imports (this file is run directly, like init_db.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.connection import get_db_connection, get_db_path
+from db.changes import latest_change_id, prune_changes, read_changes, summarize_changes
+from anomaly.rules import ANOMALY_RULES
+from anomaly.engine import compile_plan
+from anomaly.detector import detect_anomalies, ensure_detector_tables
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# --- 1. SCHEDULES ---
+# A schedule answers one question: given when the previous run was due (None before the
+# first run) and the current time, when is the next run due? Times are time.time().
+
+INTERVAL_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_interval(text: str) -> float:
+    """'500ms', '5s', '2m', '1h' or a plain number of seconds -> seconds."""
+    text = text.strip().lower()
+    for unit in sorted(INTERVAL_UNITS, key=len, reverse=True):
+        if text.endswith(unit):
+            seconds = float(text[:-len(unit)]) * INTERVAL_UNITS[unit]
+            break
+    else:
+        seconds = float(text)
+    if seconds <= 0:
+        raise ValueError(f"Interval must be positive: '{text}'")
+    return seconds
+
+
+class IntervalSchedule:
+    """Runs every 'seconds', anchored to the first run. Ticks missed by a slow run are skipped."""
+
+    def __init__(self, seconds: float, log_missed=True):
+        self.seconds = seconds
+        self.log_missed = log_missed
+
+    def next_run(self, previous_due, now):
+        if previous_due is None:
+            return now
+        due = previous_due + self.seconds
+        if due < now:
+            missed = math.ceil((now - due) / self.seconds)
+            if self.log_missed:
+                logging.warning(f"Detection overran its interval; skipping {missed} missed run(s).")
+            due += missed * self.seconds
+        return due
+
+    def __str__(self):
+        return f"every {self.seconds:g}s"
+
+
+class CronSchedule:
+    """
+    Standard 5-field cron expression: minute hour day-of-month month day-of-week.
+
+    Fields accept '*', 'a', 'a-b', lists 'a,b' and steps '*/n' / 'a-b/n'. Day-of-week
+    is 0-6 from Sunday (7 is Sunday too). As in cron, when both day fields are
+    restricted a day matches if either does.
+    """
+
+    FIELDS = [("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 7)]
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields, got {len(parts)}: '{expression}'")
+
+        self.expression = expression
+        self.fields = {}
+        for part, (name, low, high) in zip(parts, self.FIELDS):
+            self.fields[name] = self._parse_field(part, low, high)
+        if 7 in self.fields["weekday"]:
+            self.fields["weekday"] = (self.fields["weekday"] - {7}) | {0}
+        self.any_day = parts[2] == "*"
+        self.any_weekday = parts[4] == "*"
+
+    @staticmethod
+    def _parse_field(part, low, high):
+        values = set()
+        for item in part.split(","):
+            step = 1
+            if "/" in item:
+                item, step_text = item.split("/", 1)
+                step = int(step_text)
+            if item == "*":
+                start, end = low, high
+            elif "-" in item:
+                start, end = (int(value) for value in item.split("-", 1))
+            else:
+                start = end = int(item)
+            if not (low <= start <= end <= high) or step < 1:
+                raise ValueError(f"Cron field '{part}' is out of range {low}-{high}.")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment):
+        day = moment.day in self.fields["day"]
+        weekday = (moment.weekday() + 1) % 7 in self.fields["weekday"]
+        if self.any_day:
+            return weekday
+        if self.any_weekday:
+            return day
+        return day or weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        """First matching minute strictly after 'moment' (local time)."""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.fields["month"]:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.fields["hour"]:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.fields["minute"]:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression '{self.expression}' never matches.")
+
+    def next_run(self, previous_due, now):
+        after = max(previous_due or now, now)
+        return self.next_after(datetime.fromtimestamp(after)).timestamp()
+
+    def __str__(self):
+        return f"cron '{self.expression}'"
+
+# --- 2. DAEMON ---
+
+class DetectorDaemon:
+    """
+    Runs detect_anomalies() on a schedule with one warm connection and one compiled plan.
+
+    - Runs never overlap: they execute one after another in this process, and a lock
+      file next to the database keeps a second daemon (or a cron'd copy) from running
+      against the same database at the same time.
+    - 'jitter' adds up to that many random seconds to every wait, so several daemons
+      started together don't hit the database in lock-step.
+    - SIGINT / SIGTERM (or stop()) end the loop after the current run finishes.
+    - With watch=True the schedule is only the polling interval: a tick costs one PRAGMA
+      unless another connection committed, and detection runs only for the tables
+      listed in bronze_change_log. The daemon is the log's consumer and prunes it.
+    - An anomaly that keeps firing is logged once and then tracked in anomaly_incidents
+      (see db/incidents.py), unless incidents=False.
+    """
+
+    def __init__(self, schedule, incremental=True, workers=1, jitter=0.0, log_stats=False, max_runs=None,
+                 watch=False, incidents=True):
+        self.schedule = schedule
+        self.incremental = incremental
+        self.workers = workers
+        self.jitter = jitter
+        self.log_stats = log_stats
+        self.max_runs = max_runs
+        self.watch = watch
+        self.incidents = incidents
+        self.runs = 0
+        self._data_version = None
+        self._change_id = 0
+        self._stop = threading.Event()
+        self._lock_file = None
+
+    def stop(self, signum=None, frame=None):
+        """Requests a graceful shutdown (usable as a signal handler)."""
+        if signum is not None:
+            logging.info(f"Received signal {signum}; stopping after the current run.")
+        self._stop.set()
+
+    # --- Single-instance lock ---
+
+    def _acquire_lock(self, lock_path) -> bool:
+        self._lock_file = open(lock_path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            elif msvcrt is not None:
+                msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+        return True
+
+    def _release_lock(self):
+        if self._lock_file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._lock_file.close()
+            self._lock_file = None
+
+    # --- Main loop ---
+
+    def run_once(self, conn, plan):
+        """One detection pass; errors are logged and the daemon keeps going."""
+        started = time.perf_counter()
+        try:
+            findings = detect_anomalies(
+                conn, plan, incremental=self.incremental, workers=self.workers, log_stats=self.log_stats,
+                incidents=self.incidents
+            )
+            logging.info(f"Detection run {self.runs + 1} finished in {(time.perf_counter() - started) * 1000:.1f} ms "
+                         f"({len(findings)} anomalies).")
+        except Exception as e:
+            logging.error(f"Detection run {self.runs + 1} failed: {e}")
+        self.runs += 1
+
+    def run_changes(self, conn, plan):
+        """Watch mode tick: evaluates the tables changed since the previous tick, if any."""
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+
+        changes = read_changes(conn, self._change_id)
+        if not changes:
+            return
+
+        summary = summarize_changes(changes)
+        for table, change in summary.items():
+            logging.info(f"Change captured on {table}: {change['row_count']} row(s), "
+                         f"rowids {change['first_rowid']}-{change['last_rowid']}"
+                         f"{' (delete)' if change['deleted'] else ''}.")
+
+        # The incremental windows start at each table's watermark, so only the new rows are read
+        affected = [table_plan for table_plan in plan if table_plan["table"] in summary]
+        if affected:
+            self.run_once(conn, affected)
+
+        self._change_id = changes[-1]["change_id"]
+        prune_changes(conn, self._change_id)
+
+    def run(self) -> int:
+        """Runs until stopped (or max_runs). Returns the number of runs performed."""
+        db_path = get_db_path()
+        if db_path is None:
+            return 0
+
+        lock_path = f"{db_path}.detector.lock"
+        if not self._acquire_lock(lock_path):
+            logging.error(f"Another detector daemon holds {lock_path}. Exiting.")
+            return 0
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self.stop)
+            signal.signal(signal.SIGTERM, self.stop)
+
+        conn = get_db_connection()
+        if conn is None:
+            logging.error("Detector daemon failed to start: Database connection is unavailable.")
+            self._release_lock()
+            return 0
+
+        try:
+            # Everything a one-shot run repeats is done once here
+            ensure_detector_tables(conn, self.incremental)
+            plan = compile_plan(ANOMALY_RULES)
+            logging.info(f"Detector daemon started ({self.schedule}, "
+                         f"{'incremental' if self.incremental else 'full'} mode, {len(plan)} tables).")
+
+            if self.watch:
+                # Catch up once on everything, then follow the change log from here
+                self._change_id = latest_change_id(conn)
+                self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+                self.run_once(conn, plan)
+
+            due = None
+            while not self._stop.is_set():
+                if self.max_runs is not None and self.runs >= self.max_runs:
+                    break
+
+                due = self.schedule.next_run(due, time.time())
+                delay = max(0.0, due - time.time()) + random.uniform(0, self.jitter)
+                if self._stop.wait(delay):
+                    break
+
+                if self.watch:
+                    self.run_changes(conn, plan)
+                else:
+                    self.run_once(conn, plan)
+
+        finally:
+            conn.close()
+            self._release_lock()
+            logging.info(f"Detector daemon stopped after {self.runs} run(s).")
+
+        return self.runs
+
+# Allow running this file directly
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the anomaly detector continuously.")
+    schedule_group = parser.add_mutually_exclusive_group()
+    schedule_group.add_argument("--every", help="Run interval, e.g. '500ms', '5s', '2m', '1h' (poll interval with --watch).")
+    schedule_group.add_argument("--cron", help="5-field cron expression, e.g. '*/5 * * * *'.")
+    parser.add_argument("--watch", action="store_true",
+                        help="Event-driven: run only when bronze_change_log records new batches (polls every 100ms by default).")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Add up to this many random seconds to each wait.")
+    parser.add_argument("--full", action="store_true", help="Rescan whole tables instead of only new rows.")
+    parser.add_argument("--workers", type=int, default=1, help="Check tables in parallel on this many read-only connections.")
+    parser.add_argument("--log-stats", action="store_true", help="Log each check's cost as JSON lines.")
+    parser.add_argument("--no-incidents", action="store_true",
+                        help="Log every firing instead of one audit row per incident.")
+    parser.add_argument("--max-runs", type=int, default=None, help="Stop after this many runs.")
+    args = parser.parse_args()
+
+    if args.watch and args.cron:
+        parser.error("--watch polls on an interval; use --every instead of --cron.")
+    if not (args.watch or args.every or args.cron):
+        parser.error("one of --every, --cron or --watch is required.")
+
+    try:
+        if args.watch:
+            schedule = IntervalSchedule(parse_interval(args.every or "100ms"), log_missed=False)
+        elif args.every:
+            schedule = IntervalSchedule(parse_interval(args.every))
+        else:
+            schedule = CronSchedule(args.cron)
+    except ValueError as e:
+        parser.error(str(e))
+
+    daemon = DetectorDaemon(
+        schedule,
+        incremental=not args.full,
+        workers=args.workers,
+        jitter=args.jitter,
+        log_stats=args.log_stats,
+        max_runs=args.max_runs,
+        watch=args.watch,
+        incidents=not args.no_incidents
+    )
+    sys.exit(0 if daemon.run() else 1)
@@ -1,276 +1,131 @@
-import sqlite3
 import logging
-import json
-from datetime import datetime, timedelta
 
 # Import the necessary modules from your project structure
 from db.connection import get_db_connection 
-from db.utils import log_anomaly 
+from db.utils import AnomalyBuffer, new_run_id 
+from db.incidents import ensure_incidents_table, record_incidents
+from db.init_db import ensure_audit_table
+from db.rollups import ensure_rollups
+from db.backends import get_backend
 from anomaly.rules import ANOMALY_RULES 
+from anomaly.state import ensure_state_table
+from anomaly.metrics import ensure_metrics_table, save_metrics
+from anomaly.baselines import ensure_baselines_table
+from anomaly.sketches import ensure_sketches_table
+from anomaly.profiling import ensure_run_stats_table, log_run_stats, save_run_stats
+from anomaly.engine import compile_plan, run_plan, save_windows, save_window_baselines
 
 # Configure Logging (Ensure it's set up for the script)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# --- HELPER FUNCTION (The Fix) ---
-def table_exists(conn, table_name):
-    """Checks if a table exists in the DB to avoid crashes on first run."""
-    try:
-        cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
-        return cursor.fetchone() is not None
-    except sqlite3.Error:
-        return False
-
-# --- 1. DETECTION FUNCTIONS ---
-
-def check_volume_anomalies(conn):
-    """Checks for row count spikes, drops, deletions, and trend shifts."""
-    logging.info("--- Running Volume Checks ---")
-    
-    # --- Check 1: Volume issues in bronze_order_items (Spike vs Trend Shift) ---
-    table = "bronze_order_items"
-    if table_exists(conn, table):
-        rules = ANOMALY_RULES.get(table, {})
-        
-        # Fetch current count once for this table
-        cursor = conn.execute(f"SELECT COUNT(*) FROM {table}")
-        current_row_count = cursor.fetchone()[0]
-        
-        spike_rule = rules.get("row_count_spike")
-        shift_rule = rules.get("sustained_volume_shift")
-        
-        # Logic: Priority check. If it's a massive Spike, log Critical. 
-        if spike_rule and current_row_count > spike_rule["max_rows"]:
-            log_anomaly(
-                conn, 
-                source_table=table, 
-                category="Volume", 
-                check_name="row_count_spike", 
-                severity=spike_rule["severity"], 
-                metric_value=current_row_count, 
-                threshold_value=spike_rule["max_rows"], 
-                meta_data={"note": "CRITICAL: Batch exceeded max row count threshold."}
-            )
-        elif shift_rule and current_row_count > shift_rule["max_batch_rows"]:
-            log_anomaly(
-                conn, 
-                source_table=table, 
-                category="Volume", 
-                check_name="sustained_volume_shift", 
-                severity=shift_rule["severity"], 
-                metric_value=current_row_count, 
-                threshold_value=shift_rule["max_batch_rows"], 
-                meta_data={"note": "WARNING: Volume is elevated (Trend Shift detected)."}
-            )
-    else:
-        logging.warning(f"Skipping check for {table}: Table not created yet.")
-
-    # --- Check 2: Drop in bronze_customers ---
-    table = "bronze_customers"
-    if table_exists(conn, table):
-        rules = ANOMALY_RULES.get(table, {})
-        drop_rule = rules.get("row_count_drop")
-
-        if drop_rule:
-            min_rows = drop_rule["min_rows"]
-            severity = drop_rule["severity"]
-            
-            cursor = conn.execute(f"SELECT COUNT(*) FROM {table}")
-            current_row_count = cursor.fetchone()[0]
-            
-            if current_row_count < min_rows:
-                log_anomaly(
-                    conn, 
-                    source_table=table, 
-                    category="Volume", 
-                    check_name="row_count_drop", 
-                    severity=severity, 
-                    metric_value=current_row_count, 
-                    threshold_value=min_rows, 
-                    meta_data={"note": "Batch dropped below min row count threshold."}
-                )
-
-    # --- Check 3: Deletion in bronze_order_payments (Data Loss) ---
-    table = "bronze_order_payments"
-    if table_exists(conn, table):
-        rules = ANOMALY_RULES.get(table, {})
-        deletion_rule = rules.get("row_count_deletion")
-
-        if deletion_rule:
-            min_total = deletion_rule["min_total_rows"]
-            severity = deletion_rule["severity"]
-
-            cursor = conn.execute(f"SELECT COUNT(*) FROM {table}")
-            current_row_count = cursor.fetchone()[0]
-
-            if current_row_count < min_total:
-                log_anomaly(
-                    conn,
-                    source_table=table,
-                    category="Volume", 
-                    check_name="row_count_deletion",
-                    severity=severity,
-                    metric_value=current_row_count,
-                    threshold_value=min_total,
-                    meta_data={"note": "CRITICAL: Significant data loss detected."}
-                )
-
-
-def check_data_quality_anomalies(conn):
-    """Checks for nulls, duplicates, and outlier values."""
-    logging.info("--- Running Data Quality Checks ---")
-
-    # Check 4: Null Injection in bronze_products
-    table = "bronze_products"
-    if table_exists(conn, table):
-        rules = ANOMALY_RULES.get(table, {})
-        null_rule = rules.get("null_injection")
-
-        if null_rule:
-            column = null_rule["column"]
-            max_null_pct = null_rule["max_null_percentage"]
-            severity = null_rule["severity"]
-            
-            # Calculate the null percentage
-            query = f"""
-                SELECT 
-                    CAST(SUM(CASE WHEN {column} IS NULL THEN 1 ELSE 0 END) AS REAL) * 100 / COUNT(*),
-                    COUNT(*)
-                FROM {table}
-            """
-            cursor = conn.execute(query)
-            result = cursor.fetchone()
-            
-            if result and result[1] > 0:
-                null_percent = result[0] if result[0] is not None else 0.0
-                total_rows = result[1]
-                null_percent_as_ratio = null_percent / 100 
-                
-                if null_percent_as_ratio > max_null_pct:
-                    log_anomaly(
-                        conn, 
-                        source_table=table, 
-                        category="Data_Quality", 
-                        check_name="null_injection_check", 
-                        severity=severity, 
-                        metric_value=null_percent_as_ratio, 
-                        threshold_value=max_null_pct, 
-                        meta_data={"column": column, "total_rows": total_rows}
-                    )
-
-    # Check 5: Duplicates in bronze_order_payments
-    table = "bronze_order_payments"
-    if table_exists(conn, table):
-        rules = ANOMALY_RULES.get(table, {})
-        dup_rule = rules.get("duplicates")
-
-        if dup_rule:
-            max_dups = dup_rule["max_duplicate_count"]
-            severity = dup_rule["severity"]
-
-            query = f"SELECT COUNT(order_id) - COUNT(DISTINCT order_id) FROM {table}"
-            cursor = conn.execute(query)
-            duplicate_count = cursor.fetchone()[0]
-            
-            if duplicate_count > max_dups:
-                log_anomaly(
-                    conn, 
-                    source_table=table, 
-                    category="Data_Quality", 
-                    check_name="duplicate_payments_check", 
-                    severity=severity, 
-                    metric_value=duplicate_count, 
-                    threshold_value=max_dups, 
-                    meta_data={"note": "Detected excess duplicates based on order_id key."}
-                )
-
-    # Check 6: Outlier Value in bronze_order_items
-    table = "bronze_order_items"
-    if table_exists(conn, table):
-        rules = ANOMALY_RULES.get(table, {})
-        outlier_rule = rules.get("price_outlier")
-
-        if outlier_rule:
-            column = outlier_rule["column"]
-            max_value = outlier_rule["max_value"]
-            severity = outlier_rule["severity"]
-
-            query = f"SELECT COUNT(*) FROM {table} WHERE {column} > {max_value}"
-            cursor = conn.execute(query)
-            outlier_count = cursor.fetchone()[0]
-            
-            if outlier_count > 0:
-                log_anomaly(
-                    conn, 
-                    source_table=table, 
-                    category="Data_Quality", 
-                    check_name="price_outlier_check", 
-                    severity=severity, 
-                    metric_value=outlier_count, 
-                    threshold_value=max_value, 
-                    meta_data={"column": column, "note": f"Found {outlier_count} records above ${max_value}."}
-                )
-
-# --- 2. PIPELINE SLA CHECK ---
-
-def check_sla_anomalies(conn):
-    """Checks for data latency/staleness."""
-    logging.info("--- Running SLA Checks ---")
-    
-    # Check 7: Latency/Staleness in bronze_orders
-    table = "bronze_orders"
-    if table_exists(conn, table):
-        rules = ANOMALY_RULES.get(table, {})
-        latency_rule = rules.get("data_latency")
-        
-        if latency_rule:
-            column = latency_rule["column"]
-            max_latency_minutes = latency_rule["max_latency_minutes"]
-            severity = latency_rule["severity"]
-            
-            current_time = datetime.now()
-            latency_threshold = current_time - timedelta(minutes=max_latency_minutes)
-            
-            query = f"SELECT MIN({column}) FROM {table}"
-            cursor = conn.execute(query)
-            result = cursor.fetchone()
-            
-            if result and result[0]:
-                try:
-                    clean_ts = result[0].split('.')[0]
-                    oldest_data_time = datetime.strptime(clean_ts, '%Y-%m-%d %H:%M:%S')
-                    
-                    if oldest_data_time < latency_threshold:
-                        actual_latency_minutes = (current_time - oldest_data_time).total_seconds() / 60
-                        
-                        log_anomaly(
-                            conn, 
-                            source_table=table, 
-                            category="SLA", 
-                            check_name="data_latency_check", 
-                            severity=severity, 
-                            metric_value=actual_latency_minutes, 
-                            threshold_value=max_latency_minutes, 
-                            meta_data={"oldest_data_timestamp": result[0]}
-                        )
-                except ValueError as e:
-                    logging.warning(f"Could not parse timestamp '{result[0]}' for SLA check: {e}")
-
-# --- 3. MAIN EXECUTION ---
-
-def run_detector():
-    """Main function to execute all anomaly checks."""
-    logging.info("Starting Anomaly Detector Run...")
+# --- 1. DETECTION ---
+# The checks themselves are data-driven: every rule in anomaly/rules.py names a check
+# type from anomaly/checks.py, and anomaly/engine.py compiles all of them into one
+# fused aggregate query per table.
+
+def detect_anomalies(conn, plan=None, incremental=False, run_id=None, workers=1, log_stats=False, incidents=True):
+    """
+    Evaluates every rule against the bronze layer, logs the anomalies found and
+    records every measured metric in detector_metrics and the cost of every check
+    in detector_run_stats.
+
+    Args:
+        conn: The active SQLite database connection object.
+        plan: A plan from compile_plan(). Compiled from ANOMALY_RULES if omitted.
+        incremental: Only read rows appended since the last run (see run_detector).
+        run_id: Written to anomaly_audit_log.run_id. A new id is generated if omitted.
+        workers: Number of tables evaluated in parallel on read-only connections.
+            'conn' is then only used for the batched audit write and state update.
+        log_stats: Also emit the per-check stats as JSON log lines.
+        incidents: Fold repeated firings into open incidents (see db/incidents.py), so
+            an anomaly is logged once when it starts rather than on every run. With
+            False, every finding is logged.
+
+    Returns:
+        The list of findings that were logged.
+    """
+    if plan is None:
+        plan = compile_plan(ANOMALY_RULES)
+
+    if run_id is None:
+        run_id = new_run_id()
+
+    # DB_TYPE picks where the fused table scans run (db/backends.py); None means SQLite
+    windows, findings, metrics = run_plan(conn, plan, incremental, workers, backend=get_backend())
+
+    # Only checks that actually passed close their incident; suppressed and skipped ones weren't evaluated
+    if incidents:
+        passed = [
+            (table, stat["check_name"])
+            for table, window in windows.items()
+            for stat in window.get("stats", [])
+            if stat["outcome"] == "passed"
+        ]
+        findings = record_incidents(conn, run_id, findings, passed)
+
+    # One executemany() / one commit for the whole run instead of one per anomaly
+    with AnomalyBuffer(conn, run_id=run_id) as audit:
+        for finding in findings:
+            audit.add(**finding)
+
+    save_metrics(conn, run_id, metrics)
+    save_run_stats(conn, run_id, windows)
+    if log_stats:
+        log_run_stats(run_id, windows)
+    save_window_baselines(conn, windows)
+
+    # Advance the high-water marks only after every check has run
+    if incremental:
+        save_windows(conn, windows)
+
+    return findings
+
+# --- 2. MAIN EXECUTION ---
+
+def ensure_detector_tables(conn, incremental=False):
+    """Creates the tables the detector writes to (the incremental ones only if needed)."""
+    # The audit log first: its indexes and rollup trigger need it (e.g. on a new shard)
+    ensure_audit_table(conn)
+    ensure_incidents_table(conn)
+    ensure_rollups(conn)
+    ensure_metrics_table(conn)
+    ensure_baselines_table(conn)
+    ensure_run_stats_table(conn)
+    if incremental:
+        ensure_state_table(conn)
+        ensure_sketches_table(conn)
+
+
+def run_detector(incremental=False, workers=1, log_stats=False, incidents=True, run_id=None):
+    """
+    Main function to execute all anomaly checks.
+
+    Args:
+        incremental: If True, only rows appended since the last run are read and merged
+            into the running aggregates kept in detector_state. Deleting rows from the
+            tail of a table triggers a full rebuild; deletes elsewhere are not detected.
+        workers: If greater than 1, tables are checked in parallel by a pool of
+            read-only connections and the results are written in one batch.
+        log_stats: Emit each check's wall time, VM steps, rows scanned, query plan
+            and outcome as a JSON log line (they are always stored in detector_run_stats).
+        incidents: If False, log every firing instead of one row per incident.
+        run_id: Written to anomaly_audit_log.run_id. A new id is generated if omitted.
+
+    Returns:
+        The list of findings that were logged, or None if the run failed.
+    """
+    logging.info(f"Starting Anomaly Detector Run ({'incremental' if incremental else 'full'} mode)...")
     
     conn = get_db_connection()
     if conn is None:
         logging.error("Detector failed to run: Database connection is unavailable.")
-        return
+        return None
 
+    findings = None
     try:
-        # Run all check groups
-        check_volume_anomalies(conn)
-        check_data_quality_anomalies(conn)
-        check_sla_anomalies(conn)
+        ensure_detector_tables(conn, incremental)
+        findings = detect_anomalies(conn, incremental=incremental, run_id=run_id, workers=workers,
+                                    log_stats=log_stats, incidents=incidents)
         
     except Exception as e:
         logging.critical(f"A major error occurred during detection: {e}")
@@ -279,6 +134,8 @@ def run_detector():
         conn.close()
         logging.info("Anomaly Detector Run Complete.")
 
+    return findings
+
 # Entry point for the script
 if __name__ == "__main__":
-    run_detector()
\ No newline at end of file
+    run_detector()
@@ -0,0 +1,557 @@
+# anomaly/engine.py
+# Compiles ANOMALY_RULES into a query plan and evaluates it against the bronze layer.
+
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from db.connection import get_reader_connection
+from anomaly.checks import CHECK_TYPES, LATENCY_QUANTILES, SAMPLE_ROWS
+from anomaly.metrics import TABLE_SCAN_CHECK
+from anomaly.baselines import baseline_config, evaluate_baseline, load_baselines, save_baselines
+from anomaly.sketches import HyperLogLog, QuantileSketch, load_sketch, save_sketch
+from anomaly.profiling import explain_plan, profile_query, run_stat
+from anomaly.rules import ANOMALY_RULES
+from anomaly.state import load_state, save_state
+
+# --- HELPER FUNCTION (The Fix) ---
+def table_exists(conn, table_name):
+    """Checks if a table exists in the DB to avoid crashes on first run."""
+    try:
+        cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+        return cursor.fetchone() is not None
+    except sqlite3.Error:
+        return False
+
+# --- 1. QUERY PLAN ---
+# The plan holds one entry per table. All aggregates requested by the table's rules are
+# de-duplicated and fused into a single SELECT, so each table is read once per run no
+# matter how many rules point at it.
+
+def compile_plan(rules_config=None):
+    """
+    Compiles the rule configuration into a list of per-table plans.
+
+    Each plan is a dict with 'table', 'rules' (rule_name, rule, check_type tuples, in
+    config order), 'aggregates' ({key: (expressions, merge)}), 'sketches'
+    ({key: (expression, precision)}), 'models' ({key: rule}), the generated 'sql' and
+    'positions' ({key: column indexes of its expressions in the result row}).
+    Invalid rules are logged and left out of the plan.
+    """
+    if rules_config is None:
+        rules_config = ANOMALY_RULES
+
+    plan = []
+    for table, rules in rules_config.items():
+        table_rules = []
+        aggregates = {}
+        sketches = {}
+        models = {}
+
+        for rule_name, rule in rules.items():
+            check_type = CHECK_TYPES.get(rule.get("type"))
+            if check_type is None:
+                logging.error(f"Rule '{table}.{rule_name}' has unknown type '{rule.get('type')}'. Skipping it.")
+                continue
+
+            missing = [key for key in check_type["required"] if key not in rule]
+            if missing:
+                logging.error(f"Rule '{table}.{rule_name}' is missing {missing}. Skipping it.")
+                continue
+
+            table_rules.append((rule_name, rule, check_type))
+            for key, expressions, merge in check_type["aggregates"](rule):
+                aggregates[key] = (expressions, merge)
+            for key, expression, precision in check_type.get("sketches", lambda rule: [])(rule):
+                sketches[key] = (expression, precision)
+            for key, model_rule in check_type.get("models", lambda rule: [])(rule):
+                models[key] = model_rule
+
+        if not table_rules:
+            continue
+
+        # COUNT(*) always comes first: it is the number of rows in this run's window.
+        # An expression requested more than once (row_count is that same COUNT(*)) is
+        # selected once; 'positions' maps each aggregate to its columns in the row.
+        columns = ["COUNT(*)"]
+        positions = {}
+        for key, (expressions, _) in aggregates.items():
+            for expression in expressions:
+                if expression not in columns:
+                    columns.append(expression)
+            positions[key] = [columns.index(expression) for expression in expressions]
+        select_list = ",\n            ".join(columns).replace("{table}", table)
+
+        sql = f"""
+        SELECT
+            {select_list}
+        FROM {table}
+        WHERE rowid > :start AND rowid <= :end
+        """
+        plan.append({
+            "table": table, "rules": table_rules, "aggregates": aggregates,
+            "sketches": sketches, "models": models, "positions": positions, "sql": sql
+        })
+
+    return plan
+
+# --- 2. INCREMENTAL WINDOWS ---
+# A "window" is the rowid range a run evaluates for one table. In full mode it spans the
+# whole table; in incremental mode it starts at the high-water mark saved in detector_state,
+# and every aggregate is merged into the running value from the previous run.
+
+def get_window(conn, table_name, incremental=False):
+    """Returns the rowid window to evaluate for a table during this run."""
+    high_rowid = conn.execute(f"SELECT MAX(rowid) FROM {table_name}").fetchone()[0] or 0
+    start, previous = 0, {}
+
+    if incremental:
+        state = load_state(conn, table_name)
+        start, previous = state["last_rowid"], state["aggregates"]
+
+        # Bronze tables are append-only. If rowids went backwards, rows were deleted from
+        # the tail (e.g. load_deletion.py), so the running aggregates are no longer valid.
+        if high_rowid < start:
+            logging.warning(f"{table_name}: rowids moved below the saved watermark ({high_rowid} < {start}). Rebuilding running aggregates.")
+            start, previous = 0, {}
+
+    return {
+        "table": table_name,
+        "start": start,
+        "end": high_rowid,
+        "batch_rows": 0,
+        "previous": previous,
+        "aggregates": {},
+        "batch_aggregates": {},
+        "baselines": {},
+        "sketches": {},
+        "stats": []
+    }
+
+
+def merge_values(previous, batch_value, merge):
+    """Folds a batch aggregate into its running value ('sum', 'min' or 'max')."""
+    if previous is None:
+        return batch_value
+    if batch_value is None:
+        return previous
+    if merge == "sum":
+        return previous + batch_value
+    if merge == "min":
+        return min(previous, batch_value)
+    if merge == "max":
+        return max(previous, batch_value)
+    raise ValueError(f"Unknown merge type: {merge}")
+
+
+def save_windows(conn, windows):
+    """Persists the high-water mark and running aggregates of every evaluated table."""
+    for table_name, window in windows.items():
+        save_state(conn, table_name, window["end"], window["batch_rows"], window["aggregates"])
+        for key, sketch in window["sketches"].items():
+            save_sketch(conn, table_name, key, sketch)
+    conn.commit()
+
+
+def save_window_baselines(conn, windows):
+    """Persists the adaptive baseline states updated during this run."""
+    for table_name, window in windows.items():
+        if window["baselines"]:
+            save_baselines(conn, table_name, window["baselines"])
+    conn.commit()
+
+# --- 3. EXECUTION ---
+
+def scan_table(conn, table_plan, window, backend=None):
+    """
+    Runs the table's fused query over the window and merges the results into it.
+    The query runs on 'backend' (see db/backends.py) if given, else on 'conn'.
+    """
+    aggregates = table_plan["aggregates"]
+
+    # A running value we don't have yet (new rule or changed threshold) needs a full pass.
+    if window["start"] and not set(aggregates) <= set(window["previous"]):
+        logging.info(f"{window['table']}: new aggregates requested. Rebuilding from a full pass.")
+        window["start"], window["previous"] = 0, {}
+
+    params = {"start": window["start"], "end": window["end"]}
+    if backend is None:
+        row = list(conn.execute(table_plan["sql"], params).fetchone())
+    else:
+        row = list(backend.scan(conn, window["table"], table_plan["sql"], params))
+
+    window["batch_rows"] = row[0]
+    for key, (expressions, merge) in aggregates.items():
+        values = [row[position] for position in table_plan["positions"][key]]
+        if merge == "sum":
+            batch_value = sum(value or 0 for value in values)
+        else:
+            batch_value = values[0]
+        window["batch_aggregates"][key] = batch_value
+        window["aggregates"][key] = merge_values(window["previous"].get(key), batch_value, merge)
+
+    return window["aggregates"]
+
+
+def _stream_into_sketch(conn, table, expression, start, end, sketch, fetch_size):
+    """Adds the non-NULL values of 'expression' over rowids (start, end]. Returns a run stat."""
+    sql = f"SELECT {expression} FROM {table} WHERE rowid > ? AND rowid <= ?"
+    rows_scanned = 0
+    with profile_query(conn) as cost:
+        cursor = conn.execute(sql, (start, end))
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            rows_scanned += len(rows)
+            for row in rows:
+                if row[0] is not None:
+                    sketch.add(row[0])
+    return cost, rows_scanned, explain_plan(conn, sql, (start, end))
+
+
+def update_sketches(conn, table_plan, window, fetch_size=10000):
+    """
+    Brings every sketch of the table up to date with the window's rows.
+
+    HyperLogLog ('hll:') sketches: the persisted sketch is loaded and only the rows
+    appended since the last run are streamed into it; a missing sketch (or a full pass)
+    is rebuilt from the whole table. The estimates describe the whole table.
+
+    Latency ('latency:') sketches: a fresh quantile sketch is filled with the window's
+    rows, so its percentiles describe this batch only, then merged into the persisted
+    sketch, which keeps the distribution of every batch seen since it was created.
+
+    The values are stored as aggregates for the check types to read.
+    """
+    table = table_plan["table"]
+    for key, (expression, precision) in table_plan["sketches"].items():
+        kind, name = key.split(":", 1)
+        sketch = load_sketch(conn, table, key) if window["start"] else None
+        if sketch is not None and sketch.precision != precision:
+            sketch = None
+
+        if kind == "latency":
+            batch = QuantileSketch(precision)
+            cost, rows_scanned, plan = _stream_into_sketch(conn, table, expression, window["start"], window["end"], batch, fetch_size)
+            if sketch is None:
+                sketch = QuantileSketch(precision)
+            sketch.merge(batch)
+            values = {f"latency_count:{name}": batch.count}
+            for label, q in LATENCY_QUANTILES.items():
+                values[f"latency_{label}:{name}"] = batch.quantile(q)
+                values[f"latency_overall_{label}:{name}"] = sketch.quantile(q)
+            # Already per batch, so adaptive baselines can learn them as well
+            window["aggregates"].update(values)
+            window["batch_aggregates"].update(values)
+        else:
+            start = window["start"] if sketch is not None else 0
+            if sketch is None:
+                sketch = HyperLogLog(precision)
+            cost, rows_scanned, plan = _stream_into_sketch(conn, table, expression, start, window["end"], sketch, fetch_size)
+            estimate = sketch.cardinality()
+            window["aggregates"][f"distinct_estimate:{name}"] = estimate
+            window["aggregates"][f"distinct_error:{name}"] = estimate * sketch.relative_error()
+
+        window["sketches"][key] = sketch
+        window["stats"].append(run_stat(f"sketch:{key}", cost["wall_ms"], "ok", cost["vm_steps"], rows_scanned, plan))
+
+
+def update_models(conn, table_plan, window, fetch_size=50000):
+    """
+    Scores the window's rows with every row-level model of the table and updates it.
+
+    Models are persisted with the sketches and, like latency sketches, report on the
+    batch only; a missing model (or a full pass) is rebuilt from the whole table.
+    """
+    # Imported here: it needs NumPy, which detection runs without such rules never load
+    from anomaly.outliers import DEFAULT_PRECISION, CategoryHistograms, model_query, update_category_model
+
+    table = table_plan["table"]
+    for key, rule in table_plan["models"].items():
+        model = load_sketch(conn, table, key, CategoryHistograms) if window["start"] else None
+        if model is not None and model.precision != rule.get("sketch_precision", DEFAULT_PRECISION):
+            model = None
+
+        with profile_query(conn) as cost:
+            model, values, rows_scanned = update_category_model(conn, table, window, rule, model, fetch_size)
+        window["sketches"][key] = model
+        window["aggregates"].update(values)
+        window["batch_aggregates"].update(values)
+        window["stats"].append(run_stat(
+            f"model:{key}", cost["wall_ms"], "ok", cost["vm_steps"], rows_scanned,
+            explain_plan(conn, model_query(table, rule), (window["start"], window["end"]))
+        ))
+
+
+def evaluate_rules(table_plan, window, baselines=None):
+    """
+    Applies every rule of a table to the aggregates of its window.
+
+    Rules with a 'baseline' block are also scored against their adaptive baseline,
+    using the metric measured on the new batch only. Baselines only see incremental
+    batches (windows that start after a saved watermark): a full pass measures the
+    whole table, which is not a batch, so the baseline is neither scored nor updated
+    and, unless the static check fires, the rule is recorded as 'skipped'. The updated
+    baseline states are stored in window['baselines'].
+
+    A rule whose check type reports nothing to evaluate (see 'evaluated' in
+    anomaly/checks.py) is recorded as 'skipped' as well, so it does not resolve an
+    open incident.
+
+    Returns:
+        (findings, metrics): findings for the audit log, and every measured metric as
+        (source_table, check_name, metric_name, metric_value) tuples.
+    """
+    table = table_plan["table"]
+    aggregates = window["aggregates"]
+    if baselines is None:
+        baselines = {}
+    findings = []
+    metrics = []
+    fired = set()
+
+    for rule_name, rule, check_type in table_plan["rules"]:
+        started = time.perf_counter()
+        check_name = rule.get("check_name", rule_name)
+        for metric_name, metric_value in check_type["measure"](rule, aggregates).items():
+            metrics.append((table, check_name, metric_name, metric_value))
+
+        suppressed = rule.get("suppressed_by") in fired
+        # Nothing to judge (e.g. no new rows for a per-batch check): not a pass
+        skipped = not check_type.get("evaluated", lambda rule, aggregates: True)(rule, aggregates)
+        result = None if suppressed or skipped else check_type["evaluate"](rule, aggregates)
+
+        # Adaptive baseline: learn every non-empty incremental batch, even when the static
+        # check fired. Full passes would mix whole-table values into per-batch history.
+        config = baseline_config(rule)
+        baseline_skipped = config is not None and not window["start"]
+        if config and not skipped and window["start"] and window["batch_rows"] > 0:
+            metric_name = config.get("metric", check_type["metric"])
+            try:
+                batch_value = check_type["measure"](rule, window["batch_aggregates"]).get(metric_name)
+            except KeyError:
+                # Sketch-based metrics have no per-batch value
+                batch_value = None
+            if batch_value is not None:
+                key = (check_name, metric_name)
+                state, adaptive, baseline_metrics = evaluate_baseline(rule, batch_value, baselines.get(key))
+                window["baselines"][key] = state
+                for name, value in baseline_metrics.items():
+                    metrics.append((table, check_name, name, value))
+                if result is None and not suppressed:
+                    result = adaptive
+
+        if result is None:
+            outcome = "suppressed" if suppressed else "skipped" if skipped or baseline_skipped else "passed"
+            window["stats"].append(run_stat(check_name, (time.perf_counter() - started) * 1000, outcome))
+            continue
+
+        fired.add(rule_name)
+        meta_data = dict(result.get("meta_data") or {})
+        if "note" in rule:
+            meta_data.setdefault("note", rule["note"])
+
+        findings.append({
+            "source_table": table,
+            "category": rule.get("category", check_type["category"]),
+            "check_name": check_name,
+            "severity": rule["severity"],
+            "metric_value": result["metric_value"],
+            "threshold_value": result["threshold_value"],
+            "meta_data": meta_data or None
+        })
+        window["stats"].append(run_stat(check_name, (time.perf_counter() - started) * 1000, "fired"))
+
+    return findings, metrics
+
+
+def compact_value(value, max_chars=64):
+    """Shortens long text values so a sample stays small in meta_data."""
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + "..."
+    if isinstance(value, bytes):
+        return f"<{len(value)} bytes>"
+    return value
+
+
+def sample_offending_rows(conn, table_plan, window, findings):
+    """
+    Adds a bounded sample of offending rows to the meta_data of each finding.
+
+    The sample query of the check type is run over this run's window first; when the
+    rule fired on rows from earlier batches (incremental mode) and the window holds
+    none of them, it falls back to the whole table. Samples are stored as
+    {'columns': [...], 'rows': [[...]], 'scope': 'batch' | 'table'}.
+    """
+    # '+rowid' keeps the planner off the rowid range, so a whole-table search goes
+    # through the column index instead of walking every row
+    window_filters = {"batch": "rowid > :start AND rowid <= :end", "table": "+rowid <= :end"}
+    rules = {rule.get("check_name", rule_name): (rule, check_type) for rule_name, rule, check_type in table_plan["rules"]}
+    for finding in findings:
+        rule, check_type = rules[finding["check_name"]]
+        limit = rule.get("sample_rows", SAMPLE_ROWS)
+        if "sample" not in check_type or not limit:
+            continue
+        query = check_type["sample"](table_plan["table"], rule, window["aggregates"])
+        if query is None:
+            continue
+
+        sql, params = query
+        scopes = ["batch", "table"] if window["start"] else ["table"]
+        for scope in scopes:
+            scoped_sql = sql.replace("{window}", window_filters[scope])
+            bound = dict(params, start=window["start"], end=window["end"], limit=limit)
+            with profile_query(conn) as cost:
+                cursor = conn.execute(scoped_sql, bound)
+                rows = cursor.fetchall()
+            # One stat per scope: a batch miss followed by a table search costs both. The
+            # rows returned are no measure of the work, so only VM steps are recorded.
+            window["stats"].append(run_stat(
+                f"sample:{finding['check_name']}:{scope}", cost["wall_ms"], "ok", cost["vm_steps"],
+                query_plan=explain_plan(conn, scoped_sql, bound)
+            ))
+            if rows:
+                break
+        if not rows:
+            continue
+
+        meta_data = dict(finding["meta_data"] or {})
+        meta_data["sample"] = {
+            "columns": [column[0] for column in cursor.description],
+            "rows": [[compact_value(value) for value in row] for row in rows],
+            "scope": scope
+        }
+        finding["meta_data"] = meta_data
+
+
+def evaluate_table(conn, table_plan, incremental=False, backend=None):
+    """
+    Reads one table (a single fused query) and evaluates all of its rules. The fused
+    query runs on 'backend' if given; everything else uses 'conn'.
+
+    Returns:
+        (window, findings, metrics), or None if the table does not exist yet.
+    """
+    table = table_plan["table"]
+    if not table_exists(conn, table):
+        logging.warning(f"Skipping checks for {table}: Table not created yet.")
+        return None
+
+    window = get_window(conn, table, incremental)
+    with profile_query(conn) as cost:
+        scan_table(conn, table_plan, window, backend)
+    if backend is None:
+        vm_steps = cost["vm_steps"]
+        query_plan = explain_plan(conn, table_plan["sql"], {"start": window["start"], "end": window["end"]})
+    else:
+        vm_steps, query_plan = None, backend.describe()
+    window["stats"].append(run_stat(
+        TABLE_SCAN_CHECK, cost["wall_ms"], "ok", vm_steps, window["batch_rows"], query_plan
+    ))
+    if table_plan["sketches"]:
+        update_sketches(conn, table_plan, window)
+    if table_plan["models"]:
+        update_models(conn, table_plan, window)
+
+    baselines = None
+    if any(baseline_config(rule) for _, rule, _ in table_plan["rules"]):
+        baselines = load_baselines(conn, table)
+    findings, metrics = evaluate_rules(table_plan, window, baselines)
+    if findings:
+        sample_offending_rows(conn, table_plan, window, findings)
+
+    # Window-level metrics give per-batch deltas without rescanning the table later
+    metrics.append((table, TABLE_SCAN_CHECK, "batch_rows", window["batch_rows"]))
+    metrics.append((table, TABLE_SCAN_CHECK, "high_rowid", window["end"]))
+    return window, findings, metrics
+
+
+def _evaluate_on_reader(table_plan, incremental, connection_factory, backend=None):
+    """Worker body for run_plan_parallel(): borrows a reader connection for one table."""
+    conn = connection_factory()
+    if conn is None:
+        raise sqlite3.OperationalError("No reader connection available.")
+    try:
+        return evaluate_table(conn, table_plan, incremental, backend)
+    finally:
+        conn.close()
+
+
+def run_plan_parallel(plan, incremental=False, workers=4, connection_factory=None, backend=None):
+    """
+    Evaluates each table of the plan on its own read-only connection in a thread pool.
+
+    The tables are independent and SQLite (in WAL mode) lets readers run side by side,
+    while the sqlite3 module releases the GIL during query execution, so wall-clock
+    time is set by the slowest table rather than the sum of all tables. A table that
+    fails is logged and skipped; the others still report.
+
+    Returns:
+        (windows, findings, metrics), in plan order, like run_plan().
+    """
+    if connection_factory is None:
+        connection_factory = get_reader_connection
+
+    windows = {}
+    findings = []
+    metrics = []
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="detector") as executor:
+        futures = [
+            (table_plan["table"], executor.submit(_evaluate_on_reader, table_plan, incremental, connection_factory, backend))
+            for table_plan in plan
+        ]
+
+        for table, future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                logging.error(f"Checks for {table} failed: {e}")
+                continue
+            if result is None:
+                continue
+            window, table_findings, table_metrics = result
+            windows[table] = window
+            findings.extend(table_findings)
+            metrics.extend(table_metrics)
+
+    return windows, findings, metrics
+
+
+def run_plan(conn, plan, incremental=False, workers=1, backend=None):
+    """
+    Evaluates a compiled plan.
+
+    Args:
+        conn: Connection used when workers == 1.
+        plan: A plan from compile_plan().
+        incremental: Only read rows appended since the last run.
+        workers: With more than one worker, tables are evaluated in parallel on pooled
+            read-only connections (see run_plan_parallel).
+        backend: Runs the fused table scans (see db/backends.py). None runs them on
+            the SQLite connections.
+
+    Returns:
+        (windows, findings, metrics): the evaluated window per table (pass to
+        save_windows() in incremental mode), the findings, ready for AnomalyBuffer.add()
+        or log_anomaly(), and the measured metrics for save_metrics().
+    """
+    if workers > 1:
+        return run_plan_parallel(plan, incremental, workers, backend=backend)
+
+    windows = {}
+    findings = []
+    metrics = []
+
+    for table_plan in plan:
+        result = evaluate_table(conn, table_plan, incremental, backend)
+        if result is None:
+            continue
+        window, table_findings, table_metrics = result
+        windows[table_plan["table"]] = window
+        findings.extend(table_findings)
+        metrics.extend(table_metrics)
+
+    return windows, findings, metrics
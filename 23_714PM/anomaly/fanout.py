@@ -0,0 +1,175 @@
+# anomaly/fanout.py
+# Fan-out detection over many databases: one Olist-style SQLite file per region or tenant.
+#
+# Each shard is checked by run_detector() in a worker process, with DB_PATH pointing at
+# the shard, so its detector state, metrics, incidents and audit log stay in the shard
+# as with a single database. Shards share nothing, so the processes scale across all
+# cores without contending for a lock. The parent collects every shard's findings, logs
+# them to one central anomaly_audit_log (meta_data['shard'] names the shard) under one
+# run_id, and prints a per-shard report.
+
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Fix imports (this file is run directly, like init_db.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.connection import get_db_connection, get_db_path
+from db.init_db import ensure_audit_table
+from db.rollups import ensure_rollups
+from db.utils import AnomalyBuffer, new_run_id
+from anomaly.detector import run_detector
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def expand_shards(patterns, exclude=None) -> list:
+    """Expands file names and glob patterns into a sorted, de-duplicated list of shard files."""
+    excluded = os.path.abspath(exclude) if exclude else None
+    shards = {}
+    for pattern in patterns:
+        matches = glob.glob(pattern) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.abspath(path) != excluded:
+                shards.setdefault(os.path.abspath(path), path)
+    return sorted(shards.values())
+
+
+def detect_shard(shard, run_id, incremental=False, log_stats=False, incidents=True) -> dict:
+    """
+    Worker body: runs the detector against one shard.
+
+    DB_PATH is switched per task; the connection pool notices the new path and reopens,
+    so a worker process can check any number of shards one after another.
+    """
+    started = time.perf_counter()
+    if not os.path.exists(shard):
+        return {"shard": shard, "findings": [], "error": "database file not found",
+                "wall_ms": 0.0}
+
+    # An absolute DB_PATH is used as is rather than joined to the project root
+    os.environ["DB_PATH"] = os.path.abspath(shard)
+    findings = run_detector(incremental=incremental, log_stats=log_stats, incidents=incidents, run_id=run_id)
+    return {
+        "shard": shard,
+        "findings": findings or [],
+        "error": None if findings is not None else "detector run failed",
+        "wall_ms": (time.perf_counter() - started) * 1000
+    }
+
+
+def write_central_log(conn, run_id, results) -> int:
+    """Logs every shard's findings to the central anomaly_audit_log. Returns the rows written."""
+    with AnomalyBuffer(conn, run_id=run_id) as audit:
+        for result in results:
+            for finding in result["findings"]:
+                meta_data = dict(finding["meta_data"] or {})
+                meta_data["shard"] = result["shard"]
+                audit.add(**{**finding, "meta_data": meta_data})
+    return audit.written
+
+
+def run_fanout(shards, central_db=None, workers=None, incremental=False, log_stats=False, incidents=True) -> dict:
+    """
+    Checks every shard in a process pool and aggregates the findings.
+
+    Args:
+        shards: Database files (see expand_shards).
+        central_db: Database holding the central audit log. Defaults to DB_PATH; the
+            audit log and its rollups are created there if missing.
+        workers: Worker processes (default: one per core).
+        incremental, log_stats, incidents: Passed to run_detector() for every shard.
+
+    Returns:
+        The report: run_id, per-shard results (without the findings), totals.
+    """
+    run_id = new_run_id()
+    workers = max(1, min(workers or os.cpu_count() or 1, len(shards) or 1))
+    logging.info(f"Fan-out run {run_id}: {len(shards)} shard(s) on {workers} worker process(es).")
+
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(detect_shard, shard, run_id, incremental, log_stats, incidents): shard
+            for shard in shards
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"shard": futures[future], "findings": [], "error": str(e), "wall_ms": 0.0}
+            results.append(result)
+    results.sort(key=lambda result: result["shard"])
+
+    # The parent only connects now: a pooled connection must not be inherited by the workers
+    if central_db:
+        os.environ["DB_PATH"] = os.path.abspath(central_db)
+    written = 0
+    conn = get_db_connection()
+    if conn is None:
+        logging.error("Central audit log unavailable; the findings were only logged in the shards.")
+    else:
+        try:
+            ensure_audit_table(conn)
+            ensure_rollups(conn)
+            written = write_central_log(conn, run_id, results)
+        except Exception as e:
+            logging.error(f"Could not write the central audit log: {e}")
+        finally:
+            conn.close()
+
+    report = {
+        "run_id": run_id,
+        "shards": [
+            {"shard": result["shard"], "anomalies": len(result["findings"]), "error": result["error"],
+             "wall_ms": round(result["wall_ms"], 1)}
+            for result in results
+        ],
+        "anomalies": sum(len(result["findings"]) for result in results),
+        "failed": sum(1 for result in results if result["error"]),
+        "central_rows": written,
+        "wall_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+    return report
+
+
+def print_report(report):
+    for shard in report["shards"]:
+        status = f"failed: {shard['error']}" if shard["error"] else f"{shard['anomalies']} anomalies"
+        print(f"{shard['shard']:<40} | {shard['wall_ms']:9.1f} ms | {status}")
+    print(f"\n{len(report['shards'])} shard(s), {report['anomalies']} anomalies, {report['failed']} failed, "
+          f"{report['central_rows']} row(s) in the central audit log, {report['wall_ms']:.1f} ms (run {report['run_id']}).")
+
+# Allow running this file directly
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the anomaly detector against many databases in parallel.")
+    parser.add_argument("shards", nargs="+", help="Database files or glob patterns, e.g. 'shards/*.sqlite'.")
+    parser.add_argument("--central", default=None, help="Database for the central audit log (default: DB_PATH).")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core).")
+    parser.add_argument("--incremental", action="store_true", help="Only evaluate rows appended since each shard's last run.")
+    parser.add_argument("--log-stats", action="store_true", help="Log each check's cost as JSON lines.")
+    parser.add_argument("--no-incidents", action="store_true",
+                        help="Log every firing instead of one audit row per incident.")
+    parser.add_argument("--output", default=None, help="Also write the report to this JSON file.")
+    args = parser.parse_args()
+
+    # The central database is never checked as a shard, even if a pattern matches it
+    central = os.path.abspath(args.central) if args.central else get_db_path()
+    shards = expand_shards(args.shards, exclude=central and str(central))
+    if not shards:
+        parser.error("no database files matched.")
+
+    report = run_fanout(shards, args.central, args.workers, args.incremental, args.log_stats, not args.no_incidents)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if report["failed"] == 0 else 1)
@@ -0,0 +1,81 @@
+# anomaly/metrics.py
+# Time series of every metric the detector measures, whether or not a rule fired.
+
+import logging
+import sqlite3
+
+# One row per (run, table, check, metric). WITHOUT ROWID keeps the table clustered on
+# its primary key, and the series index serves "history of one metric" queries
+# (Grafana panels, per-batch deltas, baselines) without touching the bronze tables.
+CREATE_METRICS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS detector_metrics (
+    run_id TEXT NOT NULL,             -- Detector run (same id as anomaly_audit_log.run_id)
+    source_table TEXT NOT NULL,       -- Bronze table measured
+    check_name TEXT NOT NULL,         -- Rule check name, or 'table_scan' for window metrics
+    metric_name TEXT NOT NULL,        -- e.g. 'row_count', 'null_ratio', 'batch_rows'
+    metric_value REAL,
+    measured_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (run_id, source_table, check_name, metric_name)
+) WITHOUT ROWID;
+"""
+
+CREATE_METRICS_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS idx_detector_metrics_series
+ON detector_metrics (source_table, check_name, metric_name, measured_at);
+"""
+
+# Window-level metrics are stored under this check name
+TABLE_SCAN_CHECK = "table_scan"
+
+
+def ensure_metrics_table(conn):
+    """Creates the detector_metrics table and its series index on first use."""
+    conn.execute(CREATE_METRICS_TABLE_SQL)
+    conn.execute(CREATE_METRICS_INDEX_SQL)
+    conn.commit()
+
+
+def save_metrics(conn, run_id: str, metrics: list):
+    """
+    Writes a run's metrics in one transaction.
+
+    Args:
+        conn: The active SQLite database connection object.
+        run_id: The detector run the metrics belong to.
+        metrics: (source_table, check_name, metric_name, metric_value) tuples.
+    """
+    rows = [
+        (run_id, source_table, check_name, metric_name, metric_value)
+        for source_table, check_name, metric_name, metric_value in metrics
+        if metric_value is None or isinstance(metric_value, (int, float))
+    ]
+    if not rows:
+        return
+
+    try:
+        with conn:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO detector_metrics
+                (run_id, source_table, check_name, metric_name, metric_value)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                rows
+            )
+    except sqlite3.Error as e:
+        logging.error(f"Failed to save detector metrics for run {run_id}: {e}")
+
+
+def metric_history(conn, source_table: str, check_name: str, metric_name: str, limit: int = 100):
+    """Returns the latest (measured_at, run_id, metric_value) points of one metric, newest first."""
+    cursor = conn.execute(
+        """
+        SELECT measured_at, run_id, metric_value
+        FROM detector_metrics
+        WHERE source_table = ? AND check_name = ? AND metric_name = ?
+        ORDER BY measured_at DESC
+        LIMIT ?
+        """,
+        (source_table, check_name, metric_name, limit)
+    )
+    return cursor.fetchall()
@@ -0,0 +1,194 @@
+# anomaly/outliers.py
+# Per-category outlier model for the 'category_outlier' check type.
+#
+# Each category keeps a histogram of log10(value) in fixed bins, held as one NumPy
+# matrix with a row per category. Quartiles (and the Tukey fences derived from them) come
+# from the cumulative counts of all rows at once, and a batch is scored with array
+# indexing, so the cost follows the number of rows in the batch, not the number of
+# categories. Histograms merge by adding counts, so the model only ever reads the rows
+# appended since the last run. The engine imports this module on first use: NumPy is
+# not loaded by detection runs that have no such rule.
+
+import json
+import struct
+
+import numpy as np
+
+# Histogram range, in log10 units (0.01 to 10,000,000). Values outside it land in an
+# underflow / overflow bin at either end.
+LOG_MIN = -2.0
+LOG_MAX = 7.0
+
+DEFAULT_PRECISION = 20           # Bins per decade (~12% wide)
+DEFAULT_IQR_MULTIPLIER = 3.0
+DEFAULT_MIN_IQR = 0.3            # Floor on the IQR in log10 units (a factor of 2)
+DEFAULT_MIN_CATEGORY_ROWS = 20   # Rows a category needs before it is scored
+
+OUTLIER_ROWIDS = 20              # Rowids kept for the offending-row sample
+TOP_CATEGORIES = 5               # Categories listed in meta_data
+
+
+class CategoryHistograms:
+    """Log-binned value histograms, one row per category. Persisted like a sketch."""
+
+    HEADER = struct.Struct("<I")     # Length of the JSON category list
+
+    def __init__(self, precision: int = DEFAULT_PRECISION, data: bytes | None = None):
+        if not 1 <= precision <= 100:
+            raise ValueError("CategoryHistograms precision must be between 1 and 100.")
+        self.precision = precision
+        self.bins = int((LOG_MAX - LOG_MIN) * precision) + 2
+        self.categories = []
+        self.index = {}
+        self.counts = np.zeros((0, self.bins), dtype=np.uint32)
+        if data is not None:
+            self._load(data)
+
+    def _load(self, data: bytes):
+        (size,) = self.HEADER.unpack_from(data)
+        categories = json.loads(data[self.HEADER.size:self.HEADER.size + size])
+        counts = np.frombuffer(data, dtype="<u4", offset=self.HEADER.size + size)
+        if counts.size != len(categories) * self.bins:
+            raise ValueError("Histogram size does not match its category list.")
+        self.categories = categories
+        self.index = {name: i for i, name in enumerate(categories)}
+        self.counts = counts.reshape(len(categories), self.bins).astype(np.uint32)
+
+    def to_bytes(self) -> bytes:
+        names = json.dumps(self.categories).encode()
+        return self.HEADER.pack(len(names)) + names + self.counts.astype("<u4").tobytes()
+
+    def rows_for(self, names) -> np.ndarray:
+        """Maps a sequence of category names to histogram rows, adding rows for new categories."""
+        index = self.index
+        new = sorted(set(names).difference(index))
+        if new:
+            for name in new:
+                index[name] = len(self.categories)
+                self.categories.append(name)
+            self.counts = np.vstack([self.counts, np.zeros((len(new), self.bins), dtype=np.uint32)])
+        return np.fromiter((index[name] for name in names), dtype=np.intp, count=len(names))
+
+    def bins_for(self, values: np.ndarray) -> np.ndarray:
+        """Histogram bin of each (positive or not) value."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            logs = np.where(values > 0, np.log10(values), -np.inf)
+        bins = np.floor((logs - LOG_MIN) * self.precision) + 1
+        return np.clip(bins, 0, self.bins - 1).astype(np.intp)
+
+    def add(self, rows: np.ndarray, bins: np.ndarray):
+        """Counts one value per (row, bin) pair."""
+        flat = np.bincount(rows * self.bins + bins, minlength=self.counts.size)
+        self.counts += flat.reshape(self.counts.shape).astype(np.uint32)
+
+    def fences(self, iqr_multiplier: float, min_rows: int, min_iqr: float = DEFAULT_MIN_IQR):
+        """
+        Returns (lower, upper, scored): Tukey fences per category in value units, and
+        which categories have enough rows to be scored (the others get infinite fences).
+
+        Quartiles are taken at the outer edges of their bins, so the fences never cut
+        into a bin that holds ordinary values, and the IQR is at least 'min_iqr', so a
+        category with a handful of distinct prices isn't flagged for ordinary variation.
+        """
+        totals = self.counts.sum(axis=1)
+        cumulative = self.counts.cumsum(axis=1)
+        q1 = (cumulative >= 0.25 * totals[:, None]).argmax(axis=1)
+        q3 = (cumulative >= 0.75 * totals[:, None]).argmax(axis=1)
+        low = LOG_MIN + (q1 - 1) / self.precision
+        high = LOG_MIN + q3 / self.precision
+        spread = iqr_multiplier * np.maximum(high - low, min_iqr)
+
+        scored = totals >= min_rows
+        lower = np.where(scored, 10.0 ** (low - spread), -np.inf)
+        upper = np.where(scored, 10.0 ** (high + spread), np.inf)
+        return lower, upper, scored
+
+
+def model_query(table, rule):
+    """
+    Window rows as (rowid, category, value). 'category_key' must identify one row of
+    the lookup table; the join is served by its index, or by an automatic index that
+    SQLite builds for the query when there is none.
+    """
+    column, key = rule["column"], rule["category_key"]
+    return f"""
+        SELECT t.rowid, COALESCE(c.{rule['category_column']}, '') AS category, t.{column}
+        FROM {table} t
+        LEFT JOIN {rule['category_table']} c ON c.{key} = t.{key}
+        WHERE t.rowid > ? AND t.rowid <= ? AND t.{column} IS NOT NULL
+        """
+
+
+def _chunks(conn, sql, start, end, model, fetch_size):
+    """Yields (rowids, rows, values, bins) arrays for the window, fetch_size rows at a time."""
+    cursor = conn.execute(sql, (start, end))
+    while True:
+        fetched = cursor.fetchmany(fetch_size)
+        if not fetched:
+            break
+        rowids, names, values = zip(*fetched)
+        values = np.array(values, dtype=np.float64)
+        yield np.array(rowids, dtype=np.int64), model.rows_for(names), values, model.bins_for(values)
+
+
+def update_category_model(conn, table, window, rule, model=None, fetch_size=50000):
+    """
+    Scores the window's rows against the learned fences, then adds them to the model.
+
+    With a persisted model the rows are scored against what earlier batches learned, in
+    one pass. Without one (first run or full pass) the model is rebuilt from the whole
+    table first and the table is then scored against it, like a classic IQR check. That
+    takes two passes over the lookup query, both streamed fetch_size rows at a time, so
+    memory stays bounded by the model and one chunk whatever the size of the table.
+
+    Returns:
+        (model, aggregates, rows_scanned), with per-batch aggregates keyed by column:
+        'category_outliers', 'categories_scored', 'category_outlier_groups'
+        ([category, outliers, lower, upper] for the worst categories) and
+        'category_outlier_rowids'.
+    """
+    column = rule["column"]
+    sql = model_query(table, rule)
+    rows_scanned = 0
+    start = window["start"]
+    learned = model is None
+    if learned:
+        model = CategoryHistograms(rule.get("sketch_precision", DEFAULT_PRECISION))
+        start = 0
+        for rowids, rows, _, bins in _chunks(conn, sql, start, window["end"], model, fetch_size):
+            rows_scanned += len(rowids)
+            model.add(rows, bins)
+
+    lower, upper, scored = model.fences(
+        rule.get("iqr_multiplier", DEFAULT_IQR_MULTIPLIER),
+        rule.get("min_category_rows", DEFAULT_MIN_CATEGORY_ROWS),
+        rule.get("min_iqr", DEFAULT_MIN_IQR)
+    )
+    fenced = len(lower)
+    per_category = np.zeros(fenced, dtype=np.int64)
+    outlier_rowids = []
+
+    for rowids, rows, values, bins in _chunks(conn, sql, start, window["end"], model, fetch_size):
+        rows_scanned += len(rowids)
+        # Categories first seen in this batch have no fences yet
+        known = rows < fenced
+        outliers = np.zeros(len(rows), dtype=bool)
+        outliers[known] = (values[known] < lower[rows[known]]) | (values[known] > upper[rows[known]])
+        per_category += np.bincount(rows[outliers], minlength=fenced)[:fenced]
+        if len(outlier_rowids) < OUTLIER_ROWIDS:
+            outlier_rowids.extend(rowids[outliers][:OUTLIER_ROWIDS - len(outlier_rowids)].tolist())
+        if not learned:
+            model.add(rows, bins)
+
+    worst = [i for i in np.argsort(-per_category, kind="stable")[:TOP_CATEGORIES] if per_category[i]]
+    groups = [
+        [model.categories[i] or None, int(per_category[i]), round(float(lower[i]), 2), round(float(upper[i]), 2)]
+        for i in worst
+    ]
+    aggregates = {
+        f"category_outliers:{column}": int(per_category.sum()),
+        f"categories_scored:{column}": int(scored.sum()),
+        f"category_outlier_groups:{column}": groups,
+        f"category_outlier_rowids:{column}": outlier_rowids
+    }
+    return model, aggregates, rows_scanned
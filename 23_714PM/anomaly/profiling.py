@@ -0,0 +1,126 @@
+# anomaly/profiling.py
+# Per-check cost of every detector run: wall time, SQLite VM steps, rows scanned,
+# query plan and outcome, so a slow run can be traced to the check responsible.
+
+import json
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+
+# One row per (run, table, check). 'check_name' is the rule's check name for rule
+# evaluation, 'table_scan' for the table's fused aggregate query, 'sketch:<key>' and
+# 'model:<key>' for sketch and model maintenance, and 'sample:<check>:<scope>' for
+# each offending-row sample query ('batch' or 'table' scope). The fused query is shared
+# by all rules of a table, so its cost is recorded once, on the table_scan row, and
+# rule evaluation (which reads no rows) has no rows_scanned.
+CREATE_RUN_STATS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS detector_run_stats (
+    run_id TEXT NOT NULL,             -- Detector run (same id as anomaly_audit_log.run_id)
+    source_table TEXT NOT NULL,
+    check_name TEXT NOT NULL,
+    wall_ms REAL,                     -- Elapsed time of the step
+    vm_steps INTEGER,                 -- SQLite virtual machine instructions (progress handler)
+    rows_scanned INTEGER,             -- Rows read by the step (NULL when not counted)
+    query_plan TEXT,                  -- EXPLAIN QUERY PLAN steps, joined with ' | '
+    outcome TEXT,                     -- 'ok', 'fired', 'passed', 'suppressed' or 'skipped'
+    measured_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (run_id, source_table, check_name)
+) WITHOUT ROWID;
+"""
+
+CREATE_RUN_STATS_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS idx_detector_run_stats_series
+ON detector_run_stats (source_table, check_name, measured_at);
+"""
+
+# The progress handler fires every PROGRESS_STEPS VM instructions; vm_steps is
+# therefore accurate to this resolution and costs one Python call per interval.
+PROGRESS_STEPS = 1000
+
+
+def ensure_run_stats_table(conn):
+    """Creates the detector_run_stats table and its series index on first use."""
+    conn.execute(CREATE_RUN_STATS_TABLE_SQL)
+    conn.execute(CREATE_RUN_STATS_INDEX_SQL)
+    conn.commit()
+
+
+@contextmanager
+def profile_query(conn):
+    """
+    Measures the statements run on 'conn' inside the block.
+
+    Yields a dict that holds 'wall_ms' and 'vm_steps' once the block exits.
+    """
+    stats = {"wall_ms": None, "vm_steps": 0}
+    calls = 0
+
+    def on_progress():
+        nonlocal calls
+        calls += 1
+        return 0   # Non-zero would abort the query
+
+    conn.set_progress_handler(on_progress, PROGRESS_STEPS)
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats["wall_ms"] = (time.perf_counter() - start) * 1000
+        conn.set_progress_handler(None, 0)
+        stats["vm_steps"] = calls * PROGRESS_STEPS
+
+
+def explain_plan(conn, sql, params=()):
+    """Returns the EXPLAIN QUERY PLAN steps of a query as one line (None if it fails)."""
+    try:
+        return " | ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+    except sqlite3.Error:
+        return None
+
+
+def run_stat(check_name, wall_ms, outcome, vm_steps=None, rows_scanned=None, query_plan=None):
+    """Builds one stats record (stored in window['stats'] by the engine)."""
+    return {
+        "check_name": check_name,
+        "wall_ms": wall_ms,
+        "vm_steps": vm_steps,
+        "rows_scanned": rows_scanned,
+        "query_plan": query_plan,
+        "outcome": outcome
+    }
+
+
+def save_run_stats(conn, run_id: str, windows: dict):
+    """Writes the stats collected in every evaluated window in one transaction."""
+    rows = [
+        (run_id, table_name, stat["check_name"], stat["wall_ms"], stat["vm_steps"],
+         stat["rows_scanned"], stat["query_plan"], stat["outcome"])
+        for table_name, window in windows.items()
+        for stat in window.get("stats", [])
+    ]
+    if not rows:
+        return
+
+    try:
+        with conn:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO detector_run_stats
+                (run_id, source_table, check_name, wall_ms, vm_steps, rows_scanned, query_plan, outcome)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows
+            )
+    except sqlite3.Error as e:
+        logging.error(f"Failed to save detector run stats for run {run_id}: {e}")
+
+
+def log_run_stats(run_id: str, windows: dict):
+    """Emits one JSON log line per stats record (for log shippers / grep)."""
+    for table_name, window in windows.items():
+        for stat in window.get("stats", []):
+            record = {"event": "detector_check_stats", "run_id": run_id, "source_table": table_name, **stat}
+            if record["wall_ms"] is not None:
+                record["wall_ms"] = round(record["wall_ms"], 3)
+            logging.info(json.dumps(record))
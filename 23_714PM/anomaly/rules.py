@@ -3,58 +3,124 @@
 
 # Define a dictionary for each table that needs a rule.
 # Each key represents the rule or metric being checked.
+#
+# Every rule names a check 'type' from anomaly/checks.py (row_count, null_ratio,
+# duplicate_count, value_range, timestamp_lag, category_outlier). Optional keys:
+#   - check_name:    name written to anomaly_audit_log (defaults to the rule key)
+#   - category:      overrides the check type's default category
+#   - note:          added to meta_data when the rule fires
+#   - suppressed_by: rule key on the same table that takes priority over this one
+#   - baseline:      adaptive mode (see anomaly/baselines.py). The rule's metric is
+#                    learned per batch with O(1) state (EWMA mean/variance or streaming
+#                    median/MAD) and batches far from the learned normal are flagged,
+#                    in addition to any static threshold. Only incremental runs
+#                    (trigger.py --incremental, the daemon) learn and score it. Full
+#                    runs, trigger.py's default, skip baseline rules entirely.
+#   - sample_rows:   how many offending rows (or duplicated keys) to store in meta_data
+#                    when the rule fires (default 5, 0 turns sampling off)
 
 ANOMALY_RULES = {
     # --- 1. VOLUME CHECKS ---
     "bronze_order_items": {
         # Check: load_spike_volume.py injects a 50x spike
         "row_count_spike": {
+            "type": "row_count",
             "max_rows": 2000,         # Max acceptable rows per batch (assuming normal is ~40)
-            "severity": "CRITICAL"
+            "severity": "CRITICAL",
+            "note": "CRITICAL: Batch exceeded max row count threshold."
         },
         # NEW RULE: Check for load_trend_shift.py (5x increase)
         # Detects if volume is elevated but not yet a massive spike
         "sustained_volume_shift": {
-            "max_batch_rows": 200,    # If batch > 200, it's a shift (Normal ~100, Spike ~5000)
+            "type": "row_count",
+            "max_rows": 200,          # If batch > 200, it's a shift (Normal ~100, Spike ~5000)
+            "severity": "WARNING",
+            "note": "WARNING: Volume is elevated (Trend Shift detected).",
+            "suppressed_by": "row_count_spike"   # A massive spike is logged as the spike only
+        },
+        # Adaptive check: learns the normal batch size instead of a fixed threshold
+        # (robust median/MAD, so the 50x spike itself doesn't inflate the baseline).
+        # Not suppressed by row_count_spike: that rule compares the table total, which
+        # stays above max_rows once the table is loaded, so it would silence this rule
+        # on every run. A spike batch is therefore logged by both rules.
+        "batch_volume_baseline": {
+            "type": "row_count",
+            "baseline": {"method": "robust", "threshold": 4.0, "warmup": 5, "direction": "both"},
             "severity": "WARNING"
         },
         # Check: load_outlier_value.py injects a $1,000,000 price
         "price_outlier": {
+            "type": "value_range",
+            "check_name": "price_outlier_check",
             "column": "price",
             "max_value": 50000,       # Max acceptable price in BRL (e.g., R$50,000)
             "severity": "CRITICAL"
+        },
+        # Check: load_outlier_value.py targets one category ('beleza_saude'). Prices are
+        # judged against their own category's learned quartiles, so a glitch is caught
+        # even when it stays under the global cap above.
+        "category_price_outlier": {
+            "type": "category_outlier",
+            "check_name": "category_price_outlier_check",
+            "column": "price",
+            "category_table": "products",          # Lookup table holding the category
+            "category_key": "product_id",
+            "category_column": "product_category_name",
+            "iqr_multiplier": 3.0,    # Fences at Q1/Q3 -/+ 3 IQRs of log10(price)
+            "min_category_rows": 20,  # Categories with fewer learned rows are not scored
+            "severity": "WARNING"
         }
     },
-    
+
     "bronze_customers": {
         # Check: load_drop_volume.py injects only 5 rows
         "row_count_drop": {
+            "type": "row_count",
             "min_rows": 10,           # Min acceptable rows per batch (assuming normal is ~40)
-            "severity": "CRITICAL"
+            "severity": "CRITICAL",
+            "note": "Batch dropped below min row count threshold."
+        },
+        # Adaptive check: flags batches far below the learned normal batch size
+        "batch_volume_baseline": {
+            "type": "row_count",
+            "baseline": {"method": "ewma", "alpha": 0.2, "threshold": 4.0, "warmup": 5, "direction": "down"},
+            "severity": "WARNING"
         }
     },
-    
+
     # --- 2. DATA QUALITY CHECKS ---
     "bronze_products": {
         # Check: load_null_injection.py injects 40% NULLs in category
         "null_injection": {
+            "type": "null_ratio",
+            "check_name": "null_injection_check",
             "column": "product_category_name",
             "max_null_percentage": 0.05,  # 5% maximum allowed NULLs
             "severity": "WARNING"
         }
     },
-    
+
     "bronze_order_payments": {
         # Check: load_duplicates.py injects double payments
         "duplicates": {
-            # Assumes a composite key check on ['order_id', 'payment_sequential']
+            "type": "duplicate_count",
+            "check_name": "duplicate_payments_check",
+            "column": "order_id",
             "max_duplicate_count": 0,
-            "severity": "CRITICAL"
+            # Set to True to count duplicates with a persisted HyperLogLog sketch instead
+            # of COUNT(DISTINCT): near-constant memory and O(batch) work with --incremental,
+            # but only duplicate counts above ~3 standard errors (~2.4% of distinct keys
+            # at the default sketch_precision of 14) are reported.
+            "approximate": False,
+            "severity": "CRITICAL",
+            "note": "Detected excess duplicates based on order_id key."
         },
         # NEW RULE: Check for load_deletion.py (Accidental Data Loss)
         "row_count_deletion": {
-            "min_total_rows": 1000,   # If total table count drops below this, flag as data loss
-            "severity": "CRITICAL"
+            "type": "row_count",
+            "min_rows": 1000,         # If total table count drops below this, flag as data loss
+            "severity": "CRITICAL",
+            "note": "CRITICAL: Significant data loss detected."
         }
     },
 
@@ -62,8 +128,12 @@ ANOMALY_RULES = {
     "bronze_orders": {
         # Check: load_late_data.py injects data from 3 days ago
         "data_latency": {
+            "type": "timestamp_lag",
+            "check_name": "data_latency_check",
             "column": "order_purchase_timestamp",
             "max_latency_minutes": 60,  # Max acceptable delay between data time and load time
+            "percentile": "p99",        # Batch lateness compared: p50, p95, p99 or max
+                                        # (a full run's batch is the whole table)
             "severity": "CRITICAL"
         }
     }
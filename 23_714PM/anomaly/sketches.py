@@ -0,0 +1,231 @@
+# anomaly/sketches.py
+# Mergeable probabilistic sketches persisted between detector runs.
+
+import hashlib
+import logging
+import math
+import sqlite3
+import struct
+
+CREATE_SKETCHES_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS detector_sketches (
+    source_table TEXT NOT NULL,
+    sketch_key TEXT NOT NULL,         -- e.g. 'hll:order_id', 'latency:order_purchase_timestamp'
+    precision INTEGER NOT NULL,
+    sketch BLOB NOT NULL,             -- Serialized registers
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source_table, sketch_key)
+) WITHOUT ROWID;
+"""
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter.
+
+    Uses 2**precision one-byte registers (16 KB at the default precision of 14) no
+    matter how many values are added, with a relative standard error of about
+    1.04 / sqrt(2**precision), i.e. ~0.8%. Two sketches of the same precision merge by
+    taking the register-wise maximum, so a sketch can be updated with new batches only.
+    """
+
+    def __init__(self, precision: int = 14, registers: bytes | None = None):
+        if not 4 <= precision <= 18:
+            raise ValueError("HyperLogLog precision must be between 4 and 18.")
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+        if len(self.registers) != self.m:
+            raise ValueError("Register count does not match precision.")
+
+    @staticmethod
+    def _hash(value) -> int:
+        # Stable across processes (unlike hash()), so persisted sketches stay valid
+        return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+
+    def add(self, value):
+        """Adds one value to the sketch."""
+        h = self._hash(value)
+        index = h >> (64 - self.precision)
+        remainder = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        """Adds every value of an iterable."""
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "HyperLogLog"):
+        """Folds another sketch of the same precision into this one."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision.")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def cardinality(self) -> float:
+        """Estimated number of distinct values added."""
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+
+        # Small-range correction: linear counting while many registers are still empty
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return estimate
+
+    def relative_error(self) -> float:
+        """One standard error of cardinality(), as a fraction of the estimate."""
+        return 1.04 / math.sqrt(self.m)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with a relative-error guarantee (DDSketch-style).
+
+    Positive values are counted in logarithmic buckets: bucket i covers
+    (gamma**(i-1), gamma**i] with gamma = 2 ** (2 ** -precision), so every quantile is
+    returned within (gamma - 1) / (gamma + 1) of the true value (~0.5% at the default
+    precision of 6). Values <= 0 share one zero bucket. Memory grows with the number of
+    distinct orders of magnitude, not with the number of values, and two sketches of
+    the same precision merge by adding their bucket counts.
+    """
+
+    HEADER = struct.Struct("<Qdd")    # zero_count, min, max
+    BUCKET = struct.Struct("<iQ")     # index, count
+
+    def __init__(self, precision: int = 6, data: bytes | None = None):
+        if not 1 <= precision <= 10:
+            raise ValueError("QuantileSketch precision must be between 1 and 10.")
+        self.precision = precision
+        self.gamma = 2.0 ** (2.0 ** -precision)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        if data is not None:
+            self._load(data)
+
+    def _load(self, data: bytes):
+        if len(data) < self.HEADER.size or (len(data) - self.HEADER.size) % self.BUCKET.size:
+            raise ValueError("Sketch size does not match its layout.")
+        self.zero_count, self.min, self.max = self.HEADER.unpack_from(data)
+        for index, count in self.BUCKET.iter_unpack(data[self.HEADER.size:]):
+            self.buckets[index] = count
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.buckets.values())
+
+    def add(self, value: float):
+        """Adds one value to the sketch."""
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value <= 0:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def update(self, values):
+        """Adds every value of an iterable."""
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "QuantileSketch"):
+        """Folds another sketch of the same precision into this one."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge quantile sketches of different precision.")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float | None:
+        """Estimated q-quantile (0-1) of the values added, or None if the sketch is empty."""
+        total = self.count
+        if not total:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return min(0.0, self.max)
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # Bucket midpoint with equal relative error to both edges, clamped to the
+                # exact extremes
+                estimate = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def relative_error(self) -> float:
+        """Bound on the relative error of quantile()."""
+        return (self.gamma - 1) / (self.gamma + 1)
+
+    def to_bytes(self) -> bytes:
+        header = self.HEADER.pack(self.zero_count, self.min, self.max)
+        return header + b"".join(self.BUCKET.pack(index, count) for index, count in sorted(self.buckets.items()))
+
+
+# Sketch key prefix -> class, used to restore persisted sketches
+SKETCH_TYPES = {
+    "hll": HyperLogLog,
+    "latency": QuantileSketch
+}
+
+# --- PERSISTENCE ---
+
+def ensure_sketches_table(conn):
+    """Creates the detector_sketches table on first use."""
+    conn.execute(CREATE_SKETCHES_TABLE_SQL)
+    conn.commit()
+
+
+def load_sketch(conn, table_name: str, sketch_key: str, sketch_class=None):
+    """
+    Returns the persisted sketch, or None if there is none yet.
+
+    The class is chosen by the key prefix (see SKETCH_TYPES) unless 'sketch_class' is
+    given; it is built as sketch_class(precision, data).
+    """
+    try:
+        cursor = conn.execute(
+            "SELECT precision, sketch FROM detector_sketches WHERE source_table = ? AND sketch_key = ?",
+            (table_name, sketch_key)
+        )
+        row = cursor.fetchone()
+    except sqlite3.Error:
+        return None
+
+    if row is None:
+        return None
+    if sketch_class is None:
+        sketch_class = SKETCH_TYPES[sketch_key.split(":", 1)[0]]
+    try:
+        return sketch_class(row[0], row[1])
+    except ValueError as e:
+        logging.warning(f"Discarding corrupt sketch {table_name}.{sketch_key}: {e}")
+        return None
+
+
+def save_sketch(conn, table_name: str, sketch_key: str, sketch):
+    """Upserts a sketch, or any object with 'precision' and to_bytes() (caller commits)."""
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO detector_sketches (source_table, sketch_key, precision, sketch, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """,
+        (table_name, sketch_key, sketch.precision, sketch.to_bytes())
+    )
@@ -0,0 +1,66 @@
+# anomaly/state.py
+# Persistent per-table high-water marks for incremental detection.
+
+import json
+import logging
+import sqlite3
+
+# One row per bronze table. 'last_rowid' is the highest rowid already folded into
+# 'aggregates', so the next run only has to read rows with rowid > last_rowid.
+CREATE_STATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS detector_state (
+    source_table TEXT PRIMARY KEY,    -- Bronze table being watched (e.g. 'bronze_orders')
+    last_rowid INTEGER NOT NULL,      -- High-water mark: highest rowid already evaluated
+    batch_rows INTEGER,               -- Rows appended since the previous run
+    aggregates TEXT,                  -- JSON running aggregates (row_count, null counts, ...)
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+def ensure_state_table(conn):
+    """Creates the detector_state table on first use."""
+    conn.execute(CREATE_STATE_TABLE_SQL)
+    conn.commit()
+
+
+def load_state(conn, table_name: str) -> dict:
+    """
+    Returns the saved watermark for a table.
+
+    A table that has never been evaluated starts at rowid 0 with no aggregates,
+    which makes the first incremental run equivalent to a full scan.
+    """
+    try:
+        cursor = conn.execute(
+            "SELECT last_rowid, aggregates FROM detector_state WHERE source_table = ?",
+            (table_name,)
+        )
+        row = cursor.fetchone()
+    except sqlite3.Error as e:
+        logging.warning(f"Could not read detector_state for {table_name}: {e}")
+        row = None
+
+    if row is None:
+        return {"last_rowid": 0, "aggregates": {}}
+
+    return {
+        "last_rowid": row[0],
+        "aggregates": json.loads(row[1]) if row[1] else {}
+    }
+
+
+def save_state(conn, table_name: str, last_rowid: int, batch_rows: int, aggregates: dict):
+    """Upserts the watermark and running aggregates for a table (caller commits)."""
+    conn.execute(
+        """
+        INSERT INTO detector_state (source_table, last_rowid, batch_rows, aggregates, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(source_table) DO UPDATE SET
+            last_rowid = excluded.last_rowid,
+            batch_rows = excluded.batch_rows,
+            aggregates = excluded.aggregates,
+            updated_at = excluded.updated_at
+        """,
+        (table_name, last_rowid, batch_rows, json.dumps(aggregates))
+    )
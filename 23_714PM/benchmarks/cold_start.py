@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Cold-start budget for the detection / log-inspection entry points. Cron-driven runs
+# start a fresh interpreter every time, so import cost is paid on every invocation.
+# Each entry point is imported in a new process several times; the check fails when the
+# median wall time (interpreter start-up included) exceeds the budget or when a heavy
+# library only the injectors need gets imported.
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry point -> import statement that loads it without running it
+ENTRY_POINTS = {
+    "trigger.py": "import trigger",
+    "check_logs.py": "import check_logs",
+    "anomaly/daemon.py": "import anomaly.daemon"
+}
+
+# Must not be imported by detection-only code paths
+HEAVY_MODULES = ["pandas", "numpy"]
+
+DEFAULT_BUDGET_MS = 250
+DEFAULT_RUNS = 5
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+print(json.dumps({{
+    "import_ms": (time.perf_counter() - start) * 1000,
+    "heavy": [name for name in {heavy!r} if name in sys.modules]
+}}))
+"""
+
+
+def measure_entry_point(statement, runs=DEFAULT_RUNS):
+    """Imports 'statement' in 'runs' fresh interpreters. Returns the timings and heavy imports."""
+    wall_ms, import_ms, heavy = [], [], set()
+    probe = PROBE.format(statement=statement, heavy=HEAVY_MODULES)
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-c", probe], cwd=project_root,
+            capture_output=True, text=True, check=True
+        )
+        wall_ms.append((time.perf_counter() - start) * 1000)
+
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        import_ms.append(result["import_ms"])
+        heavy.update(result["heavy"])
+
+    return {
+        "wall_ms": round(statistics.median(wall_ms), 2),
+        "import_ms": round(statistics.median(import_ms), 2),
+        "heavy_modules": sorted(heavy)
+    }
+
+
+def check_cold_start(budget_ms=DEFAULT_BUDGET_MS, runs=DEFAULT_RUNS):
+    """Measures every entry point. Returns (results, ok)."""
+    results = {}
+    ok = True
+    for name, statement in ENTRY_POINTS.items():
+        result = measure_entry_point(statement, runs)
+        result["within_budget"] = result["wall_ms"] <= budget_ms and not result["heavy_modules"]
+        results[name] = result
+        ok = ok and result["within_budget"]
+
+        status = "ok" if result["within_budget"] else "OVER BUDGET"
+        heavy = f" | imports {', '.join(result['heavy_modules'])}" if result["heavy_modules"] else ""
+        print(f"{status:<11} | {name:<18} | start-up {result['wall_ms']:7.1f} ms "
+              f"(imports {result['import_ms']:6.1f} ms) | budget {budget_ms} ms{heavy}")
+    return results, ok
+
+# Allow running this file directly
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the cold-start time of the detection entry points.")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Allowed median start-up time.")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="Fresh interpreters per entry point.")
+    parser.add_argument("--output", default=None, help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    results, ok = check_cold_start(args.budget_ms, args.runs)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"budget_ms": args.budget_ms, "results": results}, f, indent=2)
+    sys.exit(0 if ok else 1)
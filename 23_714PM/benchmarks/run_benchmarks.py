@@ -0,0 +1,431 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Fix imports (this file is run directly, like init_db.py)
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from db.connection import get_db_connection, get_db_path
+from db.init_db import CREATE_AUDIT_TABLE_SQL
+from db.utils import AnomalyBuffer, log_anomaly, new_run_id
+from anomaly.rules import ANOMALY_RULES
+from anomaly.engine import compile_plan, get_window, run_plan, scan_table
+from db.backends import DUCKDB_MODES, DuckDBBackend
+from anomaly.detector import run_detector
+from etl.streaming import DEFAULT_CHUNK_ROWS, stream_append
+from etl.synthetic import fit_profile, generate_in_chunks, set_seed
+
+from etl.load_spike_volume import run_spike_injection
+from etl.load_drop_volume import run_drop_injection
+from etl.load_null_injection import run_null_injection
+from etl.load_duplicates import run_duplicate_injection
+from etl.load_late_data import run_latency_injection
+from etl.load_outlier_value import run_outlier_injection
+from etl.load_deletion import run_deletion_injection
+from etl.load_trend_shift import run_trend_shift_injection
+
+# Benchmark harness: builds synthetic olist databases of several sizes and times the
+# detector (whole runs and each check on its own), every injector and audit writes.
+# Results go to a JSON file; '--baseline old.json' (or '--compare old.json new.json')
+# reports the steps that got slower, so regressions show up before production.
+#
+# peak_rss_mb is the resident-memory high-water mark of one step, SQLite's page cache
+# included. On Linux it is reset before every step (/proc/self/clear_refs); elsewhere it
+# is the process-wide maximum so far. tracemalloc is not used: tracing every allocation
+# slows row-at-a-time code down several times and would distort the timings.
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+
+# Source tables copied from the real database; each gets a synthetic bronze_ twin
+SOURCE_TABLES = ["order_items", "orders", "order_payments", "products", "customers"]
+
+# (scenario, injector, bronze table it writes to), in 'trigger.py --scenario all' order
+INJECTORS = [
+    ("spike", run_spike_injection, "bronze_order_items"),
+    ("null", run_null_injection, "bronze_products"),
+    ("drop", run_drop_injection, "bronze_customers"),
+    ("duplicate", run_duplicate_injection, "bronze_order_payments"),
+    ("late", run_latency_injection, "bronze_orders"),
+    ("outlier", run_outlier_injection, "bronze_order_items"),
+    ("deletion", run_deletion_injection, "bronze_order_payments"),
+    ("trend_shift", run_trend_shift_injection, "bronze_order_items")
+]
+
+AUDIT_ROWS = 2000                   # Rows written by each audit benchmark
+DEFAULT_TOLERANCE = 0.20            # Flag steps more than 20% slower than the baseline
+MIN_REGRESSION_SECONDS = 0.01       # Ignore differences below timer noise
+
+
+def parse_size(label: str) -> int:
+    """'10k' / '1m' / '10m' (or a plain row count) -> number of rows."""
+    label = label.strip().lower()
+    if label in SIZES:
+        return SIZES[label]
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(label[-1:], 1)
+    return int(float(label.rstrip("km")) * multiplier)
+
+# --- MEASUREMENT ---
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 2)
+    except OSError:
+        pass
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2)
+
+
+def measure(size, group, name, func, rows=None):
+    """
+    Runs func() once and returns (result_record, func's return value).
+
+    'rows' is the number of rows the step processed (a callable is evaluated after the
+    step) and gives rows_per_sec.
+    """
+    gc.collect()
+    _reset_peak_rss()
+    start = time.perf_counter()
+    value = func()
+    seconds = time.perf_counter() - start
+
+    if callable(rows):
+        rows = rows(value)
+
+    record = {
+        "size": size,
+        "group": group,
+        "name": name,
+        "seconds": round(seconds, 6),
+        "rows": rows,
+        "rows_per_sec": round(rows / seconds, 1) if rows and seconds > 0 else None,
+        "peak_rss_mb": _peak_rss_mb()
+    }
+    logging.warning(
+        f"{size:>4} | {group:<9} | {name:<40} | {seconds:9.4f}s"
+        + (f" | {record['rows_per_sec']:>14,.0f} rows/s" if record["rows_per_sec"] else "")
+        + f" | {record['peak_rss_mb']:8.1f} MB"
+    )
+    return record, value
+
+
+def _count(conn, table):
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+# --- DATABASE BUILD ---
+
+def build_database(db_path: Path, source_path: Path, rows: int, seed: int, chunk_rows: int):
+    """
+    Creates a benchmark database: the source tables are copied from source_path and
+    every bronze table gets 'rows' synthetic rows drawn from them.
+
+    Returns:
+        The total number of rows generated.
+    """
+    if db_path.exists():
+        db_path.unlink()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("ATTACH DATABASE ? AS src", (str(source_path),))
+        for table in SOURCE_TABLES:
+            conn.execute(f"CREATE TABLE {table} AS SELECT * FROM src.{table}")
+        conn.commit()
+        conn.execute("DETACH DATABASE src")
+
+        rng = np.random.default_rng(seed)
+        generated = 0
+        for table in SOURCE_TABLES:
+            profile = fit_profile(conn, table)
+            generated += stream_append(conn, f"bronze_{table}", generate_in_chunks(profile, rows, chunk_rows, rng))
+
+        conn.execute(CREATE_AUDIT_TABLE_SQL)
+        conn.commit()
+        return generated
+    finally:
+        conn.close()
+
+# --- BENCHMARKS ---
+
+def bench_checks(size):
+    """Times each rule on its own (a single-rule plan), then the whole detector."""
+    results = []
+    conn = get_db_connection()
+    try:
+        for table, rules in ANOMALY_RULES.items():
+            table_rows = _count(conn, table)
+            for rule_name, rule in rules.items():
+                plan = compile_plan({table: {rule_name: rule}})
+                record, _ = measure(size, "check", f"{table}.{rule_name}", lambda: run_plan(conn, plan), table_rows)
+                results.append(record)
+    finally:
+        conn.close()
+
+    record, _ = measure(size, "detector", "run_detector (full)", lambda: run_detector())
+    results.append(record)
+    record, _ = measure(size, "detector", "run_detector (incremental, initial)", lambda: run_detector(incremental=True))
+    results.append(record)
+    return results
+
+
+def bench_backends(size):
+    """
+    Times the fused table scans of the whole plan on each backend (db/backends.py): SQLite,
+    then DuckDB in every mode when the duckdb package is installed. A mirror is timed
+    twice: the first run, which builds the copies (what a process without a persisted
+    mirror pays every time), then a run that only scans them. Speedups over SQLite are
+    reported for both.
+    """
+    plan = compile_plan()
+    backends = [("sqlite", None)]
+    for mode in DUCKDB_MODES:
+        try:
+            backends.append((f"duckdb {mode}", DuckDBBackend(mode)))
+        except ImportError:
+            logging.warning("duckdb is not installed: only the sqlite backend is benchmarked.")
+            break
+        except Exception as e:
+            logging.warning(f"Skipping the duckdb {mode} backend: {e}")
+
+    def scan_all(backend):
+        rows = 0
+        for table_plan in plan:
+            window = get_window(conn, table_plan["table"])
+            scan_table(conn, table_plan, window, backend)
+            rows += window["batch_rows"]
+        return rows
+
+    results = []
+    speedups = []
+    conn = get_db_connection()
+    try:
+        sqlite_seconds = None
+        for name, backend in backends:
+            if backend is None:
+                record, _ = measure(size, "backend", f"table scans ({name})", lambda: scan_all(backend), lambda rows: rows)
+                results.append(record)
+                sqlite_seconds = record["seconds"]
+                continue
+            first, _ = measure(size, "backend", f"table scans ({name}, first run)", lambda: scan_all(backend), lambda rows: rows)
+            synced, _ = measure(size, "backend", f"table scans ({name}, synced)", lambda: scan_all(backend), lambda rows: rows)
+            results.extend([first, synced])
+            speedups.append((name, first["seconds"], synced["seconds"]))
+    finally:
+        conn.close()
+        for _, backend in backends:
+            if backend is not None:
+                backend.close()
+
+    for name, first_seconds, synced_seconds in speedups:
+        if first_seconds > 0 and synced_seconds > 0:
+            logging.warning(
+                f"{size:>4} | backend   | {name}: {sqlite_seconds / first_seconds:.2f}x the sqlite scan speed "
+                f"on the first run (copy included), {sqlite_seconds / synced_seconds:.2f}x once synced"
+            )
+    return results
+
+
+def bench_injectors(size):
+    """Times every injector, then the incremental detector run over the injected batches."""
+    results = []
+    for scenario, injector, table in INJECTORS:
+        conn = get_db_connection()
+        try:
+            before = _count(conn, table)
+            record, _ = measure(
+                size, "injector", f"run_{scenario}", injector,
+                lambda _: abs(_count(conn, table) - before)
+            )
+        finally:
+            conn.close()
+        results.append(record)
+
+    record, _ = measure(size, "detector", "run_detector (incremental, batch)", lambda: run_detector(incremental=True))
+    results.append(record)
+    return results
+
+
+def bench_audit(size, audit_rows=AUDIT_ROWS):
+    """Times audit writes: one log_anomaly() commit per row vs one AnomalyBuffer batch."""
+    anomaly = {
+        "source_table": "benchmark",
+        "category": "Benchmark",
+        "check_name": "benchmark_audit_write",
+        "severity": "INFO",
+        "metric_value": 1.0,
+        "threshold_value": 0.0,
+        "meta_data": {"note": "Written by benchmarks/run_benchmarks.py"}
+    }
+
+    def write_one_by_one():
+        run_id = new_run_id()
+        for _ in range(audit_rows):
+            log_anomaly(conn, anomaly["source_table"], anomaly["category"], anomaly["check_name"],
+                        anomaly["severity"], anomaly["metric_value"], anomaly["threshold_value"],
+                        anomaly["meta_data"], run_id=run_id)
+
+    def write_buffered():
+        with AnomalyBuffer(conn, max_size=audit_rows) as audit:
+            for _ in range(audit_rows):
+                audit.add(**anomaly)
+
+    conn = get_db_connection()
+    try:
+        results = [
+            measure(size, "audit", "log_anomaly (per row)", write_one_by_one, audit_rows)[0],
+            measure(size, "audit", "AnomalyBuffer (batched)", write_buffered, audit_rows)[0]
+        ]
+    finally:
+        conn.close()
+    return results
+
+
+def run_benchmarks(sizes, source_path: Path, workdir: Path, seed=0, chunk_rows=DEFAULT_CHUNK_ROWS, keep=False):
+    """Runs every benchmark for each size. Returns the results document."""
+    results = []
+    for label in sizes:
+        rows = parse_size(label)
+        db_path = workdir / f"bench_{label}.sqlite"
+
+        record, _ = measure(
+            label, "build", "synthetic bronze tables",
+            lambda: build_database(db_path, source_path, rows, seed, chunk_rows),
+            lambda generated: generated
+        )
+        results.append(record)
+
+        # Point the connection pool at the benchmark database, with reproducible injections
+        os.environ["DB_PATH"] = str(db_path)
+        set_seed(seed)
+        try:
+            results.extend(bench_checks(label))
+            results.extend(bench_backends(label))
+            results.extend(bench_injectors(label))
+            results.extend(bench_audit(label))
+        finally:
+            if not keep:
+                for suffix in ("", "-wal", "-shm"):
+                    Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+
+    return {"meta": _run_metadata(sizes, seed, chunk_rows), "results": results}
+
+
+def _run_metadata(sizes, seed, chunk_rows):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "sizes": sizes,
+        "seed": seed,
+        "chunk_rows": chunk_rows,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform()
+    }
+
+# --- COMPARISON ---
+
+def compare_results(baseline: dict, current: dict, tolerance=DEFAULT_TOLERANCE) -> list:
+    """
+    Compares two results documents step by step.
+
+    Returns:
+        (size, group, name, old_seconds, new_seconds, ratio) tuples for the steps that
+        are more than 'tolerance' slower than in the baseline.
+    """
+    old_steps = {(r["size"], r["group"], r["name"]): r for r in baseline["results"]}
+    regressions = []
+
+    for record in current["results"]:
+        key = (record["size"], record["group"], record["name"])
+        old = old_steps.get(key)
+        if old is None or not old["seconds"]:
+            continue
+
+        ratio = record["seconds"] / old["seconds"]
+        slower = ratio > 1 + tolerance and record["seconds"] - old["seconds"] > MIN_REGRESSION_SECONDS
+        print(f"{'REGRESSED' if slower else 'ok':<9} | {key[0]:>4} | {key[1]:<9} | {key[2]:<40} | "
+              f"{old['seconds']:9.4f}s -> {record['seconds']:9.4f}s ({ratio:5.2f}x)")
+        if slower:
+            regressions.append((*key, old["seconds"], record["seconds"], ratio))
+
+    return regressions
+
+
+def _load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+# Allow running this file directly
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the anomaly detector, the injectors and audit logging.")
+    parser.add_argument("--sizes", default="10k,1m,10m", help="Comma-separated rows per bronze table (default: 10k,1m,10m).")
+    parser.add_argument("--source", default=None, help="Database with the Olist source tables (default: DB_PATH).")
+    parser.add_argument("--workdir", default=tempfile.gettempdir(), help="Where the benchmark databases are built.")
+    parser.add_argument("--output", default="benchmark_results.json", help="Results file to write.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic data and injections.")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per generated chunk.")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark databases.")
+    parser.add_argument("--baseline", default=None, help="Previous results file to compare this run against.")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Only compare two results files.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed slowdown ratio (default: 0.2).")
+    args = parser.parse_args()
+
+    # Only the benchmark lines (logged as warnings) and real problems are printed
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.compare:
+        regressions = compare_results(_load(args.compare[0]), _load(args.compare[1]), args.tolerance)
+        sys.exit(1 if regressions else 0)
+
+    source_path = Path(args.source).resolve() if args.source else get_db_path()
+    if source_path is None or not source_path.exists():
+        logging.error(f"CRITICAL: Source database not found: {source_path}")
+        sys.exit(1)
+
+    document = run_benchmarks(
+        [size.strip() for size in args.sizes.split(",") if size.strip()],
+        source_path, Path(args.workdir), args.seed, args.chunk_rows, args.keep
+    )
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        regressions = compare_results(_load(args.baseline), document, args.tolerance)
+        sys.exit(1 if regressions else 0)
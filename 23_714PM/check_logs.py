@@ -1,33 +1,155 @@
-import pandas as pd
-from db.connection import get_db_connection
+import argparse
+import re
+import time
 
-def view_logs():
-    conn = get_db_connection()
+from db.connection import get_reader_connection
+
+# Plain sqlite3 cursor + string formatting: importing pandas just to print ten rows
+# took longer than the query itself.
+#
+# With --follow the inspector works like 'tail -f': it remembers the highest log_id it
+# printed and each poll only asks for rows above it, a seek on the primary key. A poll
+# in which no other connection committed costs one PRAGMA. Filters go into the WHERE
+# clause, where the audit log indexes (see db/rollups.py) serve them.
+
+COLUMNS = ["event_timestamp", "source_table", "anomaly_category", "check_name", "metric_value", "severity"]
+
+SEVERITIES = ["INFO", "WARNING", "CRITICAL"]
+
+# '15m', '2h', '7d' -> SQLite datetime() modifiers
+RELATIVE_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+
+def format_rows(columns, rows):
+    """Formats rows as a fixed-width text table (like DataFrame.to_string(index=False))."""
+    cells = [[("" if value is None else str(value)) for value in row] for row in rows]
+    widths = [max([len(column)] + [len(row[i]) for row in cells]) for i, column in enumerate(columns)]
+    lines = [" ".join(column.rjust(width) for column, width in zip(columns, widths))]
+    lines += [" ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in cells]
+    return "\n".join(lines)
+
+
+def format_row(row, widths):
+    """Formats one streamed row with the column widths of the table printed before it."""
+    return " ".join(("" if value is None else str(value)).rjust(width) for value, width in zip(row, widths))
+
+
+def time_bound(value):
+    """
+    Returns (sql, params) for a time bound: '15m' / '2h' / '7d' (before now) or a
+    timestamp such as '2024-05-01' or '2024-05-01 13:00:00' (UTC, like event_timestamp).
+    """
+    match = re.fullmatch(r"(\d+)([smhd])", value.strip())
+    if match:
+        return "datetime('now', ?)", [f"-{match.group(1)} {RELATIVE_UNITS[match.group(2)]}"]
+    return "datetime(?)", [value.strip()]
+
+
+def build_filters(severity=None, table=None, check=None, since=None, until=None):
+    """Returns (where, params) for the requested filters ('1' when there are none)."""
+    clauses, params = [], []
+    if severity:
+        clauses.append(f"severity IN ({', '.join('?' for _ in severity)})")
+        params += severity
+    if table:
+        clauses.append("source_table = ?")
+        params.append(table)
+    if check:
+        clauses.append("check_name = ?")
+        params.append(check)
+    if since:
+        sql, bound = time_bound(since)
+        clauses.append(f"event_timestamp >= {sql}")
+        params += bound
+    if until:
+        sql, bound = time_bound(until)
+        clauses.append(f"event_timestamp < {sql}")
+        params += bound
+    return (" AND ".join(clauses) or "1"), params
+
+
+def follow_logs(conn, where, params, last_log_id, widths, interval=1.0):
+    """Prints the audit rows logged after 'last_log_id' as they arrive, until interrupted."""
+    # NOT INDEXED keeps SQLite on the log_id range: a table or check index would
+    # re-read every matching row of the log on each poll.
+    query = f"""
+    SELECT log_id, {', '.join(COLUMNS)}
+    FROM anomaly_audit_log NOT INDEXED
+    WHERE log_id > ? AND {where}
+    ORDER BY log_id
+    """
+    data_version = None
+    while True:
+        current = conn.execute("PRAGMA data_version").fetchone()[0]
+        if current != data_version:
+            data_version = current
+            # Rows are printed straight off the cursor, never collected in a list
+            for row in conn.execute(query, [last_log_id] + params):
+                last_log_id = row[0]
+                print(format_row(row[1:], widths), flush=True)
+        time.sleep(interval)
+
+
+def view_logs(limit=10, severity=None, table=None, check=None, since=None, until=None, follow=False, interval=1.0):
+    conn = get_reader_connection()
     if not conn:
         print("❌ Could not connect to DB.")
         return
 
     print("\n--- 🔎 INSPECTING ANOMALY AUDIT LOG ---")
-    
-    # Read the last 10 logs
-    query = """
-    SELECT event_timestamp, source_table, anomaly_category, check_name, metric_value, severity 
-    FROM anomaly_audit_log 
-    ORDER BY log_id DESC 
-    LIMIT 10
+
+    where, params = build_filters(severity, table, check, since, until)
+
+    # Read the last 'limit' matching logs
+    query = f"""
+    SELECT log_id, {', '.join(COLUMNS)}
+    FROM anomaly_audit_log
+    WHERE {where}
+    ORDER BY log_id DESC
+    LIMIT ?
     """
-    
+
     try:
-        df = pd.read_sql(query, conn)
-        if df.empty:
+        rows = conn.execute(query, params + [limit]).fetchall()
+        # Newest first, except when following: then new rows are appended at the bottom
+        if follow:
+            rows.reverse()
+        last_log_id = max((row[0] for row in rows), default=0)
+        table_rows = [row[1:] for row in rows]
+
+        if not rows and not follow:
             print("⚠️ The log table is EMPTY. No anomalies detected yet.")
         else:
-            print(df.to_string(index=False))
+            print(format_rows(COLUMNS, table_rows))
+
+        if follow:
+            if last_log_id == 0:
+                # Nothing matched yet: start from the current end of the log
+                last_log_id = conn.execute("SELECT COALESCE(max(log_id), 0) FROM anomaly_audit_log").fetchone()[0]
+            widths = [max([len(column)] + [len("" if row[i] is None else str(row[i])) for row in table_rows])
+                      for i, column in enumerate(COLUMNS)]
+            print(f"\n--- Following new rows every {interval:g}s (Ctrl+C to stop) ---")
+            follow_logs(conn, where, params, last_log_id, widths, interval)
+        elif rows:
             print("\n✅ Success! Data found in logs.")
+    except KeyboardInterrupt:
+        print("\n--- Stopped following. ---")
     except Exception as e:
         print(f"Error reading DB: {e}")
     finally:
         conn.close()
 
+
 if __name__ == "__main__":
-    view_logs()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Inspect (and follow) the anomaly audit log.")
+    parser.add_argument("-n", "--limit", type=int, default=10, help="Rows shown before following (default: 10).")
+    parser.add_argument("-f", "--follow", action="store_true", help="Keep printing new rows as they are logged.")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between polls with --follow.")
+    parser.add_argument("--severity", action="append", choices=SEVERITIES, help="Only this severity (repeatable).")
+    parser.add_argument("--table", help="Only this source table.")
+    parser.add_argument("--check", help="Only this check_name.")
+    parser.add_argument("--since", help="Only rows logged at or after this time: '15m', '2h', '7d' or a UTC timestamp.")
+    parser.add_argument("--until", help="Only rows logged before this time (same formats as --since).")
+    args = parser.parse_args()
+
+    view_logs(args.limit, args.severity, args.table, args.check, args.since, args.until, args.follow, args.interval)
@@ -0,0 +1,244 @@
+# db/backends.py
+# Query backends for the detector's fused table scans, selected by DB_TYPE in .env.
+#
+# The SQLite file stays the system of record: detector state, sketches, models, samples
+# and the audit log are always read and written through db/connection.py. A backend
+# only runs each table's fused aggregate query (see anomaly/engine.py), the step that
+# reads every row of the window, which a columnar engine runs much faster on large tables.
+#
+# - sqlite (default): the query runs on the detector's own SQLite connection.
+# - duckdb: an embedded DuckDB database runs it. DUCKDB_MODE=mirror (the only mode so
+#   far) keeps columnar copies of the bronze tables in a file, by
+#   default next to the SQLite file (olist.sqlite -> olist.duckdb), so one-shot runs
+#   only copy what was appended since the previous run. Before each scan the new rows
+#   are read through the detector's own SQLite connection and added by rowid, in pandas
+#   chunks, so no DuckDB extension is needed. Bronze tables are append-only; a delete
+#   recorded in bronze_change_log, a table that shrank, or a last copied row that no
+#   longer matches SQLite's (the database was replaced) rebuilds the copy. DUCKDB_PATH=:memory: keeps the copies in memory, so
+#   every process rebuilds them: only worth it for a long-lived daemon. A DuckDB file
+#   is opened by one process at a time; another process falls back to SQLite.
+#   Scanning the SQLite file in place through DuckDB's sqlite extension would avoid the
+#   copy, but it has not been tested against this schema, so it is not offered yet.
+#
+# DuckDB is an optional dependency: with DB_TYPE=duckdb and no duckdb package, or when
+# the backend can't be opened, the detector logs an error and keeps using SQLite.
+
+import atexit
+import datetime
+import decimal
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+from db.connection import get_db_path
+
+DUCKDB_MODES = ("mirror",)
+
+# Mirrors keep the SQLite rowid in this column; the queries' 'rowid' is renamed to it
+MIRROR_ROWID = "src_rowid"
+
+# Rows read from SQLite per chunk while a mirror is filled
+MIRROR_CHUNK_ROWS = 50000
+
+CREATE_MIRROR_STATE_SQL = """
+CREATE TABLE IF NOT EXISTS mirror_state (
+    table_name VARCHAR PRIMARY KEY,
+    delete_change_id BIGINT           -- Last bronze_change_log delete folded into the copy
+)
+"""
+
+
+def _mirror_type(declared):
+    """DuckDB column type for a SQLite declared type, following SQLite's affinity rules."""
+    declared = (declared or "").upper()
+    if "INT" in declared:
+        return "BIGINT"
+    if any(name in declared for name in ("REAL", "FLOA", "DOUB")):
+        return "DOUBLE"
+    # Text, dates (stored as ISO text by the loaders) and untyped columns
+    return "VARCHAR"
+
+
+def _plain_value(value):
+    """Converts DuckDB result types to what sqlite3 returns, so aggregates stay JSON-friendly."""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+class DuckDBBackend:
+    """Runs the fused scans on an embedded DuckDB database (see the module header)."""
+
+    name = "duckdb"
+
+    def __init__(self, mode="mirror", duckdb_path=None):
+        import duckdb   # Optional dependency, only loaded when DB_TYPE=duckdb
+
+        if mode not in DUCKDB_MODES:
+            raise ValueError(f"DUCKDB_MODE must be one of {DUCKDB_MODES}, not '{mode}'.")
+        self.mode = mode
+        self.error = duckdb.Error
+        self.db = duckdb.connect(duckdb_path or ":memory:")
+        self.db.execute(CREATE_MIRROR_STATE_SQL)
+        self._lock = threading.Lock()
+
+    def translate(self, sql):
+        """SQLite named parameters (:name) become DuckDB's ($name); rowid is the mirror's column."""
+        sql = re.sub(r"(?<![:\w]):([A-Za-z_]\w*)", r"$\1", sql)
+        return re.sub(r"\browid\b", MIRROR_ROWID, sql)
+
+    def _matches_source(self, cursor, conn, table, rowid):
+        """True if the mirror's row 'rowid' still equals SQLite's (a replaced database differs)."""
+        if rowid == 0:
+            return True
+        source = conn.execute(f"SELECT * FROM {table} WHERE rowid = ?", (rowid,)).fetchone()
+        mirrored = cursor.execute(
+            f"SELECT * EXCLUDE ({MIRROR_ROWID}) FROM main.{table} WHERE {MIRROR_ROWID} = ?", [rowid]
+        ).fetchone()
+        if source is None or mirrored is None or len(source) != len(mirrored):
+            return False
+        # Untyped SQLite columns are mirrored as text, so 5 and '5' are the same value
+        return all(
+            a == b or str(a) == str(b)
+            for a, b in zip(source, (_plain_value(value) for value in mirrored))
+        )
+
+    def _last_delete(self, conn, table):
+        try:
+            row = conn.execute(
+                "SELECT MAX(change_id) FROM bronze_change_log WHERE source_table = ? AND change_type = 'delete'",
+                (table,)
+            ).fetchone()
+        except sqlite3.Error:
+            # No change log in this database: only a shrinking table is noticed
+            return None
+        return row[0]
+
+    def _copy(self, cursor, conn, table, start, end):
+        """Appends the SQLite rows with rowids in (start, end] to the mirror. Returns the rows copied."""
+        import pandas as pd   # Only mirrors need it
+
+        sql = f"SELECT rowid AS {MIRROR_ROWID}, * FROM {table} WHERE rowid > ? AND rowid <= ?"
+        copied = 0
+        for chunk in pd.read_sql(sql, conn, params=(start, end), chunksize=MIRROR_CHUNK_ROWS):
+            cursor.register("mirror_chunk", chunk)
+            try:
+                cursor.execute(f"INSERT INTO main.{table} SELECT * FROM mirror_chunk")
+            finally:
+                cursor.unregister("mirror_chunk")
+            copied += len(chunk)
+        return copied
+
+    def sync(self, conn, table, end):
+        """Brings the mirror of 'table' up to rowid 'end'. Returns the rows copied."""
+        cursor = self.db.cursor()
+        last_delete = self._last_delete(conn, table)
+        state = cursor.execute("SELECT delete_change_id FROM mirror_state WHERE table_name = ?", [table]).fetchone()
+        mirrored_end = None
+        if state is not None and state[0] == last_delete:
+            mirrored_end = cursor.execute(f"SELECT COALESCE(MAX({MIRROR_ROWID}), 0) FROM main.{table}").fetchone()[0]
+            if mirrored_end <= end and not self._matches_source(cursor, conn, table, mirrored_end):
+                logging.info(f"{table}: the DuckDB mirror no longer matches the SQLite table.")
+                mirrored_end = None
+
+        if mirrored_end is not None and mirrored_end <= end:
+            if mirrored_end == end:
+                return 0
+            try:
+                return self._copy(cursor, conn, table, mirrored_end, end)
+            except self.error as e:
+                logging.warning(f"{table}: could not append to the DuckDB mirror ({e}). Rebuilding it.")
+
+        logging.info(f"{table}: building the DuckDB mirror up to rowid {end}.")
+        columns = [f'"{row[1]}" {_mirror_type(row[2])}' for row in conn.execute(f"PRAGMA table_info({table})")]
+        cursor.execute(f"CREATE OR REPLACE TABLE main.{table} ({MIRROR_ROWID} BIGINT, {', '.join(columns)})")
+        copied = self._copy(cursor, conn, table, 0, end)
+        cursor.execute("INSERT OR REPLACE INTO mirror_state VALUES (?, ?)", [table, last_delete])
+        return copied
+
+    def scan(self, conn, table, sql, params):
+        """Runs a fused aggregate query over the window in params. Returns its single row."""
+        # One sync at a time per backend: mirrors of different tables share mirror_state
+        with self._lock:
+            self.sync(conn, table, params["end"])
+        row = self.db.cursor().execute(self.translate(sql), params).fetchone()
+        return [_plain_value(value) for value in row]
+
+    def describe(self):
+        """Stored as the query plan of table scans run on this backend."""
+        return f"duckdb ({self.mode})"
+
+    def close(self):
+        self.db.close()
+
+
+# Backend name (DB_TYPE) -> class; None runs the scans on the SQLite connection itself
+BACKENDS = {"sqlite": None, "duckdb": DuckDBBackend}
+
+_backend = None
+_backend_key = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Returns the scan backend configured by DB_TYPE (None for SQLite), shared by the
+    process and rebuilt when DB_TYPE, DB_PATH or the DuckDB settings change.
+    """
+    global _backend, _backend_key
+
+    db_type = (os.getenv("DB_TYPE") or "sqlite").lower()
+    if db_type not in BACKENDS:
+        logging.error(f"Unknown DB_TYPE '{db_type}'. Using sqlite.")
+        return None
+    if BACKENDS[db_type] is None:
+        return None
+
+    db_path = get_db_path()
+    if db_path is None:
+        return None
+    mode = (os.getenv("DUCKDB_MODE") or "mirror").lower()
+    duckdb_path = os.getenv("DUCKDB_PATH") or None
+    if mode == "mirror" and duckdb_path is None:
+        # Persisted next to the SQLite file, so each run only copies the new rows
+        duckdb_path = db_path.with_suffix(".duckdb").as_posix()
+    key = (db_type, str(db_path), mode, duckdb_path, os.getpid())
+
+    with _backend_lock:
+        if _backend is not None and _backend_key == key:
+            return _backend
+        if _backend is not None and _backend_key[-1] == os.getpid():
+            _backend.close()
+        _backend = _backend_key = None
+
+        try:
+            _backend = BACKENDS[db_type](mode, duckdb_path)
+        except ImportError:
+            logging.error("DB_TYPE=duckdb but the duckdb package is not installed. Using sqlite.")
+            return None
+        except Exception as e:
+            logging.error(f"Could not open the {db_type} backend ({e}). Using sqlite.")
+            return None
+        _backend_key = key
+        logging.info(f"Table scans run on {_backend.describe()}.")
+        if mode == "mirror" and duckdb_path == ":memory:":
+            logging.warning("DUCKDB_PATH=:memory: rebuilds every DuckDB mirror in each process; use a file outside the daemon.")
+        return _backend
+
+
+def close_backend():
+    """Closes the shared backend. Registered to run at interpreter exit."""
+    global _backend, _backend_key
+    with _backend_lock:
+        if _backend is not None and _backend_key[-1] == os.getpid():
+            _backend.close()
+        _backend = _backend_key = None
+
+
+atexit.register(close_backend)
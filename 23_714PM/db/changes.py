@@ -0,0 +1,101 @@
+# db/changes.py
+# Change capture for the bronze layer: one row per committed batch, so the detector
+# can wake up on new data and evaluate only the tables (and rowid ranges) that changed.
+
+import logging
+import sqlite3
+
+# Written by the loaders in the same transaction as the rows themselves (see
+# etl/streaming.py and etl/load_deletion.py), so a record exists if and only if its
+# batch committed. A batch-level log costs one INSERT per load, where row-level
+# triggers would add a write to every inserted row.
+CREATE_CHANGE_LOG_SQL = """
+CREATE TABLE IF NOT EXISTS bronze_change_log (
+    change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source_table TEXT NOT NULL,       -- Bronze table that changed
+    change_type TEXT NOT NULL,        -- 'append' or 'delete'
+    first_rowid INTEGER,              -- Rowid range touched by the batch
+    last_rowid INTEGER,
+    row_count INTEGER NOT NULL,       -- Rows appended or deleted
+    committed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+def ensure_change_log(conn):
+    """Creates the bronze_change_log table on first use."""
+    conn.execute(CREATE_CHANGE_LOG_SQL)
+    conn.commit()
+
+
+def record_change(conn, source_table: str, change_type: str, first_rowid, last_rowid, row_count: int):
+    """
+    Appends one change record without committing.
+
+    Call it inside the loading transaction, just before its commit, so the record and
+    the rows it describes commit (or roll back) together.
+    """
+    conn.execute(CREATE_CHANGE_LOG_SQL)
+    conn.execute(
+        """
+        INSERT INTO bronze_change_log (source_table, change_type, first_rowid, last_rowid, row_count)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (source_table, change_type, first_rowid, last_rowid, row_count)
+    )
+
+
+def latest_change_id(conn) -> int:
+    """Highest change_id recorded so far (0 if there is no change log yet)."""
+    try:
+        return conn.execute("SELECT COALESCE(MAX(change_id), 0) FROM bronze_change_log").fetchone()[0]
+    except sqlite3.Error:
+        return 0
+
+
+def read_changes(conn, after_change_id: int = 0) -> list:
+    """Returns the change records with change_id > after_change_id, oldest first."""
+    try:
+        cursor = conn.execute(
+            """
+            SELECT change_id, source_table, change_type, first_rowid, last_rowid, row_count
+            FROM bronze_change_log WHERE change_id > ? ORDER BY change_id
+            """,
+            (after_change_id,)
+        )
+        rows = cursor.fetchall()
+    except sqlite3.Error:
+        # No loader has recorded a change yet
+        return []
+
+    return [
+        {"change_id": row[0], "source_table": row[1], "change_type": row[2],
+         "first_rowid": row[3], "last_rowid": row[4], "row_count": row[5]}
+        for row in rows
+    ]
+
+
+def summarize_changes(changes: list) -> dict:
+    """Folds change records into {table: {'first_rowid', 'last_rowid', 'row_count', 'deleted'}}."""
+    summary = {}
+    for change in changes:
+        entry = summary.setdefault(
+            change["source_table"],
+            {"first_rowid": None, "last_rowid": None, "row_count": 0, "deleted": False}
+        )
+        if change["first_rowid"] is not None and (entry["first_rowid"] is None or change["first_rowid"] < entry["first_rowid"]):
+            entry["first_rowid"] = change["first_rowid"]
+        if change["last_rowid"] is not None and (entry["last_rowid"] is None or change["last_rowid"] > entry["last_rowid"]):
+            entry["last_rowid"] = change["last_rowid"]
+        entry["row_count"] += change["row_count"]
+        entry["deleted"] = entry["deleted"] or change["change_type"] == "delete"
+    return summary
+
+
+def prune_changes(conn, up_to_change_id: int):
+    """Deletes the records a consumer has processed (change_id <= up_to_change_id)."""
+    try:
+        with conn:
+            conn.execute("DELETE FROM bronze_change_log WHERE change_id <= ?", (up_to_change_id,))
+    except sqlite3.Error as e:
+        logging.error(f"Failed to prune bronze_change_log: {e}")
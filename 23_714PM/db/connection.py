@@ -1,6 +1,9 @@
 import sqlite3
 import logging
 import os
+import atexit
+import threading
+from functools import lru_cache
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -21,50 +24,242 @@ def get_db_path() -> Path | None:
     1. This script (connection.py) is inside a 'db' directory.
     2. The database file (e.g., olist.sqlite) is in the parent directory (project root).
     """
-    # 1. Get the path object for THIS file
-    current_file_path = Path(__file__).resolve()
-    
-    # 2. Go up one level to the project root directory
-    project_root = current_file_path.parent.parent
-    
-    # 3. Get filename from .env
+    # 1. Get filename from .env
     db_filename = os.getenv("DB_PATH")
     
     if not db_filename:
         logging.error("CRITICAL: DB_PATH not set in .env")
         return None
     
-    # 4. Join the root and filename
-    full_db_path = project_root / db_filename
-    
-    return full_db_path
+    # 2. Resolve it against the project root (cached per DB_PATH value)
+    return _resolve_db_path(db_filename)
 
-# --- Database Connection Function ---
-def get_db_connection():
-    """Establishes and returns a SQLite connection."""
+@lru_cache(maxsize=None)
+def _resolve_db_path(db_filename: str) -> Path:
+    """Joins DB_PATH to the project root (the parent of this 'db' directory)."""
+    # 1. Get the path object for THIS file
+    current_file_path = Path(__file__).resolve()
     
-    full_db_path = get_db_path()
+    # 2. Go up one level to the project root directory
+    project_root = current_file_path.parent.parent
     
+    # 3. Join the root and filename
+    return project_root / db_filename
+
+# --- Connection Tuning ---
+# Applied once, when a connection is first opened by the pool. journal_mode=WAL is
+# persistent in the database file and lets readers run while a writer commits.
+WRITER_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",      # Safe with WAL; fsync at checkpoints instead of every commit
+    "mmap_size": 268435456,       # 256 MB of memory-mapped I/O
+    "cache_size": -65536,         # 64 MB page cache (negative = KiB)
+    "temp_store": "MEMORY",       # Sorts / DISTINCT / temp indexes stay in RAM
+    "busy_timeout": 5000
+}
+
+READER_PRAGMAS = {
+    "mmap_size": 268435456,
+    "cache_size": -65536,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+    "query_only": 1               # Guard against accidental writes on reader connections
+}
+
+# Prepared statements kept per connection (the sqlite3 default is 128)
+STATEMENT_CACHE_SIZE = 512
+
+# Max idle reader connections kept open by the pool
+MAX_IDLE_READERS = 8
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    A sqlite3 connection whose close() hands it back to the pool instead of closing it.
+
+    Callers keep the usual pattern (conn = get_db_connection() ... conn.close()), but the
+    next caller reuses the same warm, already-tuned connection. Uncommitted work is
+    rolled back on close(), exactly as a real close would discard it.
+    """
+    pool = None
+    role = None
+
+    def close(self):
+        if self.pool is None:
+            return super().close()
+        self.pool.release(self)
+
+    def really_close(self):
+        """Closes the underlying SQLite connection."""
+        super().close()
+
+
+class ConnectionPool:
+    """
+    Small process-local pool for one database file.
+
+    - One shared writer connection (SQLite allows a single writer at a time anyway).
+      If it is already checked out, an extra unpooled writer is handed out.
+    - Any number of read-only reader connections; up to MAX_IDLE_READERS are kept warm.
+    Connections are opened with check_same_thread=False so worker threads can use them,
+    but each connection must only be used by one thread at a time.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_busy = False
+        self._idle_readers = []
+
+    def _open(self, role: str):
+        if role == "reader":
+            target, uri = f"{self.db_path.as_uri()}?mode=ro", True
+            pragmas = READER_PRAGMAS
+        else:
+            target, uri = str(self.db_path), False
+            pragmas = WRITER_PRAGMAS
+
+        conn = sqlite3.connect(
+            target,
+            uri=uri,
+            factory=PooledConnection,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        conn.role = role
+        logging.info(f"Successfully connected to Olist DB ({role}).")
+        return conn
+
+    def writer(self):
+        """Checks out the shared writer connection."""
+        with self._lock:
+            if not self._writer_busy:
+                if self._writer is None:
+                    self._writer = self._open("writer")
+                    self._writer.pool = self
+                self._writer_busy = True
+                return self._writer
+
+        # Shared writer in use (e.g. by another thread): hand out a private one.
+        return self._open("writer")
+
+    def reader(self):
+        """Checks out a read-only connection."""
+        with self._lock:
+            if self._idle_readers:
+                return self._idle_readers.pop()
+        conn = self._open("reader")
+        conn.pool = self
+        return conn
+
+    def release(self, conn):
+        """Returns a connection to the pool (called by PooledConnection.close())."""
+        if conn.in_transaction:
+            conn.rollback()
+
+        with self._lock:
+            if conn is self._writer:
+                self._writer_busy = False
+                return
+            if conn.role == "reader" and len(self._idle_readers) < MAX_IDLE_READERS:
+                self._idle_readers.append(conn)
+                return
+        conn.really_close()
+
+    def close_all(self):
+        """Closes every pooled connection (checked-out ones are closed when released)."""
+        with self._lock:
+            connections = self._idle_readers
+            self._idle_readers = []
+            if self._writer is not None and not self._writer_busy:
+                connections.append(self._writer)
+                self._writer = None
+            elif self._writer is not None:
+                self._writer.pool = None   # Really close it when its user calls close()
+                self._writer = None
+
+        for conn in connections:
+            conn.really_close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool | None:
+    """Returns the process-wide pool for the configured DB_PATH (None if unavailable)."""
+    global _pool
+
+    full_db_path = get_db_path()
     if not full_db_path:
         return None
-    
-    # Debug print (Use .as_posix() for clean path string)
-    print(f"\n--- DEBUG: Calculated DB Path: {full_db_path.as_posix()} ---\n")
 
-    # Check existence
-    if not full_db_path.exists():
-        logging.error(f"CRITICAL: Database file not found at: {full_db_path.as_posix()}")
+    with _pool_lock:
+        # Rebuild the pool if DB_PATH changed or we are in a forked child process
+        if _pool is not None and (_pool.db_path != full_db_path or _pool.pid != os.getpid()):
+            if _pool.pid == os.getpid():
+                _pool.close_all()
+            _pool = None
+
+        if _pool is None:
+            # Debug print (Use .as_posix() for clean path string), once per pool
+            print(f"\n--- DEBUG: Calculated DB Path: {full_db_path.as_posix()} ---\n")
+
+            # Check existence
+            if not full_db_path.exists():
+                logging.error(f"CRITICAL: Database file not found at: {full_db_path.as_posix()}")
+                return None
+            _pool = ConnectionPool(full_db_path)
+
+        return _pool
+
+
+def close_all_connections():
+    """Closes the pooled connections. Registered to run at interpreter exit."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.close_all()
+        _pool = None
+
+
+atexit.register(close_all_connections)
+
+# --- Database Connection Functions ---
+def get_db_connection():
+    """
+    Returns the shared, tuned SQLite writer connection (or None on failure).
+
+    Calling conn.close() hands the connection back to the pool, so successive
+    injectors and the detector in one process reuse the same connection.
+    """
+    pool = get_pool()
+    if pool is None:
         return None
 
     try:
-        # Use str(full_db_path) for sqlite3.connect
-        conn = sqlite3.connect(str(full_db_path))
-        conn.row_factory = sqlite3.Row
-        logging.info("Successfully connected to Olist DB.")
-        return conn
+        return pool.writer()
     except sqlite3.Error as e:
         logging.error(f"Connection failed: {e}")
         return None
+
+
+def get_reader_connection():
+    """Returns a pooled read-only connection (or None on failure). close() returns it."""
+    pool = get_pool()
+    if pool is None:
+        return None
+
+    try:
+        return pool.reader()
+    except sqlite3.Error as e:
+        logging.error(f"Reader connection failed: {e}")
+        return None
     
 # --- Test Block ---
 # This block runs ONLY when you execute this script directly (e.g., python db/connection.py)
@@ -0,0 +1,130 @@
+# db/incidents.py
+# Incident model on top of anomaly_audit_log.
+#
+# Most checks are cumulative, so an anomaly keeps firing on every run until the data is
+# fixed. Instead of one audit row per firing, each (source_table, check_name) has at
+# most one open incident: the first firing opens it and writes the audit row, later
+# firings only bump its last-seen time, count and latest metric, and the first run in
+# which the check passes resolves it. A new firing after that opens a new incident.
+
+import logging
+import sqlite3
+
+from db.utils import _serialize_meta_data
+
+CREATE_INCIDENTS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS anomaly_incidents (
+    incident_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source_table TEXT NOT NULL,
+    check_name TEXT NOT NULL,
+    anomaly_category TEXT NOT NULL,
+    severity TEXT NOT NULL,           -- Severity of the latest firing
+    status TEXT NOT NULL DEFAULT 'open',   -- 'open' or 'resolved'
+    first_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
+    last_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
+    resolved_at DATETIME,
+    occurrences INTEGER NOT NULL DEFAULT 1,   -- Runs in which the check fired
+    last_metric_value REAL,
+    threshold_value REAL,
+    meta_data TEXT,                   -- meta_data of the latest firing
+    first_run_id TEXT,                -- Run that opened it (and wrote the audit row)
+    last_run_id TEXT
+);
+"""
+
+# At most one open incident per check; also serves the lookup on every firing
+CREATE_OPEN_INCIDENT_INDEX_SQL = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_anomaly_incidents_open
+ON anomaly_incidents (source_table, check_name) WHERE status = 'open';
+"""
+
+
+def ensure_incidents_table(conn):
+    """Creates the anomaly_incidents table on first use."""
+    conn.execute(CREATE_INCIDENTS_TABLE_SQL)
+    conn.execute(CREATE_OPEN_INCIDENT_INDEX_SQL)
+    conn.commit()
+
+
+def record_incidents(conn, run_id: str, findings: list, evaluated) -> list:
+    """
+    Folds one run's findings into the incident table, in one transaction.
+
+    Args:
+        conn: The active SQLite database connection object.
+        run_id: The detector run.
+        findings: Findings as passed to AnomalyBuffer.add().
+        evaluated: (source_table, check_name) pairs evaluated by this run; open incidents
+            among them that did not fire are resolved.
+
+    Returns:
+        The findings that opened a new incident: only these go to anomaly_audit_log.
+        On a database error every finding is returned, so nothing is lost.
+    """
+    opened = []
+    fired = set()
+    try:
+        meta_data = [_serialize_meta_data(finding["meta_data"]) for finding in findings]
+    except (TypeError, ValueError) as e:
+        logging.error(f"Could not serialize finding meta_data for anomaly_incidents: {e}")
+        return list(findings)
+
+    try:
+        with conn:
+            for finding, meta in zip(findings, meta_data):
+                key = (finding["source_table"], finding["check_name"])
+                fired.add(key)
+                cursor = conn.execute(
+                    """
+                    UPDATE anomaly_incidents
+                    SET last_seen = CURRENT_TIMESTAMP, occurrences = occurrences + 1,
+                        severity = ?, last_metric_value = ?, threshold_value = ?,
+                        meta_data = ?, last_run_id = ?
+                    WHERE source_table = ? AND check_name = ? AND status = 'open'
+                    """,
+                    (finding["severity"], finding["metric_value"], finding["threshold_value"],
+                     meta, run_id, *key)
+                )
+                if cursor.rowcount:
+                    continue
+
+                conn.execute(
+                    """
+                    INSERT INTO anomaly_incidents
+                    (source_table, check_name, anomaly_category, severity, last_metric_value,
+                     threshold_value, meta_data, first_run_id, last_run_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (*key, finding["category"], finding["severity"], finding["metric_value"],
+                     finding["threshold_value"], meta, run_id, run_id)
+                )
+                opened.append(finding)
+
+            resolved = [key for key in evaluated if key not in fired]
+            conn.executemany(
+                """
+                UPDATE anomaly_incidents SET status = 'resolved', resolved_at = CURRENT_TIMESTAMP
+                WHERE source_table = ? AND check_name = ? AND status = 'open'
+                """,
+                resolved
+            )
+    except sqlite3.Error as e:
+        logging.error(f"Could not update anomaly_incidents, logging every finding instead. Error: {e}")
+        return list(findings)
+
+    repeated = len(findings) - len(opened)
+    if repeated:
+        logging.info(f"{repeated} finding(s) matched an open incident; no new audit rows written for them.")
+    return opened
+
+
+def open_incidents(conn) -> list:
+    """Returns the open incidents as (source_table, check_name, severity, occurrences, first_seen, last_seen) rows."""
+    cursor = conn.execute(
+        """
+        SELECT source_table, check_name, severity, occurrences, first_seen, last_seen
+        FROM anomaly_incidents WHERE status = 'open'
+        ORDER BY last_seen DESC
+        """
+    )
+    return cursor.fetchall()
@@ -0,0 +1,170 @@
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+
+# Fix imports (this file is run directly, like init_db.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.connection import get_db_connection
+from anomaly.rules import ANOMALY_RULES
+from anomaly.checks import CHECK_TYPES
+from anomaly.engine import compile_plan
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Bronze tables are created implicitly by DataFrame.to_sql, so they have no indexes.
+# This advisor derives the indexes the detector needs from ANOMALY_RULES (each check
+# type in anomaly/checks.py lists its 'indexes' and 'probes'), creates them
+# idempotently and checks with EXPLAIN QUERY PLAN that every probe, and the fused
+# per-table query the engine actually runs (anomaly/engine.py), reads rows through an
+# index or a rowid range. 'SCAN <table> USING COVERING INDEX' still reads every entry
+# of the index, so any SCAN counts as a full scan.
+
+
+def index_name(table: str, column: str) -> str:
+    return f"idx_{table}_{column}"
+
+
+def required_indexes(rules_config=None) -> dict:
+    """
+    Returns {table: [columns]} needed by the configured rules, in rule order.
+
+    A hint is a column of the rule's own table, or a (table, column) tuple for a
+    lookup table the check joins to.
+    """
+    if rules_config is None:
+        rules_config = ANOMALY_RULES
+
+    required = {}
+    for table, rules in rules_config.items():
+        for rule in rules.values():
+            check_type = CHECK_TYPES.get(rule.get("type"))
+            if check_type is None:
+                continue
+            for hint in check_type["indexes"](rule):
+                target, column = hint if isinstance(hint, tuple) else (table, hint)
+                columns = required.setdefault(target, [])
+                if column not in columns:
+                    columns.append(column)
+    return required
+
+
+def provision_indexes(conn, rules_config=None, dry_run=False) -> list:
+    """
+    Creates every missing index (CREATE INDEX IF NOT EXISTS).
+
+    Tables that don't exist yet are skipped; run this again after the first load.
+    Returns the list of index names created (or that would be created on a dry run).
+    """
+    created = []
+    for table, columns in required_indexes(rules_config).items():
+        if not _table_exists(conn, table):
+            logging.warning(f"Skipping indexes for {table}: Table not created yet.")
+            continue
+
+        existing = {row[1] for row in conn.execute(f"PRAGMA index_list({table})")}
+        for column in columns:
+            name = index_name(table, column)
+            if name in existing:
+                continue
+            if dry_run:
+                logging.info(f"[dry run] Would create index {name} ON {table}({column})")
+            else:
+                logging.info(f"Creating index {name} ON {table}({column})...")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})")
+            created.append(name)
+
+    if created and not dry_run:
+        # Refresh planner statistics for the new indexes
+        conn.execute("PRAGMA optimize")
+        conn.commit()
+    return created
+
+
+# Plan label of the fused query, which serves every rule of its table
+FUSED_QUERY = "(fused query)"
+
+
+def _check_plan(conn, sql, params):
+    """Returns (uses_index, plan_detail) for one query."""
+    try:
+        steps = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    except sqlite3.Error as e:
+        return False, f"error: {e}"
+    # SEARCH is a range or key lookup; SCAN walks a whole table or index (aliases included)
+    full_scan = any(step.startswith("SCAN ") and step != "SCAN CONSTANT ROW" for step in steps)
+    return not full_scan, " | ".join(steps)
+
+
+def verify_query_plans(conn, rules_config=None) -> list:
+    """
+    Runs EXPLAIN QUERY PLAN on every table's fused query and every check's probes.
+
+    Returns:
+        (table, rule_name, probe, uses_index, plan_detail) tuples. The fused query is
+        reported once per table, with FUSED_QUERY as its rule_name and the window as
+        its probe. A query uses an index when no step of its plan is a SCAN.
+    """
+    if rules_config is None:
+        rules_config = ANOMALY_RULES
+
+    plans = {table_plan["table"]: table_plan for table_plan in compile_plan(rules_config)}
+    results = []
+    for table, rules in rules_config.items():
+        if not _table_exists(conn, table):
+            continue
+        if table in plans:
+            # The plan is the same for a full pass and an incremental window
+            uses_index, detail = _check_plan(conn, plans[table]["sql"], {"start": 1, "end": 1})
+            results.append((table, FUSED_QUERY, "rowid window", uses_index, detail))
+        for rule_name, rule in rules.items():
+            check_type = CHECK_TYPES.get(rule.get("type"))
+            if check_type is None:
+                continue
+            for label, sql, params in check_type["probes"](table, rule):
+                uses_index, detail = _check_plan(conn, sql, params)
+                results.append((table, rule_name, label, uses_index, detail))
+    return results
+
+
+def _table_exists(conn, table_name):
+    cursor = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+    return cursor.fetchone() is not None
+
+
+def run_index_advisor(dry_run=False) -> bool:
+    """Provisions the indexes and reports the query plans. Returns True if all probes use an index."""
+    conn = get_db_connection()
+    if conn is None:
+        logging.error("Skipping index provisioning due to connection failure.")
+        return False
+
+    try:
+        created = provision_indexes(conn, dry_run=dry_run)
+        logging.info(f"{len(created)} index(es) {'to create' if dry_run else 'created'}.")
+
+        all_indexed = True
+        for table, rule_name, label, uses_index, detail in verify_query_plans(conn):
+            status = "INDEX" if uses_index else "FULL SCAN"
+            log = logging.info if uses_index else logging.warning
+            log(f"{status:<9} | {table}.{rule_name} ({label}): {detail}")
+            all_indexed = all_indexed and uses_index
+        return all_indexed
+
+    except sqlite3.Error as e:
+        logging.error(f"Error provisioning indexes: {e}")
+        return False
+
+    finally:
+        conn.close()
+
+# Allow running this file directly
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create and verify the indexes used by the anomaly detector.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report the indexes that are missing.")
+    args = parser.parse_args()
+
+    sys.exit(0 if run_index_advisor(dry_run=args.dry_run) else 1)
@@ -1,6 +1,14 @@
-from connection import get_db_connection
 import logging
+import os
 import sqlite3
+import sys
+
+# Fix imports: package paths, so importing this file (db.init_db) shares the connection
+# pool of the detector instead of loading db/connection.py a second time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.connection import get_db_connection
+from db.rollups import ensure_rollups
 
 # Define the SQL for the Audit Table (Generic Structure - Option A)
 CREATE_AUDIT_TABLE_SQL = """
@@ -18,9 +26,14 @@ CREATE TABLE IF NOT EXISTS anomaly_audit_log (
 );
 """
 
+def ensure_audit_table(conn):
+    """Creates anomaly_audit_log if missing, for databases init_db.py was never run on."""
+    conn.execute(CREATE_AUDIT_TABLE_SQL)
+    conn.commit()
+
 def init_tables():
     """
-    Runs the DDL to create the audit table.
+    Runs the DDL to create the audit table, its indexes and the dashboard rollups.
     """
     conn = get_db_connection()
 
@@ -39,6 +52,10 @@ def init_tables():
         conn.commit()
         logging.info("Table 'anomaly_audit_log' created (or verified) successfully.")
 
+        # Indexes and rollup tables read by the Grafana dashboards (see rollups.py)
+        ensure_rollups(conn)
+        logging.info("Audit indexes and rollup tables created (or verified) successfully.")
+
     except sqlite3.Error as e:
         logging.error(f"Error creating table: {e}")
     
@@ -0,0 +1,111 @@
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+
+# Fix imports (this file is run directly, like init_db.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.connection import get_db_connection
+from db.rollups import ensure_rollups
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Retention for anomaly_audit_log: raw events older than the retention period are
+# deleted in batches. They have already been counted in anomaly_daily_summary (one row
+# per day, table, check and severity) and the other rollups when they were inserted (see
+# db/rollups.py), and rollups are never touched by deletes, so the history survives.
+
+DEFAULT_RETAIN_DAYS = 30
+DEFAULT_BATCH_SIZE = 5000
+
+
+def compact_audit_log(conn, retain_days=DEFAULT_RETAIN_DAYS, batch_size=DEFAULT_BATCH_SIZE, dry_run=False) -> dict:
+    """
+    Deletes the audit events from before the retention period, which are kept as daily
+    summaries.
+
+    Args:
+        conn: The active SQLite database connection object.
+        retain_days: Whole days of raw events to keep (counted back from today, UTC).
+        batch_size: Events deleted per transaction, so the detector is never blocked for long.
+        dry_run: Only count the events that would be compacted.
+
+    Returns:
+        {'cutoff', 'events', 'batches'}: events compacted (or to compact) before 'cutoff'.
+    """
+    if retain_days < 0:
+        raise ValueError("retain_days must not be negative.")
+    cutoff = conn.execute("SELECT date('now', ?)", (f"-{int(retain_days)} days",)).fetchone()[0]
+
+    if dry_run:
+        (events,) = conn.execute(
+            "SELECT count(*) FROM anomaly_audit_log WHERE event_timestamp < ?", (cutoff,)
+        ).fetchone()
+        return {"cutoff": cutoff, "events": events, "batches": 0}
+
+    # Rolls up anything logged before the rollups existed, so nothing is deleted uncounted
+    ensure_rollups(conn)
+    events = 0
+    batches = 0
+    last_log_id = 0
+    while True:
+        # log_id follows insertion order, so batches walk the table from its oldest end
+        (batch_end,) = conn.execute(
+            """
+            SELECT max(log_id) FROM (
+                SELECT log_id FROM anomaly_audit_log
+                WHERE log_id > ? AND event_timestamp < ?
+                ORDER BY log_id LIMIT ?
+            )
+            """,
+            (last_log_id, cutoff, batch_size)
+        ).fetchone()
+        if batch_end is None:
+            break
+
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM anomaly_audit_log WHERE log_id > ? AND log_id <= ? AND event_timestamp < ?",
+                (last_log_id, batch_end, cutoff)
+            )
+        events += cursor.rowcount
+        batches += 1
+        last_log_id = batch_end
+
+    return {"cutoff": cutoff, "events": events, "batches": batches}
+
+
+def run_compaction(retain_days=DEFAULT_RETAIN_DAYS, batch_size=DEFAULT_BATCH_SIZE, dry_run=False) -> bool:
+    """Compacts the audit log of the configured database. Returns True on success."""
+    conn = get_db_connection()
+    if conn is None:
+        logging.error("Skipping audit log compaction due to connection failure.")
+        return False
+
+    try:
+        result = compact_audit_log(conn, retain_days, batch_size, dry_run)
+        if dry_run:
+            logging.info(f"{result['events']} audit event(s) from before {result['cutoff']} would be compacted.")
+        else:
+            logging.info(f"Compacted {result['events']} audit event(s) from before {result['cutoff']} "
+                         f"into anomaly_daily_summary ({result['batches']} batch(es)).")
+        return True
+
+    except sqlite3.Error as e:
+        logging.error(f"Error compacting the audit log: {e}")
+        return False
+
+    finally:
+        conn.close()
+
+# Allow running this file directly
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Roll old anomaly_audit_log events into daily summaries.")
+    parser.add_argument("--retain-days", type=int, default=DEFAULT_RETAIN_DAYS, help="Days of raw events to keep.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Events compacted per transaction.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many events would be compacted.")
+    args = parser.parse_args()
+
+    sys.exit(0 if run_compaction(args.retain_days, args.batch_size, args.dry_run) else 1)
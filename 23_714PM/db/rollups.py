@@ -0,0 +1,167 @@
+# db/rollups.py
+# Read path for the dashboards (see the Grafana guide): indexes on anomaly_audit_log and
+# rollup tables that an AFTER INSERT trigger keeps up to date.
+#
+# Each rollup holds one row per key (hour, day or check, with table and severity), so a
+# panel reads a number of rows that depends on the buckets it shows, not on how many
+# events were logged. The trigger costs three primary-key upserts per audit row, which
+# is cheap next to the detector run that produced it. Only inserts are rolled up:
+# anomaly_daily_summary therefore keeps counting events after db/retention.py deletes
+# them from the raw log. This file is also imported by init_db.py, so it only depends
+# on sqlite3.
+
+import logging
+import sqlite3
+
+# All four dashboard filters are in every index, so a count / group-by panel is
+# answered from the index alone. Severity has a handful of values and is filtered
+# inside the time range; tables and checks are selective enough to lead an index.
+AUDIT_INDEXES = {
+    "idx_audit_time": "event_timestamp, severity, source_table, check_name",
+    "idx_audit_table": "source_table, event_timestamp, severity, check_name",
+    "idx_audit_check": "check_name, event_timestamp, severity, source_table"
+}
+
+# Rollup table -> its key columns (after the bucket, if any) as {column: expression}
+ROLLUPS = {
+    "anomaly_hourly_rollup": {"hour": "strftime('%Y-%m-%d %H:00:00', {row}event_timestamp)"},
+    "anomaly_daily_summary": {"day": "date({row}event_timestamp)"},
+    "anomaly_check_rollup": {}
+}
+
+ROLLUP_KEY = {
+    "source_table": "{row}source_table",
+    "check_name": "COALESCE({row}check_name, '')",     # '' for events logged without one
+    "severity": "COALESCE({row}severity, 'INFO')"
+}
+
+CREATE_ROLLUP_SQL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    {key_columns}
+    anomaly_category TEXT,
+    events INTEGER NOT NULL,          -- Audit events rolled into this row
+    min_metric REAL,
+    max_metric REAL,
+    last_metric REAL,                 -- metric_value / threshold_value of the latest event
+    last_threshold REAL,
+    first_event DATETIME,
+    last_event DATETIME,
+    first_log_id INTEGER,
+    last_log_id INTEGER,
+    PRIMARY KEY ({key})
+) WITHOUT ROWID;
+"""
+
+UPSERT_SQL = """
+ON CONFLICT ({key}) DO UPDATE SET
+    events = events + excluded.events,
+    min_metric = COALESCE(min(min_metric, excluded.min_metric), min_metric, excluded.min_metric),
+    max_metric = COALESCE(max(max_metric, excluded.max_metric), max_metric, excluded.max_metric),
+    anomaly_category = CASE WHEN excluded.last_log_id > last_log_id THEN excluded.anomaly_category ELSE anomaly_category END,
+    last_metric = CASE WHEN excluded.last_log_id > last_log_id THEN excluded.last_metric ELSE last_metric END,
+    last_threshold = CASE WHEN excluded.last_log_id > last_log_id THEN excluded.last_threshold ELSE last_threshold END,
+    first_event = min(first_event, excluded.first_event),
+    last_event = max(last_event, excluded.last_event),
+    first_log_id = min(first_log_id, excluded.first_log_id),
+    last_log_id = max(last_log_id, excluded.last_log_id)
+"""
+
+ROLLUP_COLUMNS = """({key}, anomaly_category, events, min_metric, max_metric, last_metric, last_threshold,
+ first_event, last_event, first_log_id, last_log_id)"""
+
+# Trigger body: the new row is one event
+ROLLUP_ROW_SQL = """
+INSERT INTO {table} {columns}
+VALUES ({expressions}, NEW.anomaly_category, 1, NEW.metric_value, NEW.metric_value, NEW.metric_value,
+        NEW.threshold_value, NEW.event_timestamp, NEW.event_timestamp, NEW.log_id, NEW.log_id)
+"""
+
+# Backfill: the latest event of each group is joined back by log_id (a bare column next
+# to several min()/max() aggregates would come from an unspecified row). 'WHERE true'
+# keeps the upsert's ON CONFLICT from being parsed as a join constraint.
+ROLLUP_BACKFILL_SQL = """
+INSERT INTO {table} {columns}
+SELECT {group_key}, a.anomaly_category, g.events, g.min_metric, g.max_metric, a.metric_value,
+       a.threshold_value, g.first_event, g.last_event, g.first_log_id, g.last_log_id
+FROM (
+    SELECT {expressions}, count(*) AS events, min(metric_value) AS min_metric,
+           max(metric_value) AS max_metric, min(event_timestamp) AS first_event,
+           max(event_timestamp) AS last_event, min(log_id) AS first_log_id, max(log_id) AS last_log_id
+    FROM anomaly_audit_log
+    GROUP BY {key}
+) g
+JOIN anomaly_audit_log a ON a.log_id = g.last_log_id
+WHERE true
+"""
+
+ROLLUP_TRIGGER = "trg_anomaly_audit_rollup"
+
+
+def _key_columns(table):
+    columns = dict(ROLLUPS[table])
+    columns.update(ROLLUP_KEY)
+    return columns
+
+
+def create_rollup_sql(table) -> str:
+    columns = _key_columns(table)
+    return CREATE_ROLLUP_SQL.format(
+        table=table,
+        key_columns="".join(f"{column} TEXT NOT NULL,\n    " for column in columns),
+        key=", ".join(columns)
+    )
+
+
+def rollup_sql(table, backfill=False) -> str:
+    """Upsert that adds the new audit row (trigger body) or every audit row to a rollup table."""
+    columns = _key_columns(table)
+    key = ", ".join(columns)
+    if backfill:
+        expressions = ", ".join(f"{expression.format(row='')} AS {column}" for column, expression in columns.items())
+        sql = ROLLUP_BACKFILL_SQL.format(
+            table=table, columns=ROLLUP_COLUMNS.format(key=key), key=key, expressions=expressions,
+            group_key=", ".join(f"g.{column}" for column in columns)
+        )
+    else:
+        expressions = ", ".join(expression.format(row="NEW.") for expression in columns.values())
+        sql = ROLLUP_ROW_SQL.format(table=table, columns=ROLLUP_COLUMNS.format(key=key), expressions=expressions)
+    return sql + UPSERT_SQL.format(key=key)
+
+
+def ensure_audit_indexes(conn):
+    """Creates the dashboard indexes on anomaly_audit_log."""
+    for name, columns in AUDIT_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON anomaly_audit_log ({columns})")
+    conn.commit()
+
+
+def ensure_rollups(conn):
+    """
+    Creates the audit indexes, the rollup tables and their trigger. When the trigger is
+    first created, the events already in anomaly_audit_log are rolled up in the same
+    transaction, so each event is counted exactly once.
+    """
+    ensure_audit_indexes(conn)
+    for table in ROLLUPS:
+        conn.execute(create_rollup_sql(table))
+    conn.commit()
+
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (ROLLUP_TRIGGER,)
+    ).fetchone()
+    if exists:
+        return
+
+    statements = "".join(f"{rollup_sql(table)};\n" for table in ROLLUPS)
+    try:
+        with conn:
+            for table in ROLLUPS:
+                conn.execute(rollup_sql(table, backfill=True))
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {ROLLUP_TRIGGER} AFTER INSERT ON anomaly_audit_log\n"
+                f"BEGIN\n{statements}END;"
+            )
+    except sqlite3.Error as e:
+        logging.error(f"Could not create the anomaly_audit_log rollups: {e}")
+        raise
+    logging.info("Rolled up the existing anomaly_audit_log events; new events are rolled up on insert.")
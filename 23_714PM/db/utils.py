@@ -1,6 +1,7 @@
 import json
 import logging
 import sqlite3
+import uuid
 
 # Initialize logging if it hasn't been done in the main script
 logging.basicConfig(
@@ -8,9 +9,26 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+INSERT_ANOMALY_SQL = """
+INSERT INTO anomaly_audit_log 
+(source_table, anomaly_category, check_name, severity, metric_value, threshold_value, meta_data, run_id)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def new_run_id() -> str:
+    """Returns a fresh identifier used to group the audit rows of one detector run."""
+    return uuid.uuid4().hex
+
+def _serialize_meta_data(meta_data: dict | str | None) -> str | None:
+    """Ensures meta_data is a string (compact JSON) or None."""
+    if isinstance(meta_data, dict):
+        return json.dumps(meta_data, separators=(",", ":"), default=str)
+    # Assume it's already a string if not a dict or None
+    return meta_data
+
 def log_anomaly(conn, source_table: str, category: str, check_name: str, 
                 severity: str, metric_value: float, threshold_value: float, 
-                meta_data: dict | str | None = None):
+                meta_data: dict | str | None = None, run_id: str | None = None):
     """
     Inserts a record into the centralized anomaly_audit_log table.
     
@@ -23,34 +41,24 @@ def log_anomaly(conn, source_table: str, category: str, check_name: str,
         metric_value: The measured value that triggered the alert.
         threshold_value: The defined limit that was violated.
         meta_data: Optional dictionary or JSON string for LLM context.
+        run_id: Optional identifier of the detector run that produced the anomaly.
     """
     try:
         # 1. Ensure meta_data is a string (JSON) or None
-        if isinstance(meta_data, dict):
-            meta_data_str = json.dumps(meta_data)
-        elif meta_data is None:
-            meta_data_str = None
-        else:
-            # Assume it's already a string if not a dict or None
-            meta_data_str = meta_data
+        meta_data_str = _serialize_meta_data(meta_data)
             
         cursor = conn.cursor()
         
-        sql = """
-        INSERT INTO anomaly_audit_log 
-        (source_table, anomaly_category, check_name, severity, metric_value, threshold_value, meta_data)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """
-        
         # 2. Execute with parameters
-        cursor.execute(sql, (
+        cursor.execute(INSERT_ANOMALY_SQL, (
             source_table, 
             category, 
             check_name, 
             severity, 
             metric_value, 
             threshold_value, 
-            meta_data_str
+            meta_data_str,
+            run_id
         ))
         conn.commit()
         
@@ -62,4 +70,74 @@ def log_anomaly(conn, source_table: str, category: str, check_name: str,
         logging.error(f"FATAL LOGGING ERROR: Failed to insert anomaly into audit table. Error: {e}")
     except Exception as e:
         # Catch unexpected errors like JSON serialization issues
-        logging.error(f"UNEXPECTED ERROR in log_anomaly: {e}")
\ No newline at end of file
+        logging.error(f"UNEXPECTED ERROR in log_anomaly: {e}")
+
+
+class AnomalyBuffer:
+    """
+    Collects the anomalies of a run and writes them to anomaly_audit_log in batches.
+
+    log_anomaly() commits once per alert; the buffer instead writes every pending row
+    with a single executemany() in one transaction, either when flush() is called at
+    the end of the run or when max_size rows are waiting. All rows share one run_id.
+
+    Usage:
+        with AnomalyBuffer(conn) as audit:
+            audit.add(source_table=..., category=..., ...)
+    """
+
+    def __init__(self, conn, run_id: str | None = None, max_size: int = 500):
+        self.conn = conn
+        self.run_id = run_id or new_run_id()
+        self.max_size = max_size
+        self.pending = []
+        self.written = 0
+
+    def add(self, source_table: str, category: str, check_name: str,
+            severity: str, metric_value: float, threshold_value: float,
+            meta_data: dict | str | None = None):
+        """Queues one anomaly (same arguments as log_anomaly) and flushes if the buffer is full."""
+        try:
+            meta_data_str = _serialize_meta_data(meta_data)
+        except (TypeError, ValueError) as e:
+            logging.error(f"UNEXPECTED ERROR in AnomalyBuffer.add: {e}")
+            return
+
+        self.pending.append((
+            source_table,
+            category,
+            check_name,
+            severity,
+            metric_value,
+            threshold_value,
+            meta_data_str,
+            self.run_id
+        ))
+        if len(self.pending) >= self.max_size:
+            self.flush()
+
+    def flush(self) -> int:
+        """Writes all pending anomalies in one transaction. Returns the number of rows written."""
+        if not self.pending:
+            return 0
+
+        rows, self.pending = self.pending, []
+        try:
+            with self.conn:
+                self.conn.executemany(INSERT_ANOMALY_SQL, rows)
+        except sqlite3.Error as e:
+            # Log the failure but allow the detector script to continue if possible
+            logging.error(f"FATAL LOGGING ERROR: Failed to insert {len(rows)} anomalies into audit table. Error: {e}")
+            return 0
+
+        self.written += len(rows)
+        for row in rows:
+            logging.info(f"Anomaly Logged | Table: {row[0]} | Check: {row[2]} | Value: {row[4]}")
+        return len(rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        return False
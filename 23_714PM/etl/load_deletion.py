@@ -7,6 +7,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from db.connection import get_db_connection
+from db.changes import record_change
 # No log_anomaly import (Detector handles the observation)
 
 # Configure Logging
@@ -47,16 +48,22 @@ def run_deletion_injection():
 
         # Execute DELETE. 
         # In SQLite, we use the 'rowid' to target the most recently added rows (simulating a bad rollback or cleanup).
-        delete_query = f"""
-            DELETE FROM bronze_order_payments 
-            WHERE rowid IN (
+        target_rows = f"""
                 SELECT rowid FROM bronze_order_payments 
                 ORDER BY rowid DESC 
                 LIMIT {rows_to_delete}
-            )
         """
+        delete_query = f"""
+            DELETE FROM bronze_order_payments 
+            WHERE rowid IN ({target_rows})
+        """
+
+        # Remember the rowid range for the change log before the rows are gone
+        cursor.execute(f"SELECT MIN(rowid), MAX(rowid) FROM ({target_rows})")
+        first_rowid, last_rowid = cursor.fetchone()
         
         cursor.execute(delete_query)
+        record_change(conn, 'bronze_order_payments', 'delete', first_rowid, last_rowid, cursor.rowcount)
         conn.commit()
         
         # 3. VERIFY: Check the new count
@@ -1,5 +1,4 @@
 import pandas as pd
-import uuid
 import logging
 import sys
 import os
@@ -8,6 +7,8 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from db.connection import get_db_connection
+from etl.streaming import stream_append
+from etl.synthetic import new_ids
 # NOTE: log_anomaly import removed (Separation of Concerns)
 
 # Configure Logging
@@ -17,9 +18,9 @@ def generate_new_customer_ids(df):
     """
     Assigns new UUIDs to the customer_id column so they look like new users.
     """
-    df['customer_id'] = [str(uuid.uuid4()) for _ in range(len(df))]
+    df['customer_id'] = new_ids(len(df))
     # Olist has 'customer_unique_id' too, let's randomize that to be safe
-    df['customer_unique_id'] = [str(uuid.uuid4()) for _ in range(len(df))]
+    df['customer_unique_id'] = new_ids(len(df))
     return df
 
 def run_drop_injection():
@@ -51,7 +52,7 @@ def run_drop_injection():
         logging.warning(f"Traffic Drop Injected! Expected {expected_volume} rows, but processing {actual_volume}.")
 
         # 4. LOAD: Append the tiny batch to Bronze
-        df_drop.to_sql('bronze_customers', conn, if_exists='append', index=False)
+        stream_append(conn, 'bronze_customers', [df_drop])
         logging.info("Appended partial batch to 'bronze_customers'.")
 
         # 5. REFLECTION:
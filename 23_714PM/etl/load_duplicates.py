@@ -1,5 +1,4 @@
 import pandas as pd
-import uuid
 import logging
 import sys
 import os
@@ -8,6 +7,8 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from db.connection import get_db_connection
+from etl.streaming import DEFAULT_CHUNK_ROWS, replicate_in_chunks, stream_append
+from etl.synthetic import new_ids
 # NOTE: log_anomaly import removed (Separation of Concerns)
 
 # Configure Logging
@@ -18,10 +19,17 @@ def generate_new_payment_ids(df):
     Generates new Order IDs so the batch looks like NEW transactions.
     """
     # We assume 1 payment per order for simplicity in this UUID generation
-    df['order_id'] = [str(uuid.uuid4()) for _ in range(len(df))]
+    df['order_id'] = new_ids(len(df))
     return df
 
-def run_duplicate_injection():
+def with_twins(chunks):
+    """
+    Yields every chunk concatenated with ITSELF, so each row has a twin in the same chunk.
+    """
+    for chunk in chunks:
+        yield pd.concat([chunk, chunk], ignore_index=True)
+
+def run_duplicate_injection(unique_rows=None, chunk_rows=DEFAULT_CHUNK_ROWS):
     conn = get_db_connection()
     if not conn:
         return
@@ -37,22 +45,23 @@ def run_duplicate_injection():
             logging.error("Source table empty.")
             return
 
-        # 2. TRANSFORM: Prepare a valid "new" batch first
-        df_clean = generate_new_payment_ids(df_source.copy())
+        # 2. TRANSFORM: Prepare valid "new" batches first (defaults to the 500 sampled payments)
+        if unique_rows is None:
+            unique_rows = len(df_source)
+        clean_chunks = replicate_in_chunks(
+            df_source, unique_rows, chunk_rows, transform=generate_new_payment_ids
+        )
 
         # 3. CHAOS: The "Retry Error"
-        # We concatenate the clean data with ITSELF.
+        # We concatenate each clean chunk with ITSELF.
         # Result: 500 unique IDs, but 1000 total rows. Every row has a twin.
-        df_duped_batch = pd.concat([df_clean, df_clean], ignore_index=True)
-
-        # Calculate metrics just for console logging
-        total_rows = len(df_duped_batch)
-        duplicate_count = total_rows - df_duped_batch['order_id'].nunique()
+        total_rows = unique_rows * 2
+        duplicate_count = total_rows - unique_rows
         
         logging.warning(f"Injection Prepared: {total_rows} rows, containing {duplicate_count} duplicates.")
 
-        # 4. LOAD: Append the messy batch to Bronze
-        df_duped_batch.to_sql('bronze_order_payments', conn, if_exists='append', index=False)
+        # 4. LOAD: Stream the messy batch into Bronze
+        stream_append(conn, 'bronze_order_payments', with_twins(clean_chunks))
         logging.info("Appended duplicate batch to 'bronze_order_payments'.")
 
         # 5. REFLECTION:
@@ -1,5 +1,4 @@
 import pandas as pd
-import uuid
 import logging
 import sys
 import os
@@ -9,6 +8,8 @@ from datetime import datetime, timedelta
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from db.connection import get_db_connection
+from etl.streaming import stream_append
+from etl.synthetic import new_ids
 # NOTE: log_anomaly import removed (Separation of Concerns)
 
 # Configure Logging
@@ -18,7 +19,7 @@ def generate_new_order_ids(df):
     """
     Generates new Order IDs so it looks like new incoming traffic.
     """
-    df['order_id'] = [str(uuid.uuid4()) for _ in range(len(df))]
+    df['order_id'] = new_ids(len(df))
     return df
 
 def run_latency_injection():
@@ -57,7 +58,7 @@ def run_latency_injection():
         logging.warning(f"Data Timestamp pushed back by 3 days. Lag is ~{max_lag_minutes} mins.")
 
         # 4. LOAD: Append to Bronze
-        df.to_sql('bronze_orders', conn, if_exists='append', index=False)
+        stream_append(conn, 'bronze_orders', [df])
         logging.info("Appended 'stale' batch to 'bronze_orders'.")
 
         # 5. REFLECTION:
@@ -1,5 +1,4 @@
 import pandas as pd
-import numpy as np
 import logging
 import sys
 import os
@@ -8,6 +7,8 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from db.connection import get_db_connection
+from etl.streaming import stream_append
+from etl.synthetic import get_rng
 # NOTE: log_anomaly import removed (Separation of Concerns)
 
 # Configure Logging
@@ -33,7 +34,7 @@ def run_null_injection():
         # 2. CHAOS: Corrupt the data (The 'Null' Logic)
         # We want ~40% of rows to have missing Category Names
         # This simulates an upstream mapping failure
-        mask = np.random.random(len(df)) < 0.4  # Creates a True/False mask for 40% of rows
+        mask = get_rng().random(len(df)) < 0.4  # Creates a True/False mask for 40% of rows
         
         # Apply NULLs (None in Python becomes NULL in SQL)
         df.loc[mask, 'product_category_name'] = None
@@ -45,7 +46,7 @@ def run_null_injection():
         logging.info(f"Corrupted Data: Injected {null_count} NULLs out of {total_rows} rows.")
 
         # 3. LOAD: Append to Bronze
-        df.to_sql('bronze_products', conn, if_exists='append', index=False)
+        stream_append(conn, 'bronze_products', [df])
         logging.info("Appended batch to 'bronze_products'.")
 
         # 4. REFLECTION:
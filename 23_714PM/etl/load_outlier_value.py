@@ -1,5 +1,4 @@
 import pandas as pd
-import uuid
 import logging
 import sys
 import os
@@ -9,13 +8,15 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import connection only. We remove the import for log_anomaly.
 from db.connection import get_db_connection
+from etl.streaming import stream_append
+from etl.synthetic import new_ids
 # NOTE: The import 'from db.utils import log_anomaly' has been removed
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
 def generate_new_ids(df):
     # Function to anonymize/refresh IDs, ensuring the batch is unique.
-    df['order_id'] = [str(uuid.uuid4()) for _ in range(len(df))]
+    df['order_id'] = new_ids(len(df))
     return df
 
 def run_outlier_injection():
@@ -75,7 +76,7 @@ def run_outlier_injection():
         bronze_columns = [col for col in df_items.columns if col in df_merged.columns]
         
         # Write the cleaned batch to Bronze
-        df_merged[bronze_columns].to_sql('bronze_order_items', conn, if_exists='append', index=False)
+        stream_append(conn, 'bronze_order_items', [df_merged[bronze_columns]])
         logging.info("Appended batch with JOIN-based conditional outliers to 'bronze_order_items'.")
 
         # --- 4. REFLECTION: Anomaly Logging is REMOVED ---
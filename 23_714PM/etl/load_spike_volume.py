@@ -1,5 +1,4 @@
 import pandas as pd
-import uuid
 import logging
 import sys
 import os
@@ -8,6 +7,8 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from db.connection import get_db_connection
+from etl.streaming import DEFAULT_CHUNK_ROWS, replicate_in_chunks, stream_append
+from etl.synthetic import new_ids
 # NOTE: log_anomaly import removed (Separation of Concerns)
 
 # Configure Logging
@@ -19,10 +20,10 @@ def generate_new_ids(df):
     Otherwise, we just keep inserting the same old IDs.
     """
     # Generate a unique ID for every row
-    df['order_id'] = [str(uuid.uuid4()) for _ in range(len(df))]
+    df['order_id'] = new_ids(len(df))
     return df
 
-def run_spike_injection():
+def run_spike_injection(multiplier=50, chunk_rows=DEFAULT_CHUNK_ROWS):
     conn = get_db_connection()
     if not conn:
         return
@@ -40,17 +41,18 @@ def run_spike_injection():
             return
 
         # 2. CHAOS: Multiply the data to create a SPIKE
-        # Replicating the data 50 times (100 * 50 = 5000 rows)
-        df_spike = pd.concat([df_source] * 50, ignore_index=True)
-        
-        # 3. TRANSFORM: Make it look like NEW data (New IDs)
-        df_spike = generate_new_ids(df_spike)
+        # Replicating the data 50 times (100 * 50 = 5000 rows). The copies are generated
+        # chunk by chunk, so a large multiplier doesn't have to fit in memory.
+        total_rows = len(df_source) * multiplier
+
+        # 3. TRANSFORM: Make it look like NEW data (New IDs), one chunk at a time
+        chunks = replicate_in_chunks(df_source, total_rows, chunk_rows, transform=generate_new_ids)
 
-        logging.info(f"Generated {len(df_spike)} rows (Simulating a Traffic Spike).")
+        logging.info(f"Generating {total_rows} rows (Simulating a Traffic Spike).")
 
-        # 4. LOAD (APPEND): Write to the Bronze Layer
-        # We use 'if_exists="append"' to keep history!
-        df_spike.to_sql('bronze_order_items', conn, if_exists='append', index=False)
+        # 4. LOAD (APPEND): Stream the chunks into the Bronze Layer in one transaction
+        # We only ever append, to keep history!
+        stream_append(conn, 'bronze_order_items', chunks)
         
         logging.info("Successfully APPENDED data to 'bronze_order_items'.")
 
@@ -1,5 +1,4 @@
 import pandas as pd
-import uuid
 import logging
 import sys
 import os
@@ -8,6 +7,8 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from db.connection import get_db_connection
+from etl.streaming import DEFAULT_CHUNK_ROWS, replicate_in_chunks, stream_append
+from etl.synthetic import new_ids
 # No log_anomaly import (Detector handles the observation)
 
 # Configure Logging
@@ -17,10 +18,10 @@ def generate_new_ids(df):
     """
     Refreshes Order IDs to simulate new organic traffic.
     """
-    df['order_id'] = [str(uuid.uuid4()) for _ in range(len(df))]
+    df['order_id'] = new_ids(len(df))
     return df
 
-def run_trend_shift_injection():
+def run_trend_shift_injection(multiplier=5, chunk_rows=DEFAULT_CHUNK_ROWS):
     conn = get_db_connection()
     if not conn:
         return
@@ -39,17 +40,16 @@ def run_trend_shift_injection():
         # 2. CHAOS: Simulate a "Step Change" (New Normal)
         # Unlike the 50x Spike, this is a moderate, sustained increase (e.g., 5x).
         # Scenario: A new marketing campaign permanently increased daily users.
-        multiplier = 5 
-        df_trend = pd.concat([df_source] * multiplier, ignore_index=True)
+        total_rows = len(df_source) * multiplier
         
-        # 3. TRANSFORM: Anonymize
-        df_trend = generate_new_ids(df_trend)
+        # 3. TRANSFORM: Anonymize (applied chunk by chunk while streaming)
+        chunks = replicate_in_chunks(df_source, total_rows, chunk_rows, transform=generate_new_ids)
 
-        logging.info(f"Generated {len(df_trend)} rows. (Volume Multiplier: {multiplier}x).")
+        logging.info(f"Generating {total_rows} rows. (Volume Multiplier: {multiplier}x).")
         logging.warning("Simulating a permanent Trend Shift (Step Change) in transaction volume.")
 
-        # 4. LOAD: Append to Bronze
-        df_trend.to_sql('bronze_order_items', conn, if_exists='append', index=False)
+        # 4. LOAD: Stream-append to Bronze
+        stream_append(conn, 'bronze_order_items', chunks)
         
         logging.info("Successfully APPENDED data to 'bronze_order_items'.")
 
@@ -0,0 +1,86 @@
+import pandas as pd
+import numpy as np
+import logging
+
+from db.changes import record_change
+
+# Rows generated and inserted per chunk. Memory stays bounded by one chunk no matter
+# how many rows an injection writes in total.
+DEFAULT_CHUNK_ROWS = 50000
+
+
+def replicate_in_chunks(df_source, total_rows, chunk_rows=DEFAULT_CHUNK_ROWS, transform=None):
+    """
+    Yields DataFrames that cycle through df_source until total_rows rows are produced.
+
+    Equivalent to pd.concat([df_source] * n) followed by 'transform', but only one
+    chunk exists in memory at a time.
+
+    Args:
+        df_source: The sample rows to replicate.
+        total_rows: Total number of rows to produce.
+        chunk_rows: Rows per yielded chunk.
+        transform: Optional function applied to each chunk (e.g. generate_new_ids).
+    """
+    produced = 0
+    while produced < total_rows:
+        size = min(chunk_rows, total_rows - produced)
+        positions = (np.arange(produced, produced + size) % len(df_source))
+        chunk = df_source.iloc[positions].reset_index(drop=True)
+        if transform is not None:
+            chunk = transform(chunk)
+        produced += size
+        yield chunk
+
+
+def _chunk_rows(chunk):
+    """Converts a DataFrame chunk to DB-API tuples (NaN/NaT -> NULL, timestamps -> text)."""
+    chunk = chunk.copy()
+    for column in chunk.columns:
+        if pd.api.types.is_datetime64_any_dtype(chunk[column]):
+            chunk[column] = chunk[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+    chunk = chunk.astype(object).where(chunk.notna(), None)
+    return chunk.itertuples(index=False, name=None)
+
+
+def stream_append(conn, table_name, chunks):
+    """
+    Appends DataFrame chunks to a table with executemany() inside ONE transaction.
+
+    The table is created from the first chunk's schema if it doesn't exist (same column
+    types DataFrame.to_sql would use). Either every chunk is committed or none is, and
+    the batch is recorded in bronze_change_log in the same transaction.
+
+    Returns:
+        The number of rows inserted.
+    """
+    total = 0
+    insert_sql = None
+    first_rowid = None
+
+    try:
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+
+            if insert_sql is None:
+                # Create the table (if needed) from an empty frame, then insert by column name
+                chunk.head(0).to_sql(table_name, conn, if_exists='append', index=False)
+                columns = ", ".join(f'"{column}"' for column in chunk.columns)
+                placeholders = ", ".join("?" for _ in chunk.columns)
+                insert_sql = f'INSERT INTO "{table_name}" ({columns}) VALUES ({placeholders})'
+                first_rowid = (conn.execute(f'SELECT MAX(rowid) FROM "{table_name}"').fetchone()[0] or 0) + 1
+
+            conn.executemany(insert_sql, _chunk_rows(chunk))
+            total += len(chunk)
+
+        if total:
+            last_rowid = conn.execute(f'SELECT MAX(rowid) FROM "{table_name}"').fetchone()[0]
+            record_change(conn, table_name, "append", first_rowid, last_rowid, total)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    logging.info(f"Streamed {total} rows into '{table_name}' in one transaction.")
+    return total
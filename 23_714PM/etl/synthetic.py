@@ -0,0 +1,199 @@
+import argparse
+import logging
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Fix imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.connection import get_db_connection
+from etl.streaming import DEFAULT_CHUNK_ROWS, stream_append
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+# Synthetic Olist data at scale. A profile is fitted once per source table from a
+# sample of its rows; batches are then drawn from it with vectorized NumPy calls only
+# (no per-row Python), so generation runs at millions of rows per second.
+#
+# Columns listed here identify a new entity and get fresh ids. Every other column is
+# sampled from the distribution observed in the source table, so foreign keys such as
+# product_id keep pointing at existing rows and joins still work.
+ID_COLUMNS = {
+    "order_items": ["order_id"],
+    "orders": ["order_id", "customer_id"],
+    "order_payments": ["order_id"],
+    "products": ["product_id"],
+    "customers": ["customer_id", "customer_unique_id"]
+}
+
+DEFAULT_SAMPLE_ROWS = 20000     # Source rows read to fit a profile
+QUANTILE_POINTS = 1001          # Resolution of the fitted inverse CDF of numeric columns
+MAX_DECIMALS = 4
+
+_QUANTILE_GRID = np.linspace(0.0, 1.0, QUANTILE_POINTS)
+
+# Shared generator: unseeded by default (fresh ids on every run), seeded for benchmarks
+_rng = np.random.default_rng()
+
+
+def set_seed(seed=None):
+    """Re-seeds the shared generator. The same seed reproduces the same batches and ids."""
+    global _rng
+    _rng = np.random.default_rng(seed)
+
+
+def get_rng():
+    return _rng
+
+
+def new_ids(n, rng=None):
+    """
+    Returns n random 32-character hex ids (the Olist id format) as a NumPy string array.
+    """
+    if rng is None:
+        rng = _rng
+    return np.frombuffer(rng.bytes(16 * n).hex().encode("ascii"), dtype="S32").astype("U32")
+
+# --- FITTING ---
+
+def _decimals(values):
+    """Smallest number of decimals that represents every sampled value."""
+    for decimals in range(MAX_DECIMALS + 1):
+        if np.allclose(values, np.round(values, decimals)):
+            return decimals
+    return MAX_DECIMALS
+
+
+def _fit_column(series):
+    null_ratio = float(series.isna().mean())
+    values = series.dropna()
+
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series) and not values.empty:
+        values = values.to_numpy(dtype=float)
+        return {
+            "kind": "numeric",
+            "quantiles": np.quantile(values, _QUANTILE_GRID),
+            "decimals": _decimals(values),
+            "integer": pd.api.types.is_integer_dtype(series),
+            "null_ratio": null_ratio
+        }
+
+    # Drawing uniformly from the sampled values reproduces their empirical frequencies
+    return {"kind": "categorical", "values": values.to_numpy(dtype=object), "null_ratio": null_ratio}
+
+
+def fit_profile(conn, source_table, sample_rows=DEFAULT_SAMPLE_ROWS):
+    """
+    Fits a per-column profile of a source table.
+
+    Reads at most ~sample_rows rows, evenly spread over the table (every k-th rowid),
+    and records for each column either its empirical inverse CDF (numeric columns) or
+    its sampled values (text columns, drawn uniformly later), plus its null ratio.
+
+    Returns:
+        {"table": source_table, "fields": {column: spec}} for generate_batch().
+    """
+    max_rowid = conn.execute(f"SELECT MAX(rowid) FROM {source_table}").fetchone()[0]
+    if max_rowid is None:
+        raise ValueError(f"Source table '{source_table}' is empty; cannot fit a profile.")
+
+    step = max(1, math.ceil(max_rowid / sample_rows))
+    df_sample = pd.read_sql(f"SELECT * FROM {source_table} WHERE rowid % ? = 0", conn, params=(step,))
+    if df_sample.empty:
+        df_sample = pd.read_sql(f"SELECT * FROM {source_table} LIMIT ?", conn, params=(sample_rows,))
+
+    id_columns = ID_COLUMNS.get(source_table, [])
+    fields = {
+        column: {"kind": "id"} if column in id_columns else _fit_column(df_sample[column])
+        for column in df_sample.columns
+    }
+    logging.info(f"Fitted profile of '{source_table}' from {len(df_sample)} sampled rows.")
+    return {"table": source_table, "fields": fields}
+
+# --- GENERATION ---
+
+def _sample_field(field, n, rng):
+    if field["kind"] == "id":
+        return new_ids(n, rng)
+
+    if field["kind"] == "numeric":
+        # Inverse-CDF sampling: linear interpolation between evenly spaced quantiles
+        position = rng.random(n) * (QUANTILE_POINTS - 1)
+        index = np.minimum(position.astype(np.int64), QUANTILE_POINTS - 2)
+        lower, upper = field["quantiles"][index], field["quantiles"][index + 1]
+        values = np.round(lower + (position - index) * (upper - lower), field["decimals"])
+        if field["null_ratio"] > 0:
+            values[rng.random(n) < field["null_ratio"]] = np.nan
+        elif field["integer"]:
+            values = values.astype(np.int64)
+        return values
+
+    if len(field["values"]) == 0:
+        return np.full(n, None, dtype=object)
+    values = field["values"][rng.integers(0, len(field["values"]), size=n)]
+    if field["null_ratio"] > 0:
+        values[rng.random(n) < field["null_ratio"]] = None
+    return values
+
+
+def generate_batch(profile, n, rng=None):
+    """Draws n synthetic rows from a fitted profile."""
+    if rng is None:
+        rng = _rng
+    return pd.DataFrame({column: _sample_field(field, n, rng) for column, field in profile["fields"].items()})
+
+
+def generate_in_chunks(profile, total_rows, chunk_rows=DEFAULT_CHUNK_ROWS, rng=None):
+    """Yields synthetic batches of at most chunk_rows rows until total_rows are produced."""
+    produced = 0
+    while produced < total_rows:
+        size = min(chunk_rows, total_rows - produced)
+        produced += size
+        yield generate_batch(profile, size, rng)
+
+
+def run_synthetic_load(source_table, rows, seed=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Appends 'rows' synthetic rows shaped like 'source_table' to its bronze table.
+
+    Returns:
+        The number of rows inserted (0 on failure).
+    """
+    conn = get_db_connection()
+    if not conn:
+        return 0
+
+    try:
+        logging.info(f"--- Starting Synthetic Load ({rows} rows of '{source_table}') ---")
+        rng = np.random.default_rng(seed) if seed is not None else _rng
+        profile = fit_profile(conn, source_table)
+
+        start = time.perf_counter()
+        inserted = stream_append(conn, f"bronze_{source_table}", generate_in_chunks(profile, rows, chunk_rows, rng))
+        elapsed = time.perf_counter() - start
+
+        logging.info(f"Loaded {inserted} rows in {elapsed:.2f}s ({inserted / max(elapsed, 1e-9):,.0f} rows/s).")
+        return inserted
+
+    except Exception as e:
+        logging.error(f"Synthetic Load Failed: {e}")
+        return 0
+    finally:
+        conn.close()
+
+# Allow running this file directly
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append synthetic Olist rows to a bronze table for scale tests.")
+    parser.add_argument("--table", required=True, choices=sorted(ID_COLUMNS), help="Source table to imitate.")
+    parser.add_argument("--rows", type=int, required=True, help="Number of rows to append.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible data and ids.")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows generated and inserted per chunk.")
+    args = parser.parse_args()
+
+    sys.exit(0 if run_synthetic_load(args.table, args.rows, args.seed, args.chunk_rows) else 1)
@@ -0,0 +1,98 @@
+# tests/conftest.py
+# Shared fixtures: a small seeded Olist-like source database per test.
+
+import os
+import random
+import sqlite3
+import sys
+
+import pytest
+
+# Fix imports (the project modules are imported from the project root, like trigger.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CATEGORIES = [
+    "beleza_saude", "informatica_acessorios", "automotivo", "cama_mesa_banho", "moveis_decoracao",
+    "esporte_lazer", "perfumaria", "utilidades_domesticas", "telefonia", "relogios_presentes"
+]
+
+
+def build_source_db(path, seed=1):
+    """Writes the five Olist source tables the injectors sample from, with seeded contents."""
+    rng = random.Random(seed)
+
+    def new_id():
+        return f"{rng.getrandbits(128):032x}"
+
+    conn = sqlite3.connect(path)
+    product_ids = [new_id() for _ in range(2000)]
+    conn.execute("CREATE TABLE products (product_id TEXT, product_category_name TEXT, product_name_lenght REAL, "
+                 "product_description_lenght REAL, product_photos_qty REAL, product_weight_g REAL, "
+                 "product_length_cm REAL, product_height_cm REAL, product_width_cm REAL)")
+    conn.executemany("INSERT INTO products VALUES (?,?,?,?,?,?,?,?,?)", [
+        (product_id, rng.choice(CATEGORIES) if rng.random() > 0.02 else None, rng.randint(10, 60),
+         rng.randint(50, 2000), rng.randint(1, 6), rng.randint(100, 5000), rng.randint(10, 80),
+         rng.randint(2, 50), rng.randint(10, 60))
+        for product_id in product_ids
+    ])
+    conn.execute("CREATE TABLE order_items (order_id TEXT, order_item_id INTEGER, product_id TEXT, seller_id TEXT, "
+                 "shipping_limit_date TEXT, price REAL, freight_value REAL)")
+    conn.executemany("INSERT INTO order_items VALUES (?,?,?,?,?,?,?)", [
+        (new_id(), 1, rng.choice(product_ids), new_id(), "2017-09-19 09:45:35",
+         round(rng.lognormvariate(4.5, 0.8), 2), round(rng.uniform(5, 40), 2))
+        for _ in range(3000)
+    ])
+    conn.execute("CREATE TABLE orders (order_id TEXT, customer_id TEXT, order_status TEXT, "
+                 "order_purchase_timestamp TEXT, order_approved_at TEXT, order_delivered_carrier_date TEXT, "
+                 "order_delivered_customer_date TEXT, order_estimated_delivery_date TEXT)")
+    conn.executemany("INSERT INTO orders VALUES (?,?,?,?,?,?,?,?)", [
+        (new_id(), new_id(), "delivered", "2017-10-02 10:56:33", "2017-10-02 11:07:15",
+         "2017-10-04 19:55:00", "2017-10-10 21:25:13", "2017-10-18 00:00:00")
+        for _ in range(1500)
+    ])
+    conn.execute("CREATE TABLE order_payments (order_id TEXT, payment_sequential INTEGER, payment_type TEXT, "
+                 "payment_installments INTEGER, payment_value REAL)")
+    conn.executemany("INSERT INTO order_payments VALUES (?,?,?,?,?)", [
+        (new_id(), 1, rng.choice(["credit_card", "boleto", "voucher"]), rng.randint(1, 10),
+         round(rng.uniform(10, 500), 2))
+        for _ in range(1500)
+    ])
+    conn.execute("CREATE TABLE customers (customer_id TEXT, customer_unique_id TEXT, "
+                 "customer_zip_code_prefix INTEGER, customer_city TEXT, customer_state TEXT)")
+    conn.executemany("INSERT INTO customers VALUES (?,?,?,?,?)", [
+        (new_id(), new_id(), rng.randint(1000, 99999), "sao paulo", "SP") for _ in range(1500)
+    ])
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def source_db(tmp_path, monkeypatch):
+    """Seeded source database with the audit tables created, used as DB_PATH (SQLite backend)."""
+    path = tmp_path / "olist.sqlite"
+    build_source_db(path)
+    monkeypatch.setenv("DB_PATH", str(path))
+    monkeypatch.delenv("DB_TYPE", raising=False)
+
+    from db.init_db import init_tables
+    from etl.synthetic import set_seed
+    init_tables()
+    set_seed(0)
+    return path
+
+
+def run_scenario(scenario):
+    """Runs one injector by its trigger.py scenario name."""
+    from trigger import load_injector
+    load_injector(scenario)()
+
+
+def audit_rows(path, where=""):
+    """Returns the audit log as dicts, oldest first."""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute(f"SELECT * FROM anomaly_audit_log {where} ORDER BY log_id").fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
@@ -0,0 +1,70 @@
+# tests/test_cron.py
+# Daemon schedules: cron next-fire computation and fixed intervals.
+
+from datetime import datetime
+
+import pytest
+
+from anomaly.daemon import CronSchedule, IntervalSchedule, parse_interval
+
+
+@pytest.mark.parametrize("expression, moment, expected", [
+    # Every 5 minutes: strictly after, seconds dropped
+    ("*/5 * * * *", datetime(2024, 3, 10, 12, 0, 0), datetime(2024, 3, 10, 12, 5)),
+    ("*/5 * * * *", datetime(2024, 3, 10, 12, 3, 59), datetime(2024, 3, 10, 12, 5)),
+    # Hour and day roll-over
+    ("30 2 * * *", datetime(2024, 3, 10, 2, 30), datetime(2024, 3, 11, 2, 30)),
+    ("0 0 * * *", datetime(2024, 12, 31, 23, 59), datetime(2025, 1, 1, 0, 0)),
+    # Ranges and lists: business hours on weekdays (2024-03-09 is a Saturday)
+    ("0 9-17 * * 1-5", datetime(2024, 3, 8, 17, 0), datetime(2024, 3, 11, 9, 0)),
+    ("15,45 * * * *", datetime(2024, 3, 10, 8, 20), datetime(2024, 3, 10, 8, 45)),
+    # Both 0 and 7 are Sunday
+    ("0 6 * * 7", datetime(2024, 3, 11, 0, 0), datetime(2024, 3, 17, 6, 0)),
+    ("0 6 * * 0", datetime(2024, 3, 11, 0, 0), datetime(2024, 3, 17, 6, 0)),
+    # Both day fields restricted: either one matches (the 1st, or any Monday)
+    ("0 0 1 * 1", datetime(2024, 3, 1, 0, 0), datetime(2024, 3, 4, 0, 0)),
+    # Month skips and leap days
+    ("0 0 1 6 *", datetime(2024, 7, 1, 0, 0), datetime(2025, 6, 1, 0, 0)),
+    ("0 12 29 2 *", datetime(2024, 3, 1, 0, 0), datetime(2028, 2, 29, 12, 0)),
+])
+def test_next_after(expression, moment, expected):
+    assert CronSchedule(expression).next_after(moment) == expected
+
+
+@pytest.mark.parametrize("expression", [
+    "* * * *",          # Too few fields
+    "60 * * * *",       # Minute out of range
+    "* * 0 * *",        # Day of month starts at 1
+    "*/0 * * * *",      # Zero step
+    "5-1 * * * *",      # Reversed range
+])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_never_matching_expression():
+    with pytest.raises(ValueError):
+        CronSchedule("0 0 31 2 *").next_after(datetime(2024, 1, 1))
+
+
+def test_cron_next_run_skips_missed_fires():
+    schedule = CronSchedule("*/10 * * * *")
+    previous_due = datetime(2024, 3, 10, 12, 0).timestamp()
+    now = datetime(2024, 3, 10, 12, 34, 10).timestamp()
+    # A run that overran 12:10-12:30 resumes at the next fire after now
+    assert schedule.next_run(previous_due, now) == datetime(2024, 3, 10, 12, 40).timestamp()
+    assert schedule.next_run(None, now) == datetime(2024, 3, 10, 12, 40).timestamp()
+
+
+def test_interval_schedule():
+    schedule = IntervalSchedule(60, log_missed=False)
+    assert schedule.next_run(None, 1000.0) == 1000.0
+    assert schedule.next_run(1000.0, 1030.0) == 1060.0
+    # Overran two ticks: stays anchored to the first run
+    assert schedule.next_run(1000.0, 1150.0) == 1180.0
+
+
+@pytest.mark.parametrize("text, seconds", [("90", 90), ("500ms", 0.5), ("30s", 30), ("5m", 300), ("2h", 7200)])
+def test_parse_interval(text, seconds):
+    assert parse_interval(text) == seconds
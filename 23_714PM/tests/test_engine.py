@@ -0,0 +1,123 @@
+# tests/test_engine.py
+# Rule engine: parity with the original hand-written detector, and incremental runs
+# matching full scans.
+
+import sqlite3
+
+import pytest
+
+from conftest import audit_rows, run_scenario
+
+# What the original detector logged for 'trigger.py --scenario all' on the seeded
+# database, as (source_table, category, check_name, severity, threshold, metric).
+# The metric is None where it depends on random draws (null ratio) or the clock (latency).
+BASELINE_FINDINGS = [
+    ("bronze_order_items", "Volume", "row_count_spike", "CRITICAL", 2000.0, 5600.0),
+    ("bronze_customers", "Volume", "row_count_drop", "CRITICAL", 10.0, 5.0),
+    ("bronze_order_payments", "Volume", "row_count_deletion", "CRITICAL", 1000.0, 600.0),
+    ("bronze_products", "Data_Quality", "null_injection_check", "WARNING", 0.05, None),
+    ("bronze_order_payments", "Data_Quality", "duplicate_payments_check", "CRITICAL", 0.0, 100.0),
+    ("bronze_order_items", "Data_Quality", "price_outlier_check", "CRITICAL", 50000.0, 1.0),
+    ("bronze_orders", "SLA", "data_latency_check", "CRITICAL", 60.0, None),
+]
+
+# Rules added after the original detector
+NEW_CHECKS = {"category_price_outlier_check", "batch_volume_baseline"}
+
+# Compared between incremental and full runs. The latency metric moves with the clock,
+# the category fences are learned from what each run has seen, and baselines only run
+# incrementally.
+NOT_COMPARED = ("data_latency_check", "category_price_outlier_check", "batch_volume_baseline")
+
+
+def findings(path):
+    return sorted(
+        (row["source_table"], row["check_name"], round(row["metric_value"], 2), row["threshold_value"])
+        for row in audit_rows(path)
+        if row["check_name"] not in NOT_COMPARED
+    )
+
+
+def clear_audit_log(path):
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM anomaly_audit_log")
+    conn.commit()
+    conn.close()
+
+
+def test_all_scenarios_match_original_detector(source_db):
+    from trigger import ALL_SCENARIOS
+    from anomaly.detector import run_detector
+
+    for scenario in ALL_SCENARIOS:
+        run_scenario(scenario)
+    run_detector(incidents=False)
+
+    logged = [
+        (row["source_table"], row["anomaly_category"], row["check_name"], row["severity"],
+         row["threshold_value"], row["metric_value"])
+        for row in audit_rows(source_db)
+        if row["check_name"] not in NEW_CHECKS
+    ]
+    assert len(logged) == len(BASELINE_FINDINGS)
+    for expected in BASELINE_FINDINGS:
+        matches = [row for row in logged if row[:5] == expected[:5]]
+        assert len(matches) == 1, expected
+        metric = matches[0][5]
+        if expected[5] is None:
+            assert metric > expected[4]
+        else:
+            assert metric == pytest.approx(expected[5])
+
+
+def test_trend_shift_logged_unless_spiked(source_db):
+    from anomaly.detector import run_detector
+
+    run_scenario("trend_shift")
+    run_detector(incidents=False)
+    assert [row["check_name"] for row in audit_rows(source_db, "WHERE source_table = 'bronze_order_items'")] \
+        == ["sustained_volume_shift"]
+
+    # A spike on top is logged as the spike only
+    clear_audit_log(source_db)
+    run_scenario("spike")
+    run_detector(incidents=False)
+    checks = {row["check_name"] for row in audit_rows(source_db, "WHERE source_table = 'bronze_order_items'")}
+    assert "row_count_spike" in checks
+    assert "sustained_volume_shift" not in checks
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_incremental_matches_full(source_db, workers):
+    from anomaly.detector import run_detector
+
+    for scenario in ["trend_shift", "duplicate", "null", "spike", "outlier", "duplicate",
+                     "deletion", "late", "drop", "null"]:
+        run_scenario(scenario)
+
+        clear_audit_log(source_db)
+        run_detector(incremental=True, workers=workers, incidents=False)
+        incremental = findings(source_db)
+
+        clear_audit_log(source_db)
+        run_detector(workers=workers, incidents=False)
+        full = findings(source_db)
+
+        assert incremental == full, scenario
+        assert full, scenario
+
+
+def test_repeated_firing_is_one_incident(source_db):
+    from anomaly.detector import run_detector
+
+    run_scenario("spike")
+    run_detector()
+    run_detector()
+
+    assert len(audit_rows(source_db, "WHERE check_name = 'row_count_spike'")) == 1
+    conn = sqlite3.connect(source_db)
+    incidents = conn.execute(
+        "SELECT status, occurrences FROM anomaly_incidents WHERE check_name = 'row_count_spike'"
+    ).fetchall()
+    conn.close()
+    assert incidents == [("open", 2)]
@@ -0,0 +1,96 @@
+# tests/test_sketches.py
+# HyperLogLog and quantile sketches: error bounds, merging and persistence.
+
+import random
+import sqlite3
+
+import pytest
+
+from anomaly.sketches import HyperLogLog, QuantileSketch, ensure_sketches_table, load_sketch, save_sketch
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+@pytest.mark.parametrize("count", [100, 10_000, 200_000])
+def test_hll_within_error_bound(count):
+    sketch = HyperLogLog()
+    sketch.update(f"id-{i}" for i in range(count))
+    # Four standard errors: a seeded hash, so this never flakes
+    assert abs(sketch.cardinality() - count) <= 4 * sketch.relative_error() * count
+
+
+def test_hll_ignores_repeats():
+    sketch = HyperLogLog()
+    for _ in range(5):
+        sketch.update(range(1000))
+    assert abs(sketch.cardinality() - 1000) <= 4 * sketch.relative_error() * 1000
+
+
+def test_hll_merge_equals_union():
+    left, right, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    left.update(range(0, 60_000))
+    right.update(range(40_000, 100_000))
+    union.update(range(0, 100_000))
+
+    left.merge(right)
+    assert left.registers == union.registers
+
+
+def test_hll_rejects_mismatched_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(10).merge(HyperLogLog(12))
+
+
+@pytest.mark.parametrize("q", [0.01, 0.25, 0.5, 0.75, 0.99])
+def test_quantile_within_error_bound(q):
+    rng = random.Random(7)
+    values = [rng.lognormvariate(4.5, 0.8) for _ in range(20_000)]
+    sketch = QuantileSketch()
+    sketch.update(values)
+
+    exact = exact_quantile(values, q)
+    assert abs(sketch.quantile(q) - exact) <= sketch.relative_error() * exact
+
+
+def test_quantile_extremes_are_exact():
+    sketch = QuantileSketch()
+    sketch.update([3.5, 120.0, 0.0, 42.0])
+    assert sketch.quantile(0) == 0.0
+    assert sketch.quantile(1) == 120.0
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_quantile_merge_equals_single_sketch():
+    rng = random.Random(3)
+    first = [rng.uniform(1, 1000) for _ in range(5000)]
+    second = [rng.uniform(500, 5000) for _ in range(5000)]
+
+    merged, other, whole = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    merged.update(first)
+    other.update(second)
+    whole.update(first + second)
+    merged.merge(other)
+
+    assert merged.count == whole.count
+    for q in (0.1, 0.5, 0.9):
+        assert merged.quantile(q) == whole.quantile(q)
+
+
+def test_sketches_round_trip_through_database():
+    conn = sqlite3.connect(":memory:")
+    ensure_sketches_table(conn)
+    hll = HyperLogLog(12)
+    hll.update(range(5000))
+    quantiles = QuantileSketch()
+    quantiles.update(range(1, 5000))
+
+    save_sketch(conn, "bronze_orders", "hll:order_id", hll)
+    save_sketch(conn, "bronze_orders", "latency:order_purchase_timestamp", quantiles)
+
+    loaded_hll = load_sketch(conn, "bronze_orders", "hll:order_id")
+    loaded_quantiles = load_sketch(conn, "bronze_orders", "latency:order_purchase_timestamp", QuantileSketch)
+    assert loaded_hll.cardinality() == hll.cardinality()
+    assert loaded_quantiles.quantile(0.5) == quantiles.quantile(0.5)
@@ -1,4 +1,5 @@
 import argparse
+import importlib
 import sys
 import os
 import logging
@@ -10,24 +11,34 @@ import logging
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(project_root)
 
-# Import ETL Injection functions (The 'Chaos' step)
-from etl.load_spike_volume import run_spike_injection
-from etl.load_drop_volume import run_drop_injection
-from etl.load_null_injection import run_null_injection
-from etl.load_duplicates import run_duplicate_injection
-from etl.load_late_data import run_latency_injection
-from etl.load_outlier_value import run_outlier_injection
+# ETL Injection functions (The 'Chaos' step), as (module, function).
+# They are imported on demand: the injectors pull in pandas and numpy, which a
+# detection-only run ('--scenario none') never needs.
+INJECTORS = {
+    "spike": ("etl.load_spike_volume", "run_spike_injection"),
+    "drop": ("etl.load_drop_volume", "run_drop_injection"),
+    "null": ("etl.load_null_injection", "run_null_injection"),
+    "duplicate": ("etl.load_duplicates", "run_duplicate_injection"),
+    "late": ("etl.load_late_data", "run_latency_injection"),
+    "outlier": ("etl.load_outlier_value", "run_outlier_injection"),
+    "deletion": ("etl.load_deletion", "run_deletion_injection"),
+    "trend_shift": ("etl.load_trend_shift", "run_trend_shift_injection")
+}
 
-# **NEW IMPORTS for Phase 1 Expansion**
-from etl.load_deletion import run_deletion_injection
-from etl.load_trend_shift import run_trend_shift_injection
+# Order used by '--scenario all'
+ALL_SCENARIOS = ["spike", "null", "drop", "duplicate", "late", "outlier", "deletion", "trend_shift"]
 
 # Import the Anomaly Detector (The 'Sidecar Observability' step)
-from anomaly.detector import run_detector 
+from anomaly.detector import run_detector
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
+def load_injector(scenario):
+    """Imports the injector of a scenario (and pandas/numpy with it) on first use."""
+    module_name, function_name = INJECTORS[scenario]
+    return getattr(importlib.import_module(module_name), function_name)
+
 def main():
     parser = argparse.ArgumentParser(description="Chaos Injection Trigger")
     
@@ -38,48 +49,68 @@ def main():
         # Updated choices to include the new scenarios
         choices=[
             "spike", "drop", "null", "duplicate", "late", "outlier", 
-            "deletion", "trend_shift", "all"
+            "deletion", "trend_shift", "all", "none"
         ], 
-        help="Choose which anomaly to inject into the pipeline."
+        help="Choose which anomaly to inject into the pipeline ('none' only runs detection)."
+    )
+
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only evaluate rows appended since the last detector run (uses detector_state). "
+             "Adaptive baseline rules only learn and fire in this mode; full runs skip them."
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Check tables in parallel on this many read-only connections (default: 1)."
+    )
+
+    parser.add_argument(
+        "--log-stats",
+        action="store_true",
+        help="Log each check's cost (wall time, VM steps, query plan, outcome) as JSON lines."
+    )
+
+    parser.add_argument(
+        "--no-incidents",
+        action="store_true",
+        help="Log every firing instead of one audit row per incident (see db/incidents.py)."
+    )
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed the injected data and ids, so runs are reproducible."
     )
 
     args = parser.parse_args()
 
+    # The seed only drives the injectors: a detection-only run skips it and, with it,
+    # the NumPy import in etl/synthetic.py
+    if args.seed is not None and args.scenario != "none":
+        from etl.synthetic import set_seed
+        set_seed(args.seed)
+
     print(f"\n--- TRIGGERING SCENARIO: {args.scenario.upper()} ---")
 
     # --- 2. ETL (Injection) Step ---
-    if args.scenario == "spike":
-        run_spike_injection()
-    elif args.scenario == "drop":
-        run_drop_injection()
-    elif args.scenario == "null":
-        run_null_injection()
-    elif args.scenario == "duplicate":
-        run_duplicate_injection()
-    elif args.scenario == "late":
-        run_latency_injection()
-    elif args.scenario == "outlier":
-        run_outlier_injection()
-    elif args.scenario == "deletion":
-        run_deletion_injection()
-    elif args.scenario == "trend_shift":
-        run_trend_shift_injection()
-    elif args.scenario == "all":
+    if args.scenario == "all":
         # Run all injections (Great for populating historical logs)
-        run_spike_injection()
-        run_null_injection()
-        run_drop_injection()
-        run_duplicate_injection()
-        run_latency_injection()
-        run_outlier_injection()
-        run_deletion_injection()
-        run_trend_shift_injection()
+        for scenario in ALL_SCENARIOS:
+            load_injector(scenario)()
+    elif args.scenario != "none":
+        load_injector(args.scenario)()
         
     print("--- INJECTION COMPLETE. STARTING DETECTION. ---")
 
     # --- 3. Detection Step ---
     # After the ETL injects the data, the detector immediately checks the Bronze layer
-    run_detector()
+    run_detector(incremental=args.incremental, workers=args.workers, log_stats=args.log_stats,
+                 incidents=not args.no_incidents)
     
     print("\n--- END-TO-END RUN COMPLETE. CHECK ANOMALY_AUDIT_LOG. ---\n")
 